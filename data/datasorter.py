@@ -1,36 +1,308 @@
+import argparse
+import heapq
+import math
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from instrumentation import start_run
+import schema
+
 # Read the CSV file
 file_path = "hepsiemlak_500k+.txt"
-df = pd.read_csv(file_path)
+output_path = "hepsiemlak_500k_sorted.csv"
 
 # Check if the columns match the expected ones
 expected_columns = ["ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare", "bina_yasi", "kat", "konum", "fiyat", "para_birimi"]
 
-if list(df.columns) != expected_columns:
-    raise ValueError(f"Columns do not match. Current columns: {list(df.columns)}")
 
-# Clean the 'fiyat' column and convert to Int64
-df['fiyat'] = df['fiyat'].astype(str).str.replace('.', '').str.replace(',', '')
-df['fiyat'] = df['fiyat'].astype('Int64')
+def check_columns(df):
+    if list(df.columns) != expected_columns:
+        raise ValueError(f"Columns do not match. Current columns: {list(df.columns)}")
 
-# Remove rows where 'konum' contains 'Kıbrıs'
-rows_before_kibris = len(df)
-df = df[~df['konum'].str.contains("Kıbrıs", na=False)]
-rows_after_kibris = len(df)
 
-# Sort by 'fiyat' ascending
-df = df.sort_values(by='fiyat', ascending=True)
+def clean_fiyat(df):
+    # Clean the 'fiyat' column and convert to Int64
+    df['fiyat'] = df['fiyat'].astype(str).str.replace('.', '').str.replace(',', '')
+    df['fiyat'] = df['fiyat'].astype('Int64')
+    return df
 
-# Drop duplicate rows
-rows_before_dups = len(df)
-df = df.drop_duplicates()
-rows_after_dups = len(df)
 
-# Save to new CSV file
-output_path = "hepsiemlak_500k_sorted.csv"
-df.to_csv(output_path, index=False)
+def drop_kibris(df):
+    # Remove rows where 'konum' contains 'Kıbrıs'
+    return df[~df['konum'].str.contains("Kıbrıs", na=False)]
+
+
+def report(kibris_removed, dups_removed):
+    print(f"Rows removed that include (kıbrıs) {kibris_removed}")
+    print(f"Duplicates removed: {dups_removed}")
+    print(f"Cleaned file saved to: {output_path}")
+
+
+def run_in_memory(dedup_key, metrics):
+    with metrics.step("load") as step:
+        # ilan_linki and konum are part of the output, so they are always kept
+        df = schema.read_csv(file_path, keep_text=True)
+        check_columns(df)
+        df = clean_fiyat(df)
+        step.rows_out = len(df)
+        step.extra["frame_mb"] = schema.frame_mb(df)
+
+    rows_before_kibris = len(df)
+    with metrics.step("kıbrıs filter", rows_in=len(df)) as step:
+        df = drop_kibris(df)
+        step.rows_out = len(df)
+    rows_after_kibris = len(df)
+
+    # Sort by 'fiyat' ascending
+    with metrics.step("sort", rows_in=len(df)) as step:
+        df = df.sort_values(by='fiyat', ascending=True)
+        step.rows_out = len(df)
+
+    # Drop duplicate rows
+    rows_before_dups = len(df)
+    with metrics.step("dedup", rows_in=len(df)) as step:
+        df = df.drop_duplicates(subset=['ilan_id'] if dedup_key == "ilan_id" else None)
+        step.rows_out = len(df)
+    rows_after_dups = len(df)
+
+    # Save to new CSV file
+    with metrics.step("save", rows_in=len(df)) as step:
+        df.to_csv(output_path, index=False)
+        step.rows_out = len(df)
+    report(rows_before_kibris - rows_after_kibris, rows_before_dups - rows_after_dups)
+
+
+# --- Streaming mode: chunked external merge sort with bounded memory ---
+#
+# Pass 1 reads the dump in chunks, cleans and filters each chunk, sorts it
+# stably by (fiyat, file position) and spills it to a run file as small
+# pickled blocks. Runs are then k-way merged (at most `fan_in` at a time), so
+# only one block per run is ever resident. Duplicates are dropped during the
+# final merge: whole-row duplicates share a price, so a seen-set scoped to the
+# current price is enough to reproduce drop_duplicates(keep="first").
+#
+# The output has the same rows as the in-memory mode, but rows with equal
+# fiyat stay in file order. The in-memory sort_values() is not stable and
+# its tie order depends on the whole price column, which a chunked sort
+# cannot reproduce. With --dedup-key ilan_id this can also change which of
+# two equally priced rows of a listing is kept.
+
+def common_dtype(dtypes):
+    # Mirror how pandas unifies per-chunk dtypes when it reads a file whole
+    dtypes = set(dtypes)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if all(isinstance(d, np.dtype) and d.kind in "iuf" for d in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype(object)
+
+
+def sort_key(fiyat, seq):
+    return (math.inf if fiyat is pd.NA else fiyat, seq)
+
+
+def row_key(row):
+    # NaN != NaN, but drop_duplicates treats missing values as equal
+    return tuple(None if isinstance(v, float) and v != v else v for v in row)
+
+
+class PriceGroupSeen:
+    """Rows already written at the current price (whole-row dedup).
+
+    Held in a set up to `cap` rows; a larger group (ties on a round price, or
+    all rows without a price) moves to a SQLite table so memory stays bounded.
+    """
+
+    def __init__(self, db, cap):
+        self.db, self.cap = db, cap
+        self.rows = set()
+        self.spilled = False
+        db.execute("CREATE TABLE price_rows (row BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    def reset(self):
+        self.rows.clear()
+        if self.spilled:
+            self.db.execute("DELETE FROM price_rows")
+            self.spilled = False
+
+    def add(self, row):
+        """False if `row` was already seen at this price."""
+        key = row_key(row)
+        if self.spilled:
+            cur = self.db.execute("INSERT OR IGNORE INTO price_rows VALUES (?)", (spill_key(key),))
+            return cur.rowcount == 1
+        if key in self.rows:
+            return False
+        self.rows.add(key)
+        if len(self.rows) > self.cap:
+            self.db.executemany("INSERT INTO price_rows VALUES (?)", ((spill_key(k),) for k in self.rows))
+            self.rows.clear()
+            self.spilled = True
+        return True
+
+
+def spill_key(key):
+    # 4 and 4.0 are the same set key, so they must pickle the same too
+    return pickle.dumps(tuple(int(v) if isinstance(v, float) and v.is_integer() else v for v in key),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_run(records, path, block_rows):
+    with open(path, "wb") as f:
+        block = []
+        for rec in records:
+            block.append(rec)
+            if len(block) >= block_rows:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def merge_runs(paths):
+    return heapq.merge(*(read_run(p) for p in paths), key=lambda rec: rec[0])
+
+
+def run_streaming(chunk_rows, fan_in, dedup_key, tmp_dir, metrics):
+    block_rows = max(1, chunk_rows // fan_in)
+    work_dir = tempfile.mkdtemp(prefix="datasorter-", dir=tmp_dir)
+    seen_db = None
+    try:
+        runs = []
+        chunk_dtypes = {}
+        kibris_removed = 0
+        rows_after_kibris = 0
+        seq = 0
+
+        # Pass 1: sorted runs (load, kıbrıs filter and per-chunk sort)
+        with metrics.step("load + kıbrıs filter + sort runs") as step:
+            # Chunks keep the parsed dtypes: rows leave pandas as tuples right away,
+            # and per-chunk categories would only make the output dtypes diverge
+            for chunk in pd.read_csv(file_path, chunksize=chunk_rows):
+                check_columns(chunk)
+                chunk = clean_fiyat(chunk)
+                kept = drop_kibris(chunk)
+                kibris_removed += len(chunk) - len(kept)
+                rows_after_kibris += len(kept)
+
+                for col in kept.columns:
+                    chunk_dtypes.setdefault(col, []).append(kept[col].dtype)
+
+                keys = [sort_key(f, seq + i) for i, f in enumerate(kept['fiyat'])]
+                seq += len(kept)
+                records = sorted(zip(keys, kept.itertuples(index=False, name=None)), key=lambda rec: rec[0])
+
+                path = os.path.join(work_dir, f"run-{len(runs)}.pkl")
+                write_run(records, path, block_rows)
+                runs.append(path)
+            step.rows_in = rows_after_kibris + kibris_removed
+            step.rows_out = rows_after_kibris
+            step.extra["runs"] = len(runs)
+
+        # Intermediate merge passes keep the number of open runs bounded
+        with metrics.step("merge passes", rows_in=rows_after_kibris) as step:
+            generation = 0
+            while len(runs) > fan_in:
+                merged = []
+                for i in range(0, len(runs), fan_in):
+                    group = runs[i:i + fan_in]
+                    path = os.path.join(work_dir, f"merge-{generation}-{i // fan_in}.pkl")
+                    write_run(merge_runs(group), path, block_rows)
+                    for p in group:
+                        os.remove(p)
+                    merged.append(path)
+                runs = merged
+                generation += 1
+            step.rows_out = rows_after_kibris
+            step.extra["generations"] = generation
+
+        # Final merge: dedup and write CSV in blocks with the whole-file dtypes
+        dtypes = {col: common_dtype(ds) for col, ds in chunk_dtypes.items()}
+        seen_db = sqlite3.connect(os.path.join(work_dir, "seen.sqlite"))
+        if dedup_key == "ilan_id":
+            seen_db.execute("CREATE TABLE seen (ilan_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        else:
+            seen_rows = PriceGroupSeen(seen_db, chunk_rows)
+        id_pos = expected_columns.index("ilan_id")
+
+        written = 0
+        header = True
+        block = []
+        current_fiyat = object()
+
+        def flush():
+            nonlocal header
+            out = pd.DataFrame.from_records(block, columns=expected_columns)
+            if dtypes:
+                out = out.astype(dtypes)
+            out.to_csv(output_path, index=False, header=header, mode="w" if header else "a")
+            header = False
+            block.clear()
+
+        with metrics.step("merge + dedup + save", rows_in=rows_after_kibris) as step:
+            for (fiyat, _), row in merge_runs(runs):
+                if dedup_key == "ilan_id":
+                    cur = seen_db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (str(row[id_pos]),))
+                    if cur.rowcount == 0:
+                        continue
+                else:
+                    if fiyat != current_fiyat:
+                        current_fiyat = fiyat
+                        seen_rows.reset()
+                    if not seen_rows.add(row):
+                        continue
+
+                block.append(row)
+                written += 1
+                if len(block) >= block_rows:
+                    flush()
+
+            if block or header:
+                flush()
+            step.rows_out = written
+    finally:
+        # Run files and the seen-key db go whether or not the sort finished
+        if seen_db is not None:
+            seen_db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report(kibris_removed, rows_after_kibris - written)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean, sort by price and dedup the raw scrape dump.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="bounded-memory external sort instead of loading the whole dump "
+                             "(equal prices stay in file order)")
+    parser.add_argument("--chunk-rows", type=int, default=200_000,
+                        help="rows held in memory at once in streaming mode (default: 200000)")
+    parser.add_argument("--fan-in", type=int, default=16,
+                        help="runs merged at a time in streaming mode (default: 16)")
+    parser.add_argument("--dedup-key", choices=["row", "ilan_id"], default="row",
+                        help="'row' matches the in-memory output; 'ilan_id' keeps the cheapest row per listing")
+    parser.add_argument("--tmp-dir", default=None, help="directory for sorted run files")
+    args = parser.parse_args()
 
-print(f"Rows removed that include (kıbrıs) {rows_before_kibris - rows_after_kibris}")
-print(f"Duplicates removed: {rows_before_dups - rows_after_dups}")
-print(f"Cleaned file saved to: {output_path}")
+    metrics = start_run("datasorter")
+    if args.streaming:
+        run_streaming(args.chunk_rows, max(2, args.fan_in), args.dedup_key, args.tmp_dir, metrics)
+    else:
+        run_in_memory(args.dedup_key, metrics)
@@ -0,0 +1,235 @@
+# fixture_server.py
+# Local stand-in for hepsiemlak.com, for testing and benchmarking the scrapers
+# without touching the real site.
+#
+#   python fixture_server.py --make-fixtures     # (re)write fixtures/ from detailed-listings-cleaned.csv
+#   python fixture_server.py --port 8765         # serve fixtures/ on localhost
+#
+# fixtures/listings/page-N.html are search result pages with the card markup
+# hepsi.py reads (article.listingView ...) and a "next" link between pages;
+# fixtures/listings/expected.csv is what scraping all of them must produce.
+# fixtures/detail/<ilan_id>.html are listing detail pages with the
+# li.spec-item rows hepsi-2.py reads; targets.csv lists the ids to enrich
+# (some have no page, i.e. a 404) and expected.csv the enriched rows.
+import argparse
+import csv
+import html
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(HERE, "fixtures")
+
+LISTING_COLUMNS = ["ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare",
+                   "bina_yasi", "kat", "konum", "fiyat", "para_birimi"]
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+    max_rps = None  # answer 429 beyond this many requests per second
+    recent = None
+    lock = None
+
+    def end_headers(self):
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def throttled(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.max_rps:
+                return True
+            self.recent.append(now)
+            return False
+
+    def send_head(self):
+        if self.max_rps and self.throttled():
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        if self.latency:
+            time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Serve a directory on an ephemeral localhost port in a background thread."""
+
+    def __init__(self, directory=FIXTURE_DIR, port=0, latency_ms=0, max_rps=None, handler=FixtureHandler):
+        bound = type("BoundFixtureHandler", (handler,), {
+            "latency": latency_ms / 1000, "max_rps": max_rps, "recent": deque(), "lock": threading.Lock()})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), partial(bound, directory=directory))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# --- Fixture generation ---
+
+def fmt_int(value):
+    return f"{int(value):,}".replace(",", ".")
+
+
+def card_html(row):
+    return f"""  <article class="listingView" id="{html.escape(row['ilan_id'])}">
+    <a class="card-link" href="{html.escape(row['ilan_linki'])}">
+      <span class="list-view-date">{html.escape(row['ilan_tarihi'])}</span>
+      <span class="short-property"><span class="left">{html.escape(row['ilan_tipi'])}</span></span>
+      <span class="celly squareMeter">{html.escape(row['metrekare'])}</span>
+      <span class="celly buildingAge">{html.escape(row['bina_yasi'])}</span>
+      <span class="celly floortype">{html.escape(row['kat'])}</span>
+      <span class="list-view-location">{html.escape(row['konum'])}</span>
+      <span class="list-view-price">{html.escape(row['fiyat'])} <span class="currency">{html.escape(row['para_birimi'])}</span></span>
+    </a>
+  </article>
+"""
+
+
+def page_html(cards, page, pages):
+    nav = ""
+    if page < pages:
+        nav = f'<a class="he-pagination__navigate-text--next" href="page-{page + 1}.html">Sonraki</a>'
+    return f"""<!DOCTYPE html>
+<html lang="tr"><head><meta charset="utf-8"><title>Satılık Daire - Sayfa {page}</title></head>
+<body>
+<section class="listing-list">
+{''.join(cards)}</section>
+<nav class="he-pagination">{nav}</nav>
+</body></html>
+"""
+
+
+def make_listing_fixtures(source, out_dir, pages, per_page):
+    # Cards carry the raw strings the scraper saw (before datasorter/processBeforeEDA)
+    with open(source, encoding="utf-8-sig", newline="") as f:
+        rows = [r for _, r in zip(range(pages * per_page), csv.DictReader(f))]
+    raw = []
+    for r in rows:
+        raw.append({
+            "ilan_id": r["ilan_id"],
+            "ilan_linki": r["ilan_linki"],
+            "ilan_tarihi": r["ilan_tarihi"],
+            "ilan_tipi": r["ilan_tipi"],
+            "metrekare": f"{float(r['metrekare']):g} m²",
+            "bina_yasi": f"{int(float(r['bina_yasi']))} Yaşında",
+            "kat": r["kat"],
+            "konum": r["konum"],
+            "fiyat": fmt_int(r["fiyat"]),
+            "para_birimi": r["para_birimi"],
+        })
+
+    os.makedirs(out_dir, exist_ok=True)
+    for page in range(1, pages + 1):
+        chunk = raw[(page - 1) * per_page:page * per_page]
+        with open(os.path.join(out_dir, f"page-{page}.html"), "w", encoding="utf-8") as f:
+            f.write(page_html([card_html(r) for r in chunk], page, pages))
+    with open(os.path.join(out_dir, "expected.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LISTING_COLUMNS)
+        writer.writeheader()
+        writer.writerows(raw)
+    print(f"Wrote {pages} listing pages ({len(raw)} cards) to {out_dir}")
+
+
+DETAIL_LABELS = {
+    "ilan_id": "İlan no",
+    "oda_sayisi": "Oda Sayısı",
+    "banyo_sayisi": "Banyo Sayısı",
+    "kat_sayisi": "Kat Sayısı",
+    "isinma_tipi": "Isınma Tipi",
+    "cephe": "Cephe",
+    "kullanim_durumu": "Kullanım Durumu",
+}
+# Spec rows the scraper must ignore
+DETAIL_EXTRA = [("Eşya Durumu", "Eşyalı Değil"), ("Krediye Uygunluk", "Krediye Uygun")]
+
+
+def detail_html(row):
+    specs = [(DETAIL_LABELS["ilan_id"], row["ilan_id"])] + DETAIL_EXTRA[:1]
+    specs += [(DETAIL_LABELS[k], v) for k, v in row.items() if k != "ilan_id" and v]
+    specs += DETAIL_EXTRA[1:]
+    items = "".join(
+        f'    <li class="spec-item"><span class="txt">{html.escape(label)}</span>'
+        f'<span class="value-txt">{html.escape(value)}</span></li>\n'
+        for label, value in specs)
+    return f"""<!DOCTYPE html>
+<html lang="tr"><head><meta charset="utf-8"><title>İlan {html.escape(row['ilan_id'])}</title></head>
+<body>
+<div class="spec-list">
+  <ul class="adv-info-list">
+{items}  </ul>
+</div>
+</body></html>
+"""
+
+
+def make_detail_fixtures(source, out_dir, count, missing_every=20):
+    # Every `missing_every`-th target has no page: the scraper must record it as NA
+    with open(source, encoding="utf-8-sig", newline="") as f:
+        rows = [r for _, r in zip(range(count), csv.DictReader(f))]
+    os.makedirs(out_dir, exist_ok=True)
+    fields = list(DETAIL_LABELS)
+    expected = []
+    for i, r in enumerate(rows):
+        row = {k: r[k] for k in fields}
+        if missing_every and i % missing_every == missing_every - 1:
+            expected.append({k: "NA" for k in fields} | {"ilan_id": row["ilan_id"]})
+            continue
+        with open(os.path.join(out_dir, f"{row['ilan_id']}.html"), "w", encoding="utf-8") as f:
+            f.write(detail_html(row))
+        expected.append(row)
+    with open(os.path.join(out_dir, "targets.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ilan_id"])
+        writer.writerows([r["ilan_id"]] for r in rows)
+    with open(os.path.join(out_dir, "expected.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(expected)
+    print(f"Wrote {len(rows)} detail targets ({sum(r['oda_sayisi'] != 'NA' for r in expected)} pages) to {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve scraper fixtures on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--max-rps", type=float, default=None, help="answer 429 above this request rate")
+    parser.add_argument("--make-fixtures", action="store_true", help="regenerate the fixture files and exit")
+    parser.add_argument("--source", default=os.path.join(HERE, "detailed-listings-cleaned.csv"))
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--per-page", type=int, default=24)
+    parser.add_argument("--details", type=int, default=200, help="detail-page targets to generate")
+    parser.add_argument("--detail-source", default=os.path.join(HERE, "extra-data.csv"))
+    args = parser.parse_args()
+
+    if args.make_fixtures:
+        make_listing_fixtures(args.source, os.path.join(FIXTURE_DIR, "listings"), args.pages, args.per_page)
+        make_detail_fixtures(args.detail_source, os.path.join(FIXTURE_DIR, "detail"), args.details)
+    else:
+        with FixtureServer(port=args.port, latency_ms=args.latency_ms, max_rps=args.max_rps) as server:
+            print(f"Serving {FIXTURE_DIR} on {server.base_url}/ (Ctrl+C to stop)")
+            try:
+                server.thread.join()
+            except KeyboardInterrupt:
+                pass
@@ -1,26 +1,31 @@
+import argparse
 import csv
+import os
+import queue
+import random
+import threading
 import time
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+
 import pandas as pd
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 
 target_file = "extra-data-targets.csv"
-output_file = f"extra-data.csv"
-
-
-df = pd.read_csv(target_file)
-if "ilan_id" not in df.columns:
-    raise ValueError("The CSV must contain a column named 'ilan_id'.")
+output_file = "extra-data.csv"
+links_file = "detailed-listings-cleaned.csv"
 
-ilan_ids = df["ilan_id"].dropna().astype(str).tolist()
-
-
-chrome_options = Options()
-chrome_options.debugger_address = "127.0.0.1:9222"
-driver = webdriver.Chrome(options=chrome_options)
+SPEC_SELECTOR = "li.spec-item"
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
 
 #field mapping
 label_map = {
@@ -34,60 +39,473 @@ label_map = {
 }
 fieldnames = list(label_map.values())
 
+# HTTP status of the page the browser loaded (0 when Chrome does not report it)
+STATUS_JS = """
+const nav = performance.getEntriesByType("navigation")[0];
+return nav && nav.responseStatus ? nav.responseStatus : 0;
+"""
 
-with open(output_file, "w", newline="", encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
+# (label, value) of every spec row in one round-trip
+SPECS_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).map(li => {
+    const label = li.querySelector("span");
+    const value = li.querySelector("span.value-txt");
+    return [label ? label.innerText.trim() : null, value ? value.innerText.trim() : null];
+});
+"""
 
 
-processed_ids = set()
+class NotFound(Exception):
+    """The listing has no detail page (HTTP 404/410); recorded as an NA row."""
 
-#scraping
-for ilan_id in ilan_ids:
-    if ilan_id in processed_ids:
-        print(f"[!] {ilan_id} already processed, skipping.")
-        continue
 
-    try:
-        search_box = driver.find_element(By.CSS_SELECTOR, "input[placeholder*='Konum']")
+class NoSpecs(Exception):
+    """A loaded page without spec rows (captcha, anti-bot or client-rendered); retried, never recorded."""
+
+    def __init__(self, ilan_id):
+        super().__init__(f"{ilan_id}: page has no spec rows (captcha, anti-bot or client-rendered page?)")
+
+
+class Throttled(Exception):
+    """The site asked us to slow down (HTTP 429/503)."""
+
+    def __init__(self, retry_after=None):
+        super().__init__(f"throttled (retry after {retry_after}s)" if retry_after else "throttled")
+        self.retry_after = retry_after
+
+
+def to_row(ilan_id, specs):
+    row = {field: "" for field in fieldnames}
+    for label, value in specs:
+        if label in label_map and value is not None:
+            row[label_map[label]] = value
+    row["ilan_id"] = ilan_id
+    return row
+
+
+def na_row(ilan_id):
+    row = {field: "NA" for field in fieldnames}
+    row["ilan_id"] = ilan_id
+    return row
+
+
+# --- Output and resume ---
+
+def load_done(path):
+    """ids already in the output file. A partial last line (crash mid-write) is cut off."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return {row["ilan_id"] for row in csv.DictReader(f) if row.get("ilan_id")}
+
+
+class ResultWriter:
+    # One append handle shared by all workers; each row is flushed so a crash
+    # loses at most the row being written.
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.lock = threading.Lock()
+        if new:
+            self.writer.writeheader()
+
+    def write(self, row):
+        with self.lock:
+            self.writer.writerow(row)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class StoreResultWriter:
+    # Detail rows go to the SQLite listing store, upserted `batch_size` at a time
+    def __init__(self, store, batch_size=25):
+        self.store = store
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def write(self, row):
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        self.store.upsert_details(self.pending)
+        self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.flush()
+        self.store.close()
+
+
+def open_output(out_path, store_path=None):
+    """(ids already done, writer) for the CSV output or, given store_path, the listing store."""
+    if store_path:
+        from listing_store import ListingStore
+        store = ListingStore(store_path)
+        return store.detail_done(), StoreResultWriter(store)
+    return load_done(out_path), ResultWriter(out_path)
+
+
+# --- Rate limiting ---
+
+class AdaptiveRateLimiter:
+    """Spaces requests across all workers and adapts the request rate.
+
+    Each success raises the rate by `increase` (relative, up to max_rate);
+    a throttle response halves it (down to min_rate) and honours
+    Retry-After. Throttles within a second of the last cut count once, so
+    workers that were all in flight do not collapse the rate together.
+    """
+
+    def __init__(self, rate=1.0, min_rate=0.2, max_rate=4.0, increase=0.02):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.next_at = time.monotonic()
+        self.last_cut = float("-inf")
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_at, now)
+            self.next_at = start + 1.0 / self.rate
+        time.sleep(max(0.0, start - now))
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate * (1 + self.increase))
+
+    def throttled(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_cut > 1.0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.last_cut = now
+            if retry_after:
+                self.next_at = max(self.next_at, now + retry_after)
+
+
+# --- Fetchers: fetch(ilan_id) -> [(label, value), ...] ---
+
+class SpecParser(HTMLParser):
+    # li.spec-item rows of a detail page: first span is the label, span.value-txt the value
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.specs = []
+        self.item = None      # [label, value] of the open li.spec-item
+        self.li_depth = 0
+        self.item_depth = 0
+        self.capture = None   # (index into item, span depth, text parts)
+        self.span_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get("class") or "").split()
+        if tag == "li":
+            self.li_depth += 1
+            if self.item is None and "spec-item" in classes:
+                self.item = [None, None]
+                self.item_depth = self.li_depth
+        elif tag == "span" and self.item is not None:
+            self.span_depth += 1
+            if self.capture is None:
+                if "value-txt" in classes and self.item[1] is None:
+                    self.capture = (1, self.span_depth, [])
+                elif self.item[0] is None:
+                    self.capture = (0, self.span_depth, [])
+
+    def handle_endtag(self, tag):
+        if tag == "span" and self.item is not None:
+            if self.capture is not None and self.capture[1] == self.span_depth:
+                index, _, parts = self.capture
+                self.item[index] = " ".join("".join(parts).split())
+                self.capture = None
+            self.span_depth -= 1
+        elif tag == "li":
+            if self.item is not None and self.li_depth == self.item_depth:
+                self.specs.append(tuple(self.item))
+                self.item = None
+                self.span_depth = 0
+            self.li_depth -= 1
+
+    def handle_data(self, data):
+        if self.capture is not None:
+            self.capture[2].append(data)
+
+
+def parse_specs(page_source):
+    parser = SpecParser()
+    parser.feed(page_source)
+    parser.close()
+    return parser.specs
+
+
+class HttpFetcher:
+    # Plain GET of the detail page; no browser, so many can run in parallel
+    def __init__(self, url_for, timeout=20):
+        self.url_for = url_for
+        self.timeout = timeout
+
+    def fetch(self, ilan_id):
+        request = urllib.request.Request(self.url_for(ilan_id), headers={
+            "User-Agent": USER_AGENT, "Accept-Language": "tr-TR,tr;q=0.9"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                page = response.read().decode("utf-8", errors="replace")
+        except urllib.error.HTTPError as err:
+            if err.code in (404, 410):
+                raise NotFound(ilan_id)
+            if err.code in (429, 503):
+                retry_after = err.headers.get("Retry-After")
+                raise Throttled(float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise
+        specs = parse_specs(page)
+        if not specs:
+            raise NoSpecs(ilan_id)
+        return specs
+
+    def close(self):
+        pass
+
+
+class BrowserFetcher:
+    # One headless Chrome per worker, loading the detail page directly
+    def __init__(self, url_for, timeout=10):
+        self.url_for = url_for
+        self.timeout = timeout
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument(f"--user-agent={USER_AGENT}")
+        self.driver = webdriver.Chrome(options=chrome_options)
+
+    def fetch(self, ilan_id):
+        self.driver.get(self.url_for(ilan_id))
+        try:
+            WebDriverWait(self.driver, self.timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, SPEC_SELECTOR)))
+        except TimeoutException:
+            if self.driver.execute_script(STATUS_JS) in (404, 410):
+                raise NotFound(ilan_id)
+            if self.driver.execute_script("return document.readyState") == "complete":
+                raise NoSpecs(ilan_id)
+            raise
+        return self.driver.execute_script(SPECS_JS, SPEC_SELECTOR)
+
+    def close(self):
+        self.driver.quit()
+
+
+class SearchFetcher:
+    # The original flow: type the id into the search box of an attached Chrome
+    def __init__(self, driver, timeout=10):
+        self.driver = driver
+        self.timeout = timeout
+
+    def fetch(self, ilan_id):
+        search_box = self.driver.find_element(By.CSS_SELECTOR, "input[placeholder*='Konum']")
         search_box.clear()
         search_box.send_keys(ilan_id)
 
-        previous_url = driver.current_url.strip()
+        previous_url = self.driver.current_url.strip()
         search_box.send_keys(Keys.ENTER)
-        time.sleep(3)
-        current_url = driver.current_url.strip()
-
-        if current_url == previous_url:
-            print(f"[×] {ilan_id} → Page did not change. Listing may not exist.")
-            row = {field: "NA" for field in fieldnames}
-            row["ilan_id"] = ilan_id
-            with open(output_file, "a", newline="", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writerow(row)
-            continue
-
-        row = {field: "" for field in fieldnames}
-        specs = driver.find_elements(By.CSS_SELECTOR, "li.spec-item")
-        for spec in specs:
+        try:
+            WebDriverWait(self.driver, self.timeout).until(EC.url_changes(previous_url))
+        except TimeoutException:
+            raise NotFound(ilan_id)
+        WebDriverWait(self.driver, self.timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, SPEC_SELECTOR)))
+        return self.driver.execute_script(SPECS_JS, SPEC_SELECTOR)
+
+    def close(self):
+        pass
+
+
+def attach_debugger(address="127.0.0.1:9222"):
+    chrome_options = Options()
+    chrome_options.debugger_address = address
+    return webdriver.Chrome(options=chrome_options)
+
+
+def url_resolver(links_path, url_template):
+    """ilan_id -> detail page URL: ilan_linki from the scraped listings, else the template."""
+    links = {}
+    if links_path and os.path.exists(links_path):
+        df = pd.read_csv(links_path, usecols=["ilan_id", "ilan_linki"], dtype=str)
+        links = dict(zip(df["ilan_id"], df["ilan_linki"]))
+    return lambda ilan_id: links.get(ilan_id) or url_template.format(ilan_id=ilan_id)
+
+
+# --- Worker pool ---
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ok = self.not_found = self.failed = self.retries = self.throttled = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+
+def worker(make_fetcher, work, writer, limiter, stats, max_retries, backoff):
+    fetcher = make_fetcher()
+    try:
+        while True:
             try:
-                label = spec.find_element(By.CSS_SELECTOR, "span").text.strip()
-                if label in label_map:
-                    value = spec.find_element(By.CSS_SELECTOR, "span.value-txt").text.strip()
-                    row[label_map[label]] = value
-            except:
-                continue
-
-        row["ilan_id"] = ilan_id
-        processed_ids.add(ilan_id)
-        print(f"[✓] {ilan_id} -> OK")
-
-        with open(output_file, "a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writerow(row)
-
-    except Exception as err:
-        print(f"[!] {ilan_id} -> ERROR: {err}")
-
-print(f"\nAll listings processed: {output_file}")
-driver.quit()
+                ilan_id = work.get_nowait()
+            except queue.Empty:
+                return
+            for attempt in range(max_retries + 1):
+                limiter.wait()
+                try:
+                    specs = fetcher.fetch(ilan_id)
+                except NotFound:
+                    print(f"[×] {ilan_id} → Listing not found.")
+                    writer.write(na_row(ilan_id))
+                    stats.add(not_found=1)
+                    limiter.success()
+                    break
+                except Throttled as err:
+                    limiter.throttled(err.retry_after)
+                    stats.add(throttled=1)
+                except Exception as err:
+                    print(f"[!] {ilan_id} -> ERROR: {err}")
+                else:
+                    writer.write(to_row(ilan_id, specs))
+                    stats.add(ok=1)
+                    limiter.success()
+                    print(f"[✓] {ilan_id} -> OK")
+                    break
+                if attempt < max_retries:
+                    stats.add(retries=1)
+                    # Exponential backoff with full jitter
+                    time.sleep(random.uniform(0, backoff * 2 ** attempt))
+            else:
+                # Left out of the output, so the next run picks it up again
+                print(f"[!] {ilan_id} -> giving up after {max_retries + 1} attempts")
+                stats.add(failed=1)
+    finally:
+        fetcher.close()
+
+
+def run(ilan_ids, out_path, make_fetcher, workers, limiter, max_retries=4, backoff=1.0, store_path=None):
+    done, writer = open_output(out_path, store_path)
+    todo = list(dict.fromkeys(i for i in ilan_ids if i not in done))
+    print(f"{len(ilan_ids)} targets, {len(ilan_ids) - len(todo)} already in {store_path or out_path}, "
+          f"{len(todo)} to fetch")
+
+    work = queue.Queue()
+    for ilan_id in todo:
+        work.put(ilan_id)
+    stats = Stats()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(make_fetcher, work, writer, limiter, stats,
+                                                     max_retries, backoff), daemon=True)
+               for _ in range(max(1, min(workers, len(todo))))]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    finished = stats.ok + stats.not_found
+    print(f"\n{finished} listings in {elapsed:.1f}s ({finished / max(elapsed, 1e-9) * 60:.0f} listings/minute, "
+          f"{workers} workers): {stats.ok} ok, {stats.not_found} not found, {stats.failed} failed, "
+          f"{stats.retries} retries, {stats.throttled} throttled; final rate {limiter.rate:.1f} req/s")
+    return stats, elapsed
+
+
+def read_targets(path):
+    df = pd.read_csv(path, dtype=str)
+    if "ilan_id" not in df.columns:
+        raise ValueError("The CSV must contain a column named 'ilan_id'.")
+    return df["ilan_id"].dropna().tolist()
+
+
+def run_fixtures(args):
+    # Enrich the fixture targets from the local stand-in server and compare with expected.csv
+    from fixture_server import FIXTURE_DIR, FixtureServer
+
+    detail_dir = os.path.join(FIXTURE_DIR, "detail")
+    with open(os.path.join(detail_dir, "expected.csv"), newline="", encoding="utf-8") as f:
+        expected = sorted(tuple(r.values()) for r in csv.DictReader(f))
+    out_path = args.out if args.out != output_file else "extra-data.fixtures.csv"
+    if not args.resume and os.path.exists(out_path):
+        os.remove(out_path)
+
+    with FixtureServer(latency_ms=args.latency_ms, max_rps=args.server_max_rps) as server:
+        url_for = lambda ilan_id: f"{server.base_url}/detail/{ilan_id}.html"  # noqa: E731
+        fetcher = BrowserFetcher if args.fetcher == "browser" else HttpFetcher
+        limiter = AdaptiveRateLimiter(args.rate, args.min_rate, args.max_rate)
+        run(read_targets(os.path.join(detail_dir, "targets.csv")), out_path,
+            lambda: fetcher(url_for), args.workers, limiter, args.max_retries, args.backoff)
+
+    with open(out_path, newline="", encoding="utf-8") as f:
+        got = sorted(tuple(r.values()) for r in csv.DictReader(f))
+    print(f"Output {'matches' if got == expected else 'DIFFERS FROM'} fixtures/detail/expected.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch detail-page fields for extra-data-targets.csv.")
+    parser.add_argument("--targets", default=target_file)
+    parser.add_argument("--out", default=output_file,
+                        help="appended to; ids already in it are skipped, so an interrupted run resumes")
+    parser.add_argument("--fetcher", choices=["search", "browser", "http"], default="search",
+                        help="search: the search box of an attached Chrome (one worker); browser: headless "
+                             "Chrome per worker; http: plain GET per worker")
+    parser.add_argument("--store", help="upsert into this SQLite listing store instead of appending to --out")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--debugger-address", default="127.0.0.1:9222")
+    parser.add_argument("--links", default=links_file, help="CSV with ilan_id,ilan_linki for direct fetchers")
+    parser.add_argument("--url-template", default="https://www.hepsiemlak.com/{ilan_id}",
+                        help="detail URL for ids not in --links")
+    parser.add_argument("--rate", type=float, default=1.0, help="initial requests/second, all workers together")
+    parser.add_argument("--min-rate", type=float, default=0.2)
+    parser.add_argument("--max-rate", type=float, default=4.0)
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=1.0, help="base seconds of the retry backoff")
+    parser.add_argument("--fixtures", action="store_true",
+                        help="run against the local fixture server and check the output")
+    parser.add_argument("--resume", action="store_true", help="with --fixtures: keep the previous output")
+    parser.add_argument("--latency-ms", type=float, default=50, help="with --fixtures: server delay per page")
+    parser.add_argument("--server-max-rps", type=float, default=None,
+                        help="with --fixtures: server answers 429 above this rate")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        if args.fetcher == "search":
+            parser.error("--fixtures needs --fetcher http or browser")
+        run_fixtures(args)
+        raise SystemExit
+    if args.fetcher == "search":
+        if args.workers != 1:
+            parser.error("the search fetcher drives a single attached Chrome; use --workers 1")
+        driver = attach_debugger(args.debugger_address)
+        try:
+            run(read_targets(args.targets), args.out, lambda: SearchFetcher(driver), 1,
+                AdaptiveRateLimiter(args.rate, args.min_rate, args.max_rate), args.max_retries, args.backoff,
+                args.store)
+        finally:
+            driver.quit()
+    else:
+        url_for = url_resolver(args.links, args.url_template)
+        fetcher = BrowserFetcher if args.fetcher == "browser" else HttpFetcher
+        run(read_targets(args.targets), args.out, lambda: fetcher(url_for), args.workers,
+            AdaptiveRateLimiter(args.rate, args.min_rate, args.max_rate), args.max_retries, args.backoff,
+            args.store)
+    print(f"\nAll listings processed: {args.store or args.out}")
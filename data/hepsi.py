@@ -1,116 +1,390 @@
+import argparse
 import csv
 import time
+from html.parser import HTMLParser
 from pathlib import Path
+from urllib.parse import urljoin
+
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-# Connect to Chrome Debugger
-chrome_options = Options()
-chrome_options.debugger_address = "127.0.0.1:9222"
-driver = webdriver.Chrome(options=chrome_options)
-
-# Switch to the correct tab by URL
-for handle in driver.window_handles:
-    driver.switch_to.window(handle)
-    if "hepsiemlak.com" in driver.current_url:
-        break
-else:
+CARD_SELECTOR = "article.listingView"
+NEXT_SELECTOR = "a.he-pagination__navigate-text--next"
+
+COLUMNS = [
+    "ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi",
+    "metrekare", "bina_yasi", "kat", "konum",
+    "fiyat", "para_birimi"
+]
+
+# Card fields: output key -> (CSS selector inside the card, parent class for "a > b" selectors)
+FIELDS = {
+    "tarih": ("span.list-view-date", None),
+    "tip": ("span.left", "short-property"),
+    "metrekare": ("span.squareMeter", None),
+    "bina_yasi": ("span.buildingAge", None),
+    "kat": ("span.floortype", None),
+    "konum": ("span.list-view-location", None),
+    "price": ("span.list-view-price", None),
+}
+
+# All cards of a page in one WebDriver round-trip. innerText is what
+# WebElement.text returns; a card missing any field is skipped, as before.
+# Experimental: not yet run against a real browser, so --extract defaults to html.
+EXTRACT_JS = """
+const pick = (card, sel) => {
+    const el = card.querySelector(sel);
+    return el ? el.innerText.trim() : null;
+};
+const rows = [];
+for (const card of document.querySelectorAll(arguments[0])) {
+    const link = card.querySelector("a.card-link");
+    const row = {
+        id: card.id,
+        link: link ? link.href : null,
+        tarih: pick(card, "span.list-view-date"),
+        tip: pick(card, "span.short-property > span.left"),
+        metrekare: pick(card, "span.squareMeter"),
+        bina_yasi: pick(card, "span.buildingAge"),
+        kat: pick(card, "span.floortype"),
+        konum: pick(card, "span.list-view-location"),
+        price: pick(card, "span.list-view-price"),
+    };
+    if (!Object.values(row).includes(null)) rows.push(row);
+}
+return rows;
+"""
+
+
+def connect_debugger(address="127.0.0.1:9222"):
+    # Connect to Chrome Debugger and switch to the hepsiemlak tab
+    chrome_options = Options()
+    chrome_options.debugger_address = address
+    driver = webdriver.Chrome(options=chrome_options)
+
+    for handle in driver.window_handles:
+        driver.switch_to.window(handle)
+        if "hepsiemlak.com" in driver.current_url:
+            return driver
     print("Hepsiemlak tab not found.")
     driver.quit()
-    exit()
-
-# Helper function to write rows
-def write_rows(rows, csv_path: Path):
-    mode = "a" if csv_path.exists() else "w"
-    with csv_path.open(mode, newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        if mode == "w":
-            w.writerow([
-                "ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi",
-                "metrekare", "bina_yasi", "kat", "konum",
-                "fiyat", "para_birimi"
-            ])
-        for v in rows:
-            w.writerow([
-                v["id"], v["link"], v["tarih"], v["tip"],
-                v["metrekare"], v["bina_yasi"], v["kat"], v["konum"],
-                v["fiyat"], v["para_birimi"]
-            ])
+    raise SystemExit(1)
+
+
+def headless_driver():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    return webdriver.Chrome(options=chrome_options)
+
+
+def to_row(card):
+    # Split "4.500.000 TL" into amount and currency
+    parts = card["price"].split()
+    return {
+        "id": card["id"],
+        "link": card["link"],
+        "tarih": card["tarih"],
+        "tip": card["tip"],
+        "metrekare": card["metrekare"],
+        "bina_yasi": card["bina_yasi"],
+        "kat": card["kat"],
+        "konum": card["konum"],
+        "fiyat": parts[0],
+        "para_birimi": parts[1] if len(parts) > 1 else "",
+    }
+
+
+def record(v):
+    return [v["id"], v["link"], v["tarih"], v["tip"],
+            v["metrekare"], v["bina_yasi"], v["kat"], v["konum"],
+            v["fiyat"], v["para_birimi"]]
+
+
+class ListingWriter:
+    # Keeps the CSV open for the whole run and flushes every `flush_pages`
+    # pages, instead of reopening the file for each page.
+    def __init__(self, csv_path: Path, flush_pages=10):
+        new = not csv_path.exists() or csv_path.stat().st_size == 0
+        self.file = csv_path.open("a", newline="", encoding="utf-8", buffering=1 << 16)
+        self.writer = csv.writer(self.file)
+        self.flush_pages = flush_pages
+        self.pages = 0
+        self.rows = 0
+        if new:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows([record(v) for v in rows])
+        self.rows += len(rows)
+        self.pages += 1
+        if self.pages % self.flush_pages == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StoreWriter:
+    # Upserts each page into the SQLite listing store (one transaction per page)
+    def __init__(self, db_path):
+        from listing_store import ListingStore
+        self.store = ListingStore(db_path)
+        self.rows = 0
+
+    def write(self, rows):
+        self.store.upsert_listings([dict(zip(COLUMNS, record(v))) for v in rows])
+        self.rows += len(rows)
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Extraction strategies ---
+
+def extract_js(driver):
+    return [to_row(card) for card in driver.execute_script(EXTRACT_JS, CARD_SELECTOR)]
+
+
+class CardParser(HTMLParser):
+    # Minimal page_source parser for the listing cards: tracks the open
+    # element stack and captures the text of the FIELDS elements per card.
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.stack = []  # (tag, classes)
+        self.cards = []
+        self.card = None
+        self.card_depth = None
+        self.capture = None  # (field, depth, text parts)
+
+    @staticmethod
+    def matches(selector, tag, classes):
+        sel_tag, sel_class = selector.split(".", 1)
+        return tag == sel_tag and sel_class in classes
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        parent_classes = self.stack[-1][1] if self.stack else []
+        if tag not in self.VOID:
+            self.stack.append((tag, classes))
+        depth = len(self.stack)
+
+        if self.card is None:
+            if tag == "article" and "listingView" in classes:
+                self.card = {"id": attrs.get("id")}
+                self.card_depth = depth
+            return
+        if tag == "a" and "card-link" in classes and "link" not in self.card:
+            self.card["link"] = urljoin(self.base_url, attrs.get("href") or "")
+        if self.capture is None:
+            for field, (selector, parent) in FIELDS.items():
+                if field not in self.card and self.matches(selector, tag, classes) \
+                        and (parent is None or parent in parent_classes):
+                    self.capture = (field, depth, [])
+                    break
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID or not self.stack:
+            return
+        depth = len(self.stack)
+        if self.capture is not None and depth == self.capture[1]:
+            field, _, parts = self.capture
+            self.card[field] = " ".join("".join(parts).split())
+            self.capture = None
+        if self.card is not None and depth == self.card_depth:
+            if all(k in self.card for k in ["link", *FIELDS]):
+                self.cards.append(self.card)
+            self.card = None
+        self.stack.pop()
+
+    def handle_data(self, data):
+        if self.capture is not None:
+            self.capture[2].append(data)
+
+
+def parse_cards(page_source, base_url):
+    parser = CardParser(base_url)
+    parser.feed(page_source)
+    parser.close()
+    return [to_row(card) for card in parser.cards]
+
+
+def extract_html(driver):
+    return parse_cards(driver.page_source, driver.current_url)
+
+
+def extract_legacy(driver):
+    # One find_element round-trip per field per card (the original path,
+    # kept for the benchmark)
+    data = []
+    for it in driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR):
+        try:
+            data.append(to_row({
+                "id": it.get_attribute("id"),
+                "link": it.find_element(By.CSS_SELECTOR, "a.card-link").get_attribute("href"),
+                "tarih": it.find_element(By.CSS_SELECTOR, "span.list-view-date").text.strip(),
+                "tip": it.find_element(By.CSS_SELECTOR, "span.short-property > span.left").text.strip(),
+                "metrekare": it.find_element(By.CSS_SELECTOR, "span.squareMeter").text.strip(),
+                "bina_yasi": it.find_element(By.CSS_SELECTOR, "span.buildingAge").text.strip(),
+                "kat": it.find_element(By.CSS_SELECTOR, "span.floortype").text.strip(),
+                "konum": it.find_element(By.CSS_SELECTOR, "span.list-view-location").text.strip(),
+                "price": it.find_element(By.CSS_SELECTOR, "span.list-view-price").text.strip(),
+            }))
+        except NoSuchElementException:
+            continue
+    return data
+
+
+EXTRACTORS = {"js": extract_js, "html": extract_html, "legacy": extract_legacy}
+
 
 # Scrape all listings on the current page
-def scrape_current_page():
+def scrape_current_page(driver, extract, interactive=True):
     try:
         WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "article.listingView"))
+            EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR))
         )
     except TimeoutException:
+        if not interactive:
+            raise
         print("Listings did not load. If CAPTCHA exists, pass it and press Enter.")
         input()
         WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "article.listingView"))
+            EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR))
         )
 
-    items = driver.find_elements(By.CSS_SELECTOR, "article.listingView")
-    data = []
-    for it in items:
+    data = extract(driver)
+    print(f"{len(data)} listings scraped.")
+    return data
+
+
+def page_key(driver):
+    # The URL and first ilan_id identify a result page, also when the site
+    # re-renders the cards in place instead of replacing them
+    return driver.current_url, driver.find_element(By.CSS_SELECTOR, CARD_SELECTOR).get_attribute("id")
+
+
+def page_changed(first_card, before):
+    def check(driver):
         try:
-            ilan_id = it.get_attribute("id")
-            link = it.find_element(By.CSS_SELECTOR, "a.card-link").get_attribute("href")
-            tarih = it.find_element(By.CSS_SELECTOR, "span.list-view-date").text.strip()
-            tip = it.find_element(By.CSS_SELECTOR, "span.short-property > span.left").text.strip()
-            metrekare = it.find_element(By.CSS_SELECTOR, "span.squareMeter").text.strip()
-            bina_yasi = it.find_element(By.CSS_SELECTOR, "span.buildingAge").text.strip()
-            kat = it.find_element(By.CSS_SELECTOR, "span.floortype").text.strip()
-            konum = it.find_element(By.CSS_SELECTOR, "span.list-view-location").text.strip()
-
-            price_text = it.find_element(By.CSS_SELECTOR, "span.list-view-price").text.strip()
-            parts = price_text.split()
-            fiyat = parts[0]
-            para_birimi = parts[1] if len(parts) > 1 else ""
-
-            data.append({
-                "id": ilan_id,
-                "link": link,
-                "tarih": tarih,
-                "tip": tip,
-                "metrekare": metrekare,
-                "bina_yasi": bina_yasi,
-                "kat": kat,
-                "konum": konum,
-                "fiyat": fiyat,
-                "para_birimi": para_birimi
-            })
+            first_card.is_enabled()
+        except StaleElementReferenceException:
+            return True
+        return page_key(driver) != before
+    return check
+
+
+def go_to_next_page(driver, timeout=15, retries=2):
+    """Click "next" and wait until the page changes; False on the last page.
+
+    A click that does not change the page within `timeout` is retried; after
+    `retries` retries the scrape stops here rather than raising, so the pages
+    written so far are kept.
+    """
+    for attempt in range(retries + 1):
+        try:
+            nxt = driver.find_element(By.CSS_SELECTOR, NEXT_SELECTOR)
         except NoSuchElementException:
-            continue
+            return False
+        first_card = driver.find_element(By.CSS_SELECTOR, CARD_SELECTOR)
+        before = page_key(driver)
+        driver.execute_script("arguments[0].click();", nxt)
+        try:
+            WebDriverWait(driver, timeout).until(page_changed(first_card, before))
+            return True
+        except TimeoutException:
+            print(f"Page did not change {timeout}s after clicking next (attempt {attempt + 1}).")
+    print("Stopping: the next page did not load.")
+    return False
 
-    print(f"{len(data)} listings scraped.")
-    return data
 
 # Loop through all pages
-def scrape_all(csv_path: Path):
+def scrape_all(driver, writer, extract=extract_html, interactive=True):
     total = 0
-    while True:
-        print(f"Page: {driver.current_url}")
-        rows = scrape_current_page()
-        write_rows(rows, csv_path)
-        total += len(rows)
+    pages = 0
+    start = time.perf_counter()
+    with writer:
+        while True:
+            print(f"Page: {driver.current_url}")
+            rows = scrape_current_page(driver, extract, interactive)
+            writer.write(rows)
+            total += len(rows)
+            pages += 1
 
-        try:
-            nxt = driver.find_element(By.CSS_SELECTOR, "a.he-pagination__navigate-text--next")
-            driver.execute_script("arguments[0].click();", nxt)
-            time.sleep(1.0)
-        except NoSuchElementException:
-            print("No next page found. Scraping finished.")
-            break
+            if not go_to_next_page(driver):
+                print("No next page found. Scraping finished.")
+                break
+
+    elapsed = time.perf_counter() - start
+    print(f"Total {total} listings saved")
+    print(f"{pages} pages in {elapsed:.1f}s ({pages / elapsed * 60:.0f} pages/minute)")
+    return pages, total, elapsed
+
+
+def run_fixtures(args):
+    # Scrape the local fixture pages with each extractor and compare with expected.csv
+    from fixture_server import FIXTURE_DIR, FixtureServer
+
+    expected_path = Path(FIXTURE_DIR) / "listings" / "expected.csv"
+    with expected_path.open(encoding="utf-8", newline="") as f:
+        expected = list(csv.reader(f))
+
+    driver = headless_driver()
+    try:
+        with FixtureServer(latency_ms=args.latency_ms) as server:
+            for name in args.extract.split(","):
+                out = Path(args.out).with_suffix(f".{name}.csv")
+                out.unlink(missing_ok=True)
+                driver.get(f"{server.base_url}/listings/page-1.html")
+                pages, total, elapsed = scrape_all(driver, ListingWriter(out), EXTRACTORS[name],
+                                                     interactive=False)
+                with out.open(encoding="utf-8", newline="") as f:
+                    ok = list(csv.reader(f)) == expected
+                print(f"[{name}] {pages / elapsed * 60:.0f} pages/minute, "
+                      f"{'matches' if ok else 'DIFFERS FROM'} {expected_path.name}")
+    finally:
+        driver.quit()
 
-    print(f"Total {total} listings saved to {csv_path}")
 
 # Main run
 if __name__ == "__main__":
-    out = Path("ilan_detaylari.csv")
-    scrape_all(out)
-    driver.quit()
+    parser = argparse.ArgumentParser(description="Scrape hepsiemlak listing pages from an attached Chrome.")
+    parser.add_argument("--out", default="ilan_detaylari.csv")
+    parser.add_argument("--store", help="upsert into this SQLite listing store instead of appending to --out")
+    parser.add_argument("--extract", default="html",
+                        help="html (parse page_source), js (one execute_script per page; experimental) "
+                             "or legacy; with --fixtures a comma-separated list to compare")
+    parser.add_argument("--debugger-address", default="127.0.0.1:9222")
+    parser.add_argument("--fixtures", action="store_true",
+                        help="scrape the local fixture pages in headless Chrome and report pages/minute")
+    parser.add_argument("--latency-ms", type=float, default=0, help="with --fixtures: server delay per response")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        run_fixtures(args)
+    else:
+        driver = connect_debugger(args.debugger_address)
+        try:
+            writer = StoreWriter(args.store) if args.store else ListingWriter(Path(args.out))
+            scrape_all(driver, writer, EXTRACTORS[args.extract])
+        finally:
+            driver.quit()
@@ -0,0 +1,314 @@
+# listing_store.py
+# Embedded SQLite store for scraped listings, replacing the append-only CSVs.
+#
+#   listings            one row per ilan_id: list-page fields (hepsi.py), detail
+#                       fields (hepsi-2.py), il/ilce split from konum, and `seq`,
+#                       the batch number of the last upsert that changed the row;
+#                       indexed on (il, ilce), ilan_tarihi (as ISO ilan_gunu) and seq
+#   price_observations  (ilan_id, observed_at) -> fiyat, para_birimi, every
+#                       time a list page shows the listing
+#   cursors             per-consumer last seen seq, for incremental pulls
+#
+# Upserts are batched into one transaction. A re-scraped listing whose fields
+# did not change keeps its seq, so pull() hands downstream stages only new or
+# changed listings. export() writes the existing CSV layouts.
+#
+#   python listing_store.py import-listings hepsiemlak_500k+.txt
+#   python listing_store.py import-details extra-data.csv
+#   python listing_store.py export --layout listings --out hepsiemlak_500k+.txt
+#   python listing_store.py pull --consumer datasorter --out new-listings.csv
+import argparse
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+DEFAULT_PATH = "listings.sqlite"
+
+LISTING_COLUMNS = ["ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare",
+                   "bina_yasi", "kat", "konum", "fiyat", "para_birimi"]
+DETAIL_COLUMNS = ["ilan_id", "oda_sayisi", "banyo_sayisi", "kat_sayisi",
+                  "isinma_tipi", "cephe", "kullanim_durumu"]
+LAYOUTS = {"listings": LISTING_COLUMNS, "extra": DETAIL_COLUMNS}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    ilan_id TEXT PRIMARY KEY,
+    ilan_linki TEXT,
+    ilan_tarihi TEXT,
+    -- ilan_tarihi is DD-MM-YYYY; ISO form so the index serves date ranges
+    ilan_gunu TEXT GENERATED ALWAYS AS (
+        substr(ilan_tarihi, 7, 4) || '-' || substr(ilan_tarihi, 4, 2) || '-' || substr(ilan_tarihi, 1, 2)
+    ) VIRTUAL,
+    ilan_tipi TEXT,
+    metrekare TEXT,
+    bina_yasi TEXT,
+    kat TEXT,
+    konum TEXT,
+    il TEXT,
+    ilce TEXT,
+    fiyat INTEGER,
+    para_birimi TEXT,
+    oda_sayisi TEXT,
+    banyo_sayisi TEXT,
+    kat_sayisi TEXT,
+    isinma_tipi TEXT,
+    cephe TEXT,
+    kullanim_durumu TEXT,
+    detail_missing INTEGER,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    detail_fetched TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS listings_il_ilce ON listings (il, ilce);
+CREATE INDEX IF NOT EXISTS listings_ilan_gunu ON listings (ilan_gunu);
+CREATE INDEX IF NOT EXISTS listings_seq ON listings (seq);
+CREATE TABLE IF NOT EXISTS price_observations (
+    ilan_id TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    fiyat INTEGER,
+    para_birimi TEXT,
+    PRIMARY KEY (ilan_id, observed_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cursors (
+    consumer TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+LIST_FIELDS = ["ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare", "bina_yasi",
+               "kat", "konum", "il", "ilce", "fiyat", "para_birimi"]
+DETAIL_FIELDS = DETAIL_COLUMNS[1:] + ["detail_missing"]
+
+
+def changed(fields):
+    return " OR ".join(f"{f} IS NOT excluded.{f}" for f in fields)
+
+
+UPSERT_LISTING = f"""
+INSERT INTO listings (ilan_id, {", ".join(LIST_FIELDS)}, first_seen, last_seen, seq)
+VALUES (?, {", ".join("?" for _ in LIST_FIELDS)}, ?, ?, ?)
+ON CONFLICT (ilan_id) DO UPDATE SET
+    {", ".join(f"{f} = excluded.{f}" for f in LIST_FIELDS)},
+    last_seen = excluded.last_seen,
+    seq = CASE WHEN {changed(LIST_FIELDS)} THEN excluded.seq ELSE seq END
+"""
+
+# Detail rows for listings not seen on a list page yet create a stub row
+UPSERT_DETAIL = f"""
+INSERT INTO listings (ilan_id, {", ".join(DETAIL_FIELDS)}, first_seen, last_seen, detail_fetched, seq)
+VALUES (?, {", ".join("?" for _ in DETAIL_FIELDS)}, ?, ?, ?, ?)
+ON CONFLICT (ilan_id) DO UPDATE SET
+    {", ".join(f"{f} = excluded.{f}" for f in DETAIL_FIELDS)},
+    detail_fetched = excluded.detail_fetched,
+    seq = CASE WHEN {changed(DETAIL_FIELDS)} THEN excluded.seq ELSE seq END
+"""
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def clean_fiyat(value):
+    # Same rule as datasorter.clean_fiyat: "4.500.000" -> 4500000
+    if value is None or value == "":
+        return None
+    digits = str(value).replace(".", "").replace(",", "")
+    return int(digits) if digits.isdigit() else None
+
+
+def split_konum(konum):
+    # Same rule as sege_index.split_konum: "İl / İlçe / Mahalle"
+    if not konum:
+        return None, None
+    parts = konum.split("/")
+    return parts[0].strip(), parts[1].strip() if len(parts) > 1 else None
+
+
+def blank(value):
+    # CSV readers give "" or NaN for empty cells; store NULL
+    return None if value is None or value == "" or (isinstance(value, float) and value != value) else value
+
+
+class ListingStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        # Scraper worker threads share the connection; callers serialize writes
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def new_batch(self, kind, rows, observed_at):
+        cursor = self.db.execute("INSERT INTO batches (kind, rows, created_at) VALUES (?, ?, ?)",
+                                 (kind, rows, observed_at))
+        return cursor.lastrowid
+
+    def upsert_listings(self, rows, observed_at=None):
+        """List-page rows (dicts with LISTING_COLUMNS keys) in one transaction; records prices."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        observed_at = observed_at or now_iso()
+        with self.db:
+            seq = self.new_batch("listings", len(rows), observed_at)
+            params, prices = [], []
+            for r in rows:
+                fiyat = clean_fiyat(r["fiyat"])
+                para_birimi = blank(r["para_birimi"])
+                il, ilce = split_konum(blank(r["konum"]))
+                params.append((r["ilan_id"], blank(r["ilan_linki"]), blank(r["ilan_tarihi"]),
+                               blank(r["ilan_tipi"]), blank(r["metrekare"]), blank(r["bina_yasi"]),
+                               blank(r["kat"]), blank(r["konum"]), il, ilce, fiyat, para_birimi,
+                               observed_at, observed_at, seq))
+                prices.append((r["ilan_id"], observed_at, fiyat, para_birimi))
+            self.db.executemany(UPSERT_LISTING, params)
+            self.db.executemany("INSERT OR REPLACE INTO price_observations VALUES (?, ?, ?, ?)", prices)
+        return len(rows)
+
+    def upsert_details(self, rows, observed_at=None):
+        """Detail-page rows (dicts with DETAIL_COLUMNS keys) in one transaction.
+
+        An all-"NA" row (no detail page) is stored as detail_missing = 1.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        observed_at = observed_at or now_iso()
+        with self.db:
+            seq = self.new_batch("details", len(rows), observed_at)
+            params = []
+            for r in rows:
+                values = [blank(r[c]) for c in DETAIL_COLUMNS[1:]]
+                missing = all(v == "NA" for v in values)
+                if missing:
+                    values = [None] * len(values)
+                params.append((r["ilan_id"], *values, int(missing), observed_at, observed_at, observed_at, seq))
+            self.db.executemany(UPSERT_DETAIL, params)
+        return len(rows)
+
+    def detail_done(self):
+        """ids whose detail page has been fetched (or found missing)."""
+        return {i for (i,) in self.db.execute("SELECT ilan_id FROM listings WHERE detail_fetched IS NOT NULL")}
+
+    def last_seq(self):
+        return self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM batches").fetchone()[0]
+
+    def changes(self, since=0, layout=None, upto=None):
+        """Listings added or changed after batch `since` (up to batch `upto`), as a DataFrame.
+
+        With a layout, only the rows and columns of that CSV layout: scraped
+        listings for "listings", fetched detail pages ("NA" rows included)
+        for "extra".
+        """
+        query = "SELECT * FROM listings WHERE seq > ?"
+        params = [since]
+        if upto is not None:
+            query += " AND seq <= ?"
+            params.append(upto)
+        if layout == "listings":
+            query += " AND konum IS NOT NULL"
+        elif layout == "extra":
+            query += " AND detail_fetched IS NOT NULL"
+        # rowid order = order of first appearance in the store
+        df = pd.read_sql_query(query + " ORDER BY rowid", self.db, params=params)
+        df["fiyat"] = df["fiyat"].astype("Int64")
+        if layout == "extra":
+            df.loc[df["detail_missing"] == 1, DETAIL_COLUMNS[1:]] = "NA"
+        return df[LAYOUTS[layout]] if layout else df
+
+    def pull(self, consumer, layout=None):
+        """Listings new or changed since `consumer` last pulled, and the batch to commit.
+
+        The cursor only moves in commit_pull, once the caller has used the
+        rows; a crash in between delivers the same rows again.
+        """
+        since = self.db.execute("SELECT seq FROM cursors WHERE consumer = ?", (consumer,)).fetchone()
+        upto = self.last_seq()
+        return self.changes(since[0] if since else 0, layout, upto), upto
+
+    def commit_pull(self, consumer, upto):
+        with self.db:
+            self.db.execute("INSERT INTO cursors VALUES (?, ?) "
+                            "ON CONFLICT (consumer) DO UPDATE SET seq = excluded.seq", (consumer, upto))
+
+    def price_history(self, ilan_id):
+        return pd.read_sql_query(
+            "SELECT observed_at, fiyat, para_birimi FROM price_observations WHERE ilan_id = ? ORDER BY observed_at",
+            self.db, params=(ilan_id,))
+
+    def export(self, layout, path, since=0):
+        """Write the listings/extra CSV layout that the CSV-based stages read."""
+        df = self.changes(since, layout)
+        df.to_csv(path, index=False, encoding="utf-8")
+        return len(df)
+
+    def stats(self):
+        q = self.db.execute
+        return {
+            "listings": q("SELECT COUNT(*) FROM listings WHERE konum IS NOT NULL").fetchone()[0],
+            "with_details": q("SELECT COUNT(*) FROM listings WHERE detail_fetched IS NOT NULL").fetchone()[0],
+            "price_observations": q("SELECT COUNT(*) FROM price_observations").fetchone()[0],
+            "batches": self.last_seq(),
+        }
+
+    def close(self):
+        self.db.close()
+
+
+def read_rows(path, columns, chunksize):
+    # Everything as text, so the store sees the same strings the scrapers wrote
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize, encoding="utf-8-sig"):
+        missing = set(columns) - set(chunk.columns)
+        if missing:
+            raise ValueError(f"{path}: missing columns {sorted(missing)}")
+        yield chunk[columns].to_dict("records")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite listing store: import, export, incremental pulls.")
+    parser.add_argument("command", choices=["import-listings", "import-details", "export", "pull", "stats"])
+    parser.add_argument("path", nargs="?", help="CSV to import")
+    parser.add_argument("--db", default=DEFAULT_PATH)
+    parser.add_argument("--observed-at", help="timestamp recorded for imported rows (default: now)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per upsert transaction")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="listings")
+    parser.add_argument("--out", help="CSV to write (export, pull)")
+    parser.add_argument("--consumer", help="pull: name of the downstream stage")
+    args = parser.parse_args()
+
+    store = ListingStore(args.db)
+    start = time.perf_counter()
+    try:
+        if args.command in ("import-listings", "import-details"):
+            if not args.path:
+                parser.error(f"{args.command} needs a CSV path")
+            details = args.command == "import-details"
+            upsert = store.upsert_details if details else store.upsert_listings
+            total = 0
+            for rows in read_rows(args.path, DETAIL_COLUMNS if details else LISTING_COLUMNS, args.batch_size):
+                total += upsert(rows, args.observed_at)
+            print(f"Upserted {total} rows from {args.path} in {time.perf_counter() - start:.1f}s")
+        elif args.command == "export":
+            n = store.export(args.layout, args.out or f"{args.layout}-export.csv")
+            print(f"Exported {n} rows to {args.out or f'{args.layout}-export.csv'}")
+        elif args.command == "pull":
+            if not args.consumer:
+                parser.error("pull needs --consumer")
+            df, upto = store.pull(args.consumer, args.layout)
+            out = args.out or f"{args.consumer}-changes.csv"
+            df.to_csv(out, index=False, encoding="utf-8")
+            store.commit_pull(args.consumer, upto)
+            print(f"{len(df)} new or changed listings for {args.consumer} -> {out} (up to batch {upto})")
+        print(", ".join(f"{k}: {v}" for k, v in store.stats().items()))
+    finally:
+        store.close()
@@ -1,25 +1,30 @@
-import pandas as pd
+import os
+import sys
 
-# Read the real estate listings data
-listings = pd.read_csv("hepsiemlak_500k_sorted.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import schema
+from sege_index import SegeIndex, split_konum, print_match_report
 
-# Read the SEGE scores data
-sege = pd.read_csv("sege_scores.csv")
+# Read the real estate listings data (konum is needed for il/ilce below)
+listings = schema.read_csv("hepsiemlak_500k_sorted.csv", keep_text=True)
 
-# Convert SEGE column names to lowercase and replace spaces with underscores
-sege.columns = sege.columns.str.lower().str.replace(' ', '_')
-
-# Convert 'kademe' column to string (to avoid potential issues during merging)
-sege['kademe'] = sege['kademe'].astype(str)
+# Build the normalized SEGE lookup index (lowercased columns, string 'kademe')
+index = SegeIndex.from_csv("sege_scores.csv")
 
 # Split the 'konum' column into 'il' (city) and 'ilce' (district)
-listings['il'] = listings['konum'].apply(lambda x: x.split('/')[0].strip())
-listings['ilce'] = listings['konum'].apply(lambda x: x.split('/')[1].strip() if len(x.split('/')) > 1 else None)
+listings['il'], listings['ilce'] = split_konum(listings['konum'])
+
+# Resolve each (il, ilce) to a SEGE district code and attach its columns
+codes, kinds = index.match(listings['il'], listings['ilce'])
+# Columns are only added, so the listings frame is extended rather than copied
+merged = listings
+for col in index.table.columns.drop(["il", "ilce"]):
+    merged[col] = index.column(col, codes).to_numpy()
 
-# Perform the merge operation
-merged = listings.merge(sege, on=["il", "ilce"], how="left")
+print_match_report(listings['il'], listings['ilce'], codes, kinds, index)
 
-# Save the merged dataset
+# Save the merged dataset (without ilan_linki/konum when PIPELINE_DROP_TEXT is set)
+merged = schema.drop_text(merged)
 merged.to_csv("hepsiemlak_500k_with_sege.csv", index=False, encoding="utf-8")
 
-print("Datasets merged successfully.")
\ No newline at end of file
+print("Datasets merged successfully.")
@@ -0,0 +1,133 @@
+# sege_index.py
+# Normalized (il, ilce) -> district lookup for joining listings with SEGE scores.
+#
+# Keys are Turkish-aware casefolded and stripped of diacritics, so
+# "KADIKÖY", "Kadıköy" and "kadikoy" all resolve to the same district code
+# (the row position in sege_scores.csv). Names that still miss get a cached
+# fuzzy match within the same province.
+import difflib
+import re
+
+import numpy as np
+import pandas as pd
+
+# Turkish casefolding: dotted/dotless I must be handled before lower()
+TR_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+# Diacritic folding applied after lowercasing
+TR_FOLD = str.maketrans({
+    "ı": "i", "ç": "c", "ğ": "g", "ö": "o", "ş": "s", "ü": "u",
+    "â": "a", "î": "i", "û": "u",
+})
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+FUZZY_CUTOFF = 0.85
+
+
+def normalize_name(name):
+    if not isinstance(name, str):
+        return None
+    folded = name.translate(TR_UPPER).lower().translate(TR_FOLD)
+    folded = NON_ALNUM.sub(" ", folded).strip()
+    return folded or None
+
+
+def split_konum(konum):
+    """Split 'Il / Ilce / Mahalle' into il and ilce Series.
+
+    Only the distinct konum strings are split, then broadcast back to the rows.
+    """
+    codes, uniques = pd.factorize(konum)
+    parts = pd.Series(uniques, dtype=object).str.split("/")
+    il = parts.str[0].str.strip().to_numpy(dtype=object)
+    ilce = parts.str[1].str.strip().to_numpy(dtype=object)
+
+    # factorize marks missing konum as -1
+    il = np.append(il, None)[codes]
+    ilce = np.append(ilce, None)[codes]
+    return pd.Series(il, index=konum.index), pd.Series(ilce, index=konum.index)
+
+
+class SegeIndex:
+    def __init__(self, sege):
+        self.table = sege.reset_index(drop=True)
+        self.keys = {}
+        self.ilce_by_il = {}
+        for code, (il, ilce) in enumerate(zip(self.table["il"], self.table["ilce"])):
+            il_key, ilce_key = normalize_name(il), normalize_name(ilce)
+            self.keys.setdefault((il_key, ilce_key), code)
+            self.ilce_by_il.setdefault(il_key, []).append(ilce_key)
+        self.fuzzy_cache = {}
+
+    @classmethod
+    def from_csv(cls, path="sege_scores.csv"):
+        sege = pd.read_csv(path)
+        # Convert SEGE column names to lowercase and replace spaces with underscores
+        sege.columns = sege.columns.str.lower().str.replace(' ', '_')
+        # Convert 'kademe' column to string (to avoid potential issues during merging)
+        sege['kademe'] = sege['kademe'].astype(str)
+        return cls(sege)
+
+    def fuzzy_lookup(self, il_key, ilce_key):
+        cache_key = (il_key, ilce_key)
+        if cache_key not in self.fuzzy_cache:
+            code = -1
+            if il_key not in self.ilce_by_il:
+                close = difflib.get_close_matches(il_key, self.ilce_by_il.keys(), n=1, cutoff=FUZZY_CUTOFF)
+                il_key = close[0] if close else None
+            if il_key is not None:
+                close = difflib.get_close_matches(ilce_key, self.ilce_by_il[il_key], n=1, cutoff=FUZZY_CUTOFF)
+                if close:
+                    code = self.keys[(il_key, close[0])]
+            self.fuzzy_cache[cache_key] = code
+        return self.fuzzy_cache[cache_key]
+
+    def match(self, il, ilce, fuzzy=True):
+        """Return (district codes, match kind) arrays aligned with the input rows.
+
+        Codes are -1 for unmatched rows; kind is "exact", "fuzzy" or "none".
+        """
+        pairs = pd.MultiIndex.from_arrays([il, ilce])
+        pair_codes, uniques = pd.factorize(pairs)
+
+        n = len(uniques)
+        codes = np.full(n + 1, -1, dtype=np.int64)
+        kinds = np.full(n + 1, "none", dtype=object)
+        for i, (u_il, u_ilce) in enumerate(uniques):
+            il_key, ilce_key = normalize_name(u_il), normalize_name(u_ilce)
+            if il_key is None or ilce_key is None:
+                continue
+            code = self.keys.get((il_key, ilce_key), -1)
+            if code >= 0:
+                codes[i], kinds[i] = code, "exact"
+            elif fuzzy:
+                code = self.fuzzy_lookup(il_key, ilce_key)
+                if code >= 0:
+                    codes[i], kinds[i] = code, "fuzzy"
+
+        return codes[pair_codes], kinds[pair_codes]
+
+    def column(self, name, codes):
+        values = self.table[name].to_numpy()
+        out = pd.Series(values[np.where(codes >= 0, codes, 0)])
+        return out.where(codes >= 0)
+
+
+def print_match_report(il, ilce, codes, kinds, index, top=20):
+    total = len(kinds)
+    exact = int((kinds == "exact").sum())
+    fuzzy = int((kinds == "fuzzy").sum())
+    unmatched = total - exact - fuzzy
+    rate = (exact + fuzzy) / total if total else 0.0
+
+    print(f"SEGE match: {exact} exact, {fuzzy} fuzzy, {unmatched} unmatched "
+          f"({rate:.2%} of {total} listings matched)")
+
+    pairs = pd.DataFrame({"il": il.to_numpy(), "ilce": ilce.to_numpy(), "code": codes, "kind": kinds})
+    fuzzy_pairs = pairs[pairs["kind"] == "fuzzy"].value_counts().head(top)
+    for (p_il, p_ilce, code, _), count in fuzzy_pairs.items():
+        row = index.table.iloc[code]
+        print(f"  fuzzy: {p_il} / {p_ilce} -> {row['il']} / {row['ilce']} ({count} listings)")
+
+    missing = pairs.loc[pairs["kind"] == "none", ["il", "ilce"]].value_counts(dropna=False).head(top)
+    for (p_il, p_ilce), count in missing.items():
+        print(f"  unmatched: {p_il} / {p_ilce} ({count} listings)")
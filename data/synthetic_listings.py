@@ -0,0 +1,160 @@
+# synthetic_listings.py
+# Realistic synthetic scraper output at any size, for benchmarking the pipeline.
+#
+#   python synthetic_listings.py --rows 1000000 --out-dir /tmp/bench-1m
+#
+# Writes, in the layouts the scrapers produce:
+#   hepsiemlak_500k+.txt   list-page rows (datasorter.py input): Turkish
+#                          thousands-separated prices, "120 m²" areas,
+#                          "12 Yaşında"/"Sıfır Bina" ages, some non-TL and
+#                          duplicate rows for the filters and dedup to remove
+#   extra-data.csv         detail-page rows for --detail-fraction of the ids
+#
+# konum is drawn from the districts in sege_scores.csv. kat, oda_sayisi,
+# banyo/kat sayısı, ısınma, cephe and kullanım durumu are sampled jointly from
+# the real scraped rows (so kat and kat_sayisi stay consistent), and the price
+# per m² follows the log-linear SEGE relationship fitted on the real data.
+# Rows are generated and written in chunks, so memory does not grow with --rows.
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from sege_index import normalize_name
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LISTING_COLUMNS = ["ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare",
+                   "bina_yasi", "kat", "konum", "fiyat", "para_birimi"]
+DETAIL_COLUMNS = ["ilan_id", "oda_sayisi", "banyo_sayisi", "kat_sayisi",
+                  "isinma_tipi", "cephe", "kullanim_durumu"]
+PROFILE_COLUMNS = ["metrekare", "bina_yasi", "kat"] + DETAIL_COLUMNS[1:]
+
+ID_OFFSET = 50_000_000
+FIRST_DAY = np.datetime64("2025-01-01")
+DAYS = 181
+NEW_BUILDING_RATE = 0.05
+CURRENCIES = (["TL", "USD", "EUR"], [0.985, 0.01, 0.005])
+
+
+def slug(name):
+    return normalize_name(name).replace(" ", "-")
+
+
+def thousands(values):
+    # 4500000 -> "4.500.000"
+    return [f"{v:,}".replace(",", ".") for v in values]
+
+
+class Vocabulary:
+    """Everything the generator samples from, loaded once from the shipped data."""
+
+    def __init__(self, sege_path, listings_path, details_path):
+        sege = pd.read_csv(sege_path, encoding="utf-8-sig")
+        self.il = sege["il"].to_numpy(dtype=object)
+        self.ilce = sege["ilce"].to_numpy(dtype=object)
+        self.skor = sege["skor"].to_numpy(dtype=float)
+        self.district_slug = np.array([f"{slug(il)}-{slug(ilce)}" for il, ilce in zip(self.il, self.ilce)],
+                                      dtype=object)
+
+        listings = pd.read_csv(listings_path, encoding="utf-8-sig")
+        details = pd.read_csv(details_path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        joined = listings[["ilan_id", "metrekare", "bina_yasi", "kat"]].merge(details, on="ilan_id")
+        # Drop the extreme areas (data-entry errors) that would dominate the sums
+        low, high = joined["metrekare"].quantile([0.005, 0.995])
+        self.profiles = joined.loc[joined["metrekare"].between(low, high), PROFILE_COLUMNS].reset_index(drop=True)
+
+        mahalle = listings["konum"].str.split("/").str[2].str.strip().value_counts()
+        self.mahalle = mahalle.index.to_numpy(dtype=object)
+        self.mahalle_p = (mahalle / mahalle.sum()).to_numpy()
+        self.mahalle_slug = np.array([slug(m.removesuffix(" Mah.")) for m in self.mahalle], dtype=object)
+        tipi = listings["ilan_tipi"].value_counts(normalize=True)
+        self.ilan_tipi, self.ilan_tipi_p = tipi.index.to_numpy(dtype=object), tipi.to_numpy()
+
+        # log(TL/m²) = intercept + slope * skor + N(0, sigma)
+        y = np.log(listings["fiyat_per_m2"].to_numpy(dtype=float))
+        self.slope, self.intercept = np.polyfit(listings["skor"], y, 1)
+        self.sigma = float(np.std(y - (self.intercept + self.slope * listings["skor"])))
+
+
+def generate_chunk(vocab, rng, start, n):
+    """n listing rows with ids from `start`, as (listings frame, detail-profile frame)."""
+    district = rng.integers(0, len(vocab.il), n)
+    mahalle = rng.choice(len(vocab.mahalle), n, p=vocab.mahalle_p)
+    profile = vocab.profiles.iloc[rng.integers(0, len(vocab.profiles), n)].reset_index(drop=True)
+
+    m2 = np.maximum(20, np.round(profile["metrekare"].to_numpy() * rng.uniform(0.9, 1.1, n))).astype(np.int64)
+    age = profile["bina_yasi"].to_numpy().astype(np.int64)
+    new_building = rng.random(n) < NEW_BUILDING_RATE
+    per_m2 = np.exp(vocab.intercept + vocab.slope * vocab.skor[district] + rng.normal(0, vocab.sigma, n))
+    fiyat = np.maximum(1000, np.round(per_m2 * m2, -3)).astype(np.int64)
+
+    ids = [f"0-{ID_OFFSET + i}" for i in range(start, start + n)]
+    tipi = rng.choice(vocab.ilan_tipi, n, p=vocab.ilan_tipi_p)
+    links = [f"https://www.hepsiemlak.com/{d}-{m}-satilik/{slug(t)}/{i}"
+             for d, m, t, i in zip(vocab.district_slug[district], vocab.mahalle_slug[mahalle], tipi, ids)]
+    konum = [f"{il} / {ilce} / {mah}"
+             for il, ilce, mah in zip(vocab.il[district], vocab.ilce[district], vocab.mahalle[mahalle])]
+    days = (FIRST_DAY + rng.integers(0, DAYS, n)).astype("datetime64[D]").astype(str)
+
+    listings = pd.DataFrame({
+        "ilan_id": ids,
+        "ilan_linki": links,
+        "ilan_tarihi": [f"{d[8:10]}-{d[5:7]}-{d[:4]}" for d in days],
+        "ilan_tipi": tipi,
+        "metrekare": [f"{v} m²" for v in thousands(m2)],
+        "bina_yasi": np.where(new_building, "Sıfır Bina", [f"{a} Yaşında" for a in age]),
+        "kat": profile["kat"].to_numpy(),
+        "konum": konum,
+        "fiyat": thousands(fiyat),
+        "para_birimi": rng.choice(CURRENCIES[0], n, p=CURRENCIES[1]),
+    })
+    details = profile[DETAIL_COLUMNS[1:]].copy()
+    details.insert(0, "ilan_id", ids)
+    return listings, details
+
+
+def generate(rows, out_dir, seed=42, chunk_rows=500_000, detail_fraction=0.1, dup_rate=0.005,
+             sege_path=None, listings_path=None, details_path=None):
+    """Write out_dir/hepsiemlak_500k+.txt and out_dir/extra-data.csv; returns their paths."""
+    vocab = Vocabulary(sege_path or os.path.join(HERE, "sege_scores.csv"),
+                       listings_path or os.path.join(HERE, "detailed-listings-cleaned.csv"),
+                       details_path or os.path.join(HERE, "extra-data.csv"))
+    os.makedirs(out_dir, exist_ok=True)
+    listings_out = os.path.join(out_dir, "hepsiemlak_500k+.txt")
+    details_out = os.path.join(out_dir, "extra-data.csv")
+
+    written = 0
+    for chunk, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, chunk])
+        n = min(chunk_rows, rows - start)
+        listings, details = generate_chunk(vocab, rng, start, n)
+        # Re-scraped duplicates (same ilan_id) for datasorter to drop
+        dups = listings.iloc[rng.integers(0, n, int(n * dup_rate))]
+        listings = pd.concat([listings, dups], ignore_index=True)
+        first = chunk == 0
+        listings.to_csv(listings_out, mode="w" if first else "a", header=first, index=False, encoding="utf-8")
+        details[rng.random(n) < detail_fraction].to_csv(
+            details_out, mode="w" if first else "a", header=first, index=False, encoding="utf-8")
+        written += len(listings)
+    return listings_out, details_out, written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic hepsiemlak listings for benchmarks.")
+    parser.add_argument("--rows", type=int, default=100_000, help="distinct listings (duplicates come on top)")
+    parser.add_argument("--out-dir", default="synthetic")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=500_000)
+    parser.add_argument("--detail-fraction", type=float, default=0.1,
+                        help="share of listings with a detail-page row (about 10%% in the real data)")
+    parser.add_argument("--dup-rate", type=float, default=0.005)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    listings_out, details_out, written = generate(args.rows, args.out_dir, args.seed, args.chunk_rows,
+                                                  args.detail_fraction, args.dup_rate)
+    print(f"Wrote {written} listing rows to {listings_out} and detail rows to {details_out} "
+          f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,209 @@
+# run_benchmarks.py
+# Scaling benchmarks: every pipeline stage on synthetic data of growing size.
+#
+#   python run_benchmarks.py                          # 10k, 100k and 1M rows
+#   python run_benchmarks.py --sizes 10m --stages datasorter,merger,preprocess
+#   python run_benchmarks.py compare                  # last two commits in the results file
+#   python run_benchmarks.py compare --base a1b2c3d --head e4f5a6b
+#
+# For each size, data/synthetic_listings.py generates the scraper output into
+# benchmarks/work/<size>/data/ (reused while the generator and its inputs are
+# unchanged), and the stages run there in pipeline order, each as its own
+# process with that directory as the project root. Wall time and the peak
+# RSS of the stage process go to benchmarks/results.jsonl, one JSON line per
+# (commit, size, stage), so results from different commits can be compared.
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+RESULTS = os.path.join(BENCH_DIR, "results.jsonl")
+GENERATOR = os.path.join(ROOT, "data", "synthetic_listings.py")
+GENERATOR_INPUTS = ["data/synthetic_listings.py", "data/sege_index.py", "data/sege_scores.csv",
+                    "data/detailed-listings-cleaned.csv", "data/extra-data.csv"]
+
+# name -> (script, working directory inside the workspace, arguments)
+STAGES = {
+    "datasorter": ("data/datasorter.py", "data", []),
+    "merger": ("data/merger.py", "data", []),
+    "preprocess": ("src/processBeforeEDA.py", ".", []),
+    "preprocess_chunked": ("src/processBeforeEDA.py", ".", ["--chunked"]),
+    "eda": ("src/EDA-Calculator.py", ".", []),
+    "merge_extras": ("src/merge-extras-with-previous.py", ".", []),
+    "final_model": ("src/final_model.py", ".", []),
+    "batch_score": ("src/batch_score.py", ".", []),
+}
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1])
+    return int(float(text[:-1]) * scale) if scale else int(text)
+
+
+def size_label(rows):
+    if rows % 1_000_000 == 0:
+        return f"{rows // 1_000_000}m"
+    if rows % 1_000 == 0:
+        return f"{rows // 1_000}k"
+    return str(rows)
+
+
+def commit_id():
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{head}-dirty" if dirty else head
+
+
+def generator_digest(args):
+    h = hashlib.sha256(json.dumps([args.seed, args.detail_fraction, args.dup_rate]).encode())
+    for path in GENERATOR_INPUTS:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def run_measured(cmd, cwd, log_path):
+    """Run cmd to completion; (exit code, seconds, peak RSS in MB or None)."""
+    env = dict(os.environ, MPLBACKEND="Agg", PIPELINE_METRICS_DIR=os.path.join(cwd, "metrics"))
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # Resource usage of this child alone, unlike getrusage(RUSAGE_CHILDREN)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak = usage.ru_maxrss / 2**20 if sys.platform == "darwin" else usage.ru_maxrss / 2**10
+        else:
+            proc.wait()
+            peak = None
+    return proc.returncode, time.perf_counter() - start, peak
+
+
+def prepare_workspace(rows, args, record):
+    """benchmarks/work/<size>/ with the generated data/ (regenerated when stale)."""
+    work = os.path.join(BENCH_DIR, "work", size_label(rows))
+    data = os.path.join(work, "data")
+    stamp_path = os.path.join(data, ".generator")
+    digest = generator_digest(args)
+    if args.regenerate or not os.path.exists(stamp_path) or open(stamp_path).read() != digest:
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(data)
+        code, seconds, peak = run_measured(
+            [sys.executable, GENERATOR, "--rows", str(rows), "--out-dir", data, "--seed", str(args.seed),
+             "--detail-fraction", str(args.detail_fraction), "--dup-rate", str(args.dup_rate)],
+            work, os.path.join(work, "generate.log"))
+        record("generate", code, seconds, peak)
+        if code != 0:
+            raise RuntimeError(f"generator failed, see {os.path.join(work, 'generate.log')}")
+        with open(stamp_path, "w") as f:
+            f.write(digest)
+    shutil.copy(os.path.join(ROOT, "data", "sege_scores.csv"), data)
+    return work
+
+
+def run(args):
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    stages = list(STAGES) if args.stages == "all" else args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        sys.exit(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    base = {"commit": commit_id(), "host": platform.node(), "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    print(f"{'size':>6} {'stage':<18} {'seconds':>9} {'peak MB':>9}  status")
+
+    for rows in sizes:
+        def record(stage, code, seconds, peak):
+            entry = {**base, "rows": rows, "stage": stage, "status": "ok" if code == 0 else f"exit {code}",
+                     "seconds": round(seconds, 3), "peak_rss_mb": round(peak, 1) if peak is not None else None}
+            with open(RESULTS, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            peak_text = f"{peak:9.0f}" if peak is not None else f"{'?':>9}"
+            print(f"{size_label(rows):>6} {stage:<18} {seconds:9.2f} {peak_text}  {entry['status']}")
+            return code == 0
+
+        work = prepare_workspace(rows, args, record)
+        os.makedirs(os.path.join(work, "logs"), exist_ok=True)
+        for stage in stages:
+            script, cwd, extra = STAGES[stage]
+            code, seconds, peak = run_measured([sys.executable, os.path.join(ROOT, script), *extra],
+                                               os.path.normpath(os.path.join(work, cwd)),
+                                               os.path.join(work, "logs", f"{stage}.log"))
+            if not record(stage, code, seconds, peak):
+                # Later stages read this one's output
+                print(f"       {stage} failed, see {os.path.join(work, 'logs', stage + '.log')}; "
+                      f"skipping the rest of size {size_label(rows)}")
+                break
+
+
+def load_results():
+    if not os.path.exists(RESULTS):
+        sys.exit(f"no results yet: {RESULTS}")
+    with open(RESULTS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(args):
+    results = load_results()
+    commits = list(dict.fromkeys(r["commit"] for r in results))
+    head = args.head or commits[-1]
+    base = args.base or (commits[-2] if len(commits) > 1 else None)
+    if base is None:
+        sys.exit("only one commit in the results file; pass --base")
+
+    # Latest successful measurement per (commit, rows, stage)
+    latest = {}
+    for r in results:
+        if r["status"] == "ok":
+            latest[(r["commit"], r["rows"], r["stage"])] = r
+    keys = sorted({(rows, stage) for c, rows, stage in latest if c in (base, head)},
+                  key=lambda k: (k[0], (["generate"] + list(STAGES)).index(k[1])))
+
+    print(f"base {base} vs head {head}")
+    print(f"{'size':>6} {'stage':<18} {'base s':>9} {'head s':>9} {'ratio':>6} {'base MB':>9} {'head MB':>9}")
+    for rows, stage in keys:
+        b, h = latest.get((base, rows, stage)), latest.get((head, rows, stage))
+
+        def cell(r, field):
+            return f"{r[field]:9.2f}" if r and r.get(field) is not None else f"{'-':>9}"
+
+        ratio = f"{h['seconds'] / b['seconds']:6.2f}" if b and h and b["seconds"] else f"{'-':>6}"
+        print(f"{size_label(rows):>6} {stage:<18} {cell(b, 'seconds')} {cell(h, 'seconds')} {ratio} "
+              f"{cell(b, 'peak_rss_mb')} {cell(h, 'peak_rss_mb')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("command", nargs="?", choices=["run", "compare"], default="run")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="comma-separated row counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--stages", default="all", help=f"comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--detail-fraction", type=float, default=0.1)
+    parser.add_argument("--dup-rate", type=float, default=0.005)
+    parser.add_argument("--regenerate", action="store_true", help="regenerate the synthetic data")
+    parser.add_argument("--base", help="compare: commit to compare against (default: second to last)")
+    parser.add_argument("--head", help="compare: commit to compare (default: last)")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# run_pipeline.py
+# Incremental, cross-platform runner for the analysis pipeline.
+#
+# Each stage declares its script, the local modules it imports, and the files
+# it reads and writes. Stage order comes from matching inputs to outputs. A
+# stage is skipped when the hash of its code and inputs matches the last
+# successful run and all of its outputs still exist. Stages whose upstreams
+# are done run in parallel.
+#
+#   python run_pipeline.py                # everything
+#   python run_pipeline.py pdf            # pdf and whatever it depends on
+#   python run_pipeline.py --force eda    # rerun eda even if up to date
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(ROOT, ".pipeline_state.json")
+
+STAGES = {
+    "preprocess": {
+        "script": "src/processBeforeEDA.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/instrumentation.py"],
+        "inputs": ["data/hepsiemlak_500k_with_sege.csv"],
+        "outputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet"],
+    },
+    "eda": {
+        "script": "src/EDA-Calculator.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/eda_stats.py", "src/plot_farm.py",
+                 "src/online_stats.py", "src/sketches.py", "src/correlation.py", "src/instrumentation.py"],
+        "inputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet"],
+        "outputs": ["eda_outputs/summary.csv", "eda_outputs/normality_results.txt",
+                    "eda_outputs/qq_r2_scores.txt", "eda_outputs/stats_state.json", "eda_outputs/plots"],
+    },
+    "pdf": {
+        "script": "src/PDF-Maker.py",
+        "code": [],
+        "inputs": ["eda_outputs/summary.csv", "eda_outputs/normality_results.txt",
+                   "eda_outputs/qq_r2_scores.txt", "eda_outputs/plots"],
+        "outputs": ["EDA_Report.pdf"],
+    },
+    "hypothesis": {
+        "script": "src/hypothesis-tester.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/spearman_inference.py"],
+        "inputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet"],
+        "outputs": ["hypothesis_outputs/hypothesis_test_result.txt"],
+    },
+    "cube": {
+        "script": "src/price_cube.py",
+        "args": ["build"],
+        "code": ["src/stage_cache.py", "src/schema.py", "src/sketches.py"],
+        "inputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet"],
+        "outputs": ["price_cube.sqlite"],
+    },
+    "merge_extras": {
+        "script": "src/merge-extras-with-previous.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/feature_rules.py", "src/instrumentation.py"],
+        "inputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet", "data/extra-data.csv"],
+        "outputs": ["detailed-listings-cleaned.csv", "detailed-listings-cleaned.parquet"],
+    },
+    "correlations": {
+        "script": "src/correlation.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/instrumentation.py"],
+        "inputs": ["detailed-listings-cleaned.csv", "detailed-listings-cleaned.parquet"],
+        "outputs": ["eda_outputs/correlations"],
+    },
+    "final_model": {
+        "script": "src/final_model.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/instrumentation.py", "src/model_artifact.py",
+                 "src/feature_store.py"],
+        "inputs": ["detailed-listings-cleaned.csv", "detailed-listings-cleaned.parquet"],
+        "outputs": ["trained_model.pkl", "trained_model.ubj", "trained_model.json", "feature_importance.png"],
+    },
+    "batch_score": {
+        "script": "src/batch_score.py",
+        "code": ["src/stage_cache.py", "src/schema.py", "src/model_artifact.py", "src/feature_rules.py",
+                 "src/instrumentation.py"],
+        "inputs": ["analysis_ready_data.csv", "analysis_ready_data.parquet", "detailed-listings-cleaned.csv",
+                   "detailed-listings-cleaned.parquet", "trained_model.ubj", "trained_model.json"],
+        "outputs": ["scored_listings.parquet"],
+    },
+}
+
+
+def upstream(name):
+    inputs = set(STAGES[name]["inputs"])
+    return [other for other, stage in STAGES.items()
+            if other != name and inputs & set(stage["outputs"])]
+
+
+def with_upstream(targets):
+    selected, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(upstream(name))
+    return selected
+
+
+class Hasher:
+    # File digests are cached by (size, mtime) so unchanged inputs are not re-read
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file(self, path):
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        key = os.path.relpath(path, ROOT)
+        cached = self.cache.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[key] = [stamp, digest]
+        return digest
+
+    def path(self, path):
+        full = os.path.join(ROOT, path)
+        if os.path.isdir(full):
+            h = hashlib.sha256()
+            for dirpath, _, files in sorted(os.walk(full)):
+                for name in sorted(files):
+                    file_path = os.path.join(dirpath, name)
+                    h.update(os.path.relpath(file_path, ROOT).encode())
+                    h.update(self.file(file_path).encode())
+            return h.hexdigest()
+        return self.file(full)
+
+    def stage(self, name):
+        stage = STAGES[name]
+        h = hashlib.sha256()
+        for path in [stage["script"]] + stage["code"] + stage["inputs"]:
+            h.update(path.encode())
+            h.update(self.path(path).encode())
+        return h.hexdigest()
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+
+def run_stage(name):
+    start = time.perf_counter()
+    stage = STAGES[name]
+    proc = subprocess.run([sys.executable, stage["script"], *stage.get("args", [])], cwd=ROOT,
+                          capture_output=True, text=True, encoding="utf-8", errors="replace")
+    elapsed = time.perf_counter() - start
+    output = (proc.stdout + proc.stderr).rstrip()
+    if output:
+        print("\n".join(f"[{name}] {line}" for line in output.splitlines()))
+    return proc.returncode, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline, skipping up-to-date stages.")
+    parser.add_argument("targets", nargs="*",
+                        help=f"stages to bring up to date (default: all): {', '.join(STAGES)}")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="stages to run in parallel")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    args = parser.parse_args()
+    unknown = [t for t in args.targets if t not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    selected = with_upstream(args.targets or list(STAGES))
+    forced = set(args.targets or STAGES) if args.force else set()
+    state = load_state()
+    hasher = Hasher(state["files"])
+
+    pending = {name: set(upstream(name)) & selected for name in selected}
+    done, failed = set(), set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        while pending or running:
+            ready = [name for name, deps in pending.items() if deps <= done]
+            for name in sorted(ready):
+                del pending[name]
+                stage = STAGES[name]
+
+                missing = [p for p in [stage["script"]] + stage["code"] + stage["inputs"]
+                           if not os.path.exists(os.path.join(ROOT, p))]
+                if missing:
+                    print(f"[{name}] missing inputs: {', '.join(missing)}")
+                    failed.add(name)
+                    continue
+
+                digest = hasher.stage(name)
+                outputs_exist = all(os.path.exists(os.path.join(ROOT, p)) for p in stage["outputs"])
+                if name not in forced and outputs_exist and state["stages"].get(name) == digest:
+                    print(f"[{name}] up to date")
+                    done.add(name)
+                    continue
+
+                print(f"[{name}] {'would run' if args.dry_run else 'running'} {stage['script']}")
+                if args.dry_run:
+                    done.add(name)
+                    continue
+                running[pool.submit(run_stage, name)] = (name, digest)
+
+            # Drop stages whose upstream failed
+            for name in [n for n, deps in pending.items() if deps & failed]:
+                print(f"[{name}] skipped, upstream failed")
+                del pending[name]
+                failed.add(name)
+
+            if not running:
+                if pending and not any(deps <= done for deps in pending.values()):
+                    break
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, digest = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode == 0:
+                    print(f"[{name}] done in {elapsed:.1f}s")
+                    done.add(name)
+                    state["stages"][name] = digest
+                    save_state(state)
+                else:
+                    print(f"[{name}] failed with exit code {returncode} after {elapsed:.1f}s")
+                    failed.add(name)
+
+    if not args.dry_run:
+        save_state(state)
+    if failed:
+        print(f"Failed stages: {', '.join(sorted(failed))}")
+        sys.exit(1)
+    print("All steps completed successfully.")
+
+
+if __name__ == "__main__":
+    main()
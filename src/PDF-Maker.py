@@ -1,102 +1,176 @@
 # pdf_report_generator.py
+import argparse
+import hashlib
+import os
 import pandas as pd
 from fpdf import FPDF
-import os
+from PIL import Image
+
+PLOT_DIR = "eda_outputs/plots"
+THUMB_DIR = "eda_outputs/thumbnails"
+MM_PER_INCH = 25.4
+
+# Grid used for the plot pages: 2 x 3 cells of 95 x 80 mm
+GRID_COLS = 2
+GRID_ROWS = 3
+CELL_W = 95
+CELL_H = 80
+MARGIN_X = 10
+MARGIN_Y = 20
+
+
+class Thumbnails:
+    # Plots are pre-scaled to the exact size they are drawn at and cached by
+    # source hash, so unchanged plots are not re-encoded on the next run.
+    # Palette PNG and JPEG avoid fpdf's slow pure-Python alpha unpacking.
+    def __init__(self, dpi, fmt, quality):
+        self.dpi = dpi
+        self.fmt = fmt
+        self.quality = quality
+        self.used = set()
+        os.makedirs(THUMB_DIR, exist_ok=True)
+
+    def px(self, mm):
+        return max(1, round(mm / MM_PER_INCH * self.dpi))
+
+    def get(self, src, w_mm, h_mm=None):
+        with open(src, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:32]
+        ext = "jpg" if self.fmt == "jpeg" else "png"
+        name = f"{digest}-{w_mm}x{h_mm}-{self.dpi}-{self.fmt}{self.quality}.{ext}"
+        path = os.path.join(THUMB_DIR, name)
+        self.used.add(name)
+        if os.path.exists(path):
+            return path
+
+        with Image.open(src) as img:
+            img = img.convert("RGB")
+            w = self.px(w_mm)
+            h = self.px(h_mm) if h_mm else max(1, round(img.height * w / img.width))
+            img = img.resize((w, h), Image.LANCZOS)
+            if self.fmt == "jpeg":
+                img.save(path, "JPEG", quality=self.quality, optimize=True)
+            else:
+                img.quantize(colors=256).save(path, "PNG", optimize=True)
+        return path
 
-# Create PDF object
-pdf = FPDF()
-pdf.set_auto_page_break(auto=True, margin=15)
-pdf.add_page()
-
-# Ana Başlık
-pdf.set_font("Arial", style="B", size=16)
-pdf.cell(0, 10, "Exploratory Data Analysis Report", ln=True, align='C')
-pdf.ln(10)
-
-# Summary Statistics
-summary_stats = pd.read_csv("eda_outputs/summary.csv", index_col=0)
-
-pdf.set_font("Arial", size=12)
-pdf.cell(0, 10, "Summary Statistics:", ln=True)
-pdf.set_font("Arial", size=10)
-pdf.cell(0, 10, "Note: K = Thousand, M = Million", ln=True)
-pdf.set_font("Courier", size=7)
-
-col_width = pdf.w / (len(summary_stats.columns) + 1) - 2
-pdf.set_fill_color(220, 220, 220)
-pdf.set_font("Courier", 'B', 7)
-pdf.cell(col_width, 8, "Variable", border=1, fill=True)
-for col in summary_stats.columns:
-    pdf.cell(col_width, 8, col[:10], border=1, fill=True)
-pdf.ln()
-
-pdf.set_font("Courier", size=7)
-for idx, row in summary_stats.iterrows():
-    pdf.cell(col_width, 8, str(idx)[:12], border=1)
-    for val in row:
-        pdf.cell(col_width, 8, str(val), border=1)
+    def prune(self):
+        for name in os.listdir(THUMB_DIR):
+            if name not in self.used:
+                os.remove(os.path.join(THUMB_DIR, name))
+
+
+# --- Report sections: each one reads only its own inputs ---
+
+def section_summary(pdf, thumbs):
+    # Ana Başlık
+    pdf.add_page()
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(0, 10, "Exploratory Data Analysis Report", ln=True, align='C')
+    pdf.ln(10)
+
+    # Summary Statistics
+    summary_stats = pd.read_csv("eda_outputs/summary.csv", index_col=0)
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, "Summary Statistics:", ln=True)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 10, "Note: K = Thousand, M = Million", ln=True)
+    pdf.set_font("Courier", size=7)
+
+    col_width = pdf.w / (len(summary_stats.columns) + 1) - 2
+    pdf.set_fill_color(220, 220, 220)
+    pdf.set_font("Courier", 'B', 7)
+    pdf.cell(col_width, 8, "Variable", border=1, fill=True)
+    for col in summary_stats.columns:
+        pdf.cell(col_width, 8, col[:10], border=1, fill=True)
     pdf.ln()
 
-# Function to add grouped plots
-def add_grouped_plots(title, plot_type):
-    plot_dir = "eda_outputs/plots"
-    plots = [f for f in os.listdir(plot_dir) if f.startswith(plot_type)]
-    plots.sort()
-
-    cols = 2
-    rows = 3
-    cell_w = 95
-    cell_h = 80
-    margin_x = 10
-    margin_y = 20
-
-    for i, plot_file in enumerate(plots):
-        if i % (cols * rows) == 0:
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            pdf.set_xy(10, 10)
-            pdf.cell(0, 10, title, ln=True)
-
-        row = (i % (cols * rows)) // cols
-        col = i % cols
-        x = margin_x + col * cell_w
-        y = margin_y + row * cell_h
-        pdf.set_xy(x, y)
-        pdf.set_font("Arial", size=8)
-        pdf.cell(cell_w, 5, plot_file.replace(".png", ""), ln=True, align='C')
-        pdf.image(f"{plot_dir}/{plot_file}", x=x, y=y+5, w=cell_w-5, h=cell_h-15)
-
-# Add Histograms, QQ plots, Boxplots
-add_grouped_plots("Histograms:", "hist_")
-add_grouped_plots("Q-Q Plots:", "qq_")
-add_grouped_plots("Boxplots:", "box_")
-
-# Add Correlation Matrix
-pdf.add_page()
-pdf.set_font("Arial", size=12)
-pdf.cell(0, 10, "Correlation Matrix:", ln=True)
-pdf.image("eda_outputs/plots/correlation_matrix.png", w=180)
-
-# Add Normality Test Table
-pdf.add_page()
-pdf.set_font("Arial", size=12)
-pdf.cell(0, 10, "Normality Test Summary Table:", ln=True)
-pdf.set_font("Courier", size=9)
-with open("eda_outputs/normality_results.txt", "r", encoding="utf-8") as f:
-    for line in f:
-        line = line.encode("latin-1", errors="ignore").decode("latin-1")
-        pdf.multi_cell(0, 5, line)
-
-# Add Q-Q R2 Scores
-pdf.add_page()
-pdf.set_font("Arial", size=12)
-pdf.cell(0, 10, "Q-Q Plot R² Scores (Descending):", ln=True)
-pdf.set_font("Courier", size=10)
-with open("eda_outputs/qq_r2_scores.txt", "r", encoding="utf-8") as f:
-    for line in f:
-        line = line.encode("latin-1", errors="ignore").decode("latin-1")
-        pdf.multi_cell(0, 5, line)
-
-# Save PDF
-pdf.output("EDA_Report.pdf")
-print("EDA_Report.pdf successfully created!")
+    pdf.set_font("Courier", size=7)
+    for idx, row in summary_stats.iterrows():
+        pdf.cell(col_width, 8, str(idx)[:12], border=1)
+        for val in row:
+            pdf.cell(col_width, 8, str(val), border=1)
+        pdf.ln()
+
+
+def grouped_plots_section(title, plot_type):
+    def section(pdf, thumbs):
+        plots = [f for f in os.listdir(PLOT_DIR) if f.startswith(plot_type) and f.endswith(".png")]
+        plots.sort()
+
+        for i, plot_file in enumerate(plots):
+            if i % (GRID_COLS * GRID_ROWS) == 0:
+                pdf.add_page()
+                pdf.set_font("Arial", size=12)
+                pdf.set_xy(10, 10)
+                pdf.cell(0, 10, title, ln=True)
+
+            row = (i % (GRID_COLS * GRID_ROWS)) // GRID_COLS
+            col = i % GRID_COLS
+            x = MARGIN_X + col * CELL_W
+            y = MARGIN_Y + row * CELL_H
+            pdf.set_xy(x, y)
+            pdf.set_font("Arial", size=8)
+            pdf.cell(CELL_W, 5, plot_file.replace(".png", ""), ln=True, align='C')
+            w, h = CELL_W - 5, CELL_H - 15
+            pdf.image(thumbs.get(f"{PLOT_DIR}/{plot_file}", w, h), x=x, y=y+5, w=w, h=h)
+    return section
+
+
+def section_correlation(pdf, thumbs):
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, "Correlation Matrix:", ln=True)
+    pdf.image(thumbs.get(f"{PLOT_DIR}/correlation_matrix.png", 180), w=180)
+
+
+def text_file_section(title, path, font_size):
+    def section(pdf, thumbs):
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        pdf.cell(0, 10, title, ln=True)
+        pdf.set_font("Courier", size=font_size)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.encode("latin-1", errors="ignore").decode("latin-1")
+                pdf.multi_cell(0, 5, line)
+    return section
+
+
+SECTIONS = [
+    section_summary,
+    grouped_plots_section("Histograms:", "hist_"),
+    grouped_plots_section("Q-Q Plots:", "qq_"),
+    grouped_plots_section("Boxplots:", "box_"),
+    section_correlation,
+    text_file_section("Normality Test Summary Table:", "eda_outputs/normality_results.txt", 9),
+    text_file_section("Q-Q Plot R² Scores (Descending):", "eda_outputs/qq_r2_scores.txt", 10),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build EDA_Report.pdf from eda_outputs/.")
+    parser.add_argument("--dpi", type=int, default=150, help="resolution of embedded plots (default: 150)")
+    parser.add_argument("--format", choices=["png", "jpeg"], default="png",
+                        help="palette PNG (sharp text, default) or JPEG (smallest for dense plots)")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality (default: 85)")
+    args = parser.parse_args()
+
+    # Create PDF object
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    thumbs = Thumbnails(args.dpi, args.format, args.quality if args.format == "jpeg" else "")
+
+    for section in SECTIONS:
+        section(pdf, thumbs)
+
+    thumbs.prune()
+
+    # Save PDF
+    pdf.output("EDA_Report.pdf")
+    print("EDA_Report.pdf successfully created!")
+
+
+if __name__ == "__main__":
+    main()
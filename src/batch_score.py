@@ -0,0 +1,233 @@
+# batch_score.py
+# Score every listing with the trained price-per-m² model and flag the ones
+# priced far from its estimate.
+#
+#   python src/batch_score.py                                  # analysis_ready_data -> scored_listings.parquet
+#   python src/batch_score.py new-listings.csv --out new.parquet --workers 4
+#
+# The input (CSV or Parquet, a stage CSV prefers its fresh Parquet file) is
+# read in chunks of --chunk-rows and the chunks are scored on a process pool.
+# Each worker loads the model once: the compact export of trained_model.pkl
+# (trained_model.ubj + .json, see model_artifact.py), plus the detail
+# features of the enriched listings, which it joins by ilan_id. Listings
+# without details get bina_yasi and the floor code from their list-page text
+# (as merge-extras-with-previous.py encodes them) and are scored with the
+# other features missing, which the booster routes down its learned default
+# branches; `enriched` marks which is which.
+# At most two chunks per worker are in flight, so memory depends on
+# --chunk-rows and --workers, not on the size of the input.
+#
+# Output columns: ilan_id, il, ilce, kademe, enriched, fiyat_per_m2,
+# predicted_fiyat_per_m2, predicted_fiyat, residual (TL/m²), log_residual
+# (log actual / predicted), z and flag. z standardizes log_residual within
+# its il / kademe group, separately for enriched and un-enriched listings as
+# their errors differ; flag is "below" or "above" when |z| >= --z-threshold.
+# Group means and variances are merged across chunks, so z needs a second
+# pass over the (already columnar) predictions, not over the input. Both
+# passes write with the fixed schemas below, so a chunk whose text column is
+# all missing (e.g. kademe of unmatched districts) keeps it a string column.
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from stage_cache import iter_stage, read_stage
+
+SOURCE = "analysis_ready_data.csv"
+DETAILS = "detailed-listings-cleaned.csv"
+OUT = "scored_listings.parquet"
+GROUP = ["il", "kademe", "enriched"]
+TEXT_COLUMNS = ["ilan_id", "il", "ilce", "kademe"]
+SCORED_SCHEMA = pa.schema([(c, pa.string()) for c in TEXT_COLUMNS] + [("enriched", pa.bool_())] + [
+    (c, pa.float64()) for c in ["fiyat_per_m2", "predicted_fiyat_per_m2", "predicted_fiyat",
+                                "residual", "log_residual"]])
+OUT_SCHEMA = SCORED_SCHEMA.append(pa.field("z", pa.float64())).append(pa.field("flag", pa.string()))
+
+_model = None
+_details = None
+
+
+def load_details(path, columns):
+    """Detail features of the enriched listings, indexed by ilan_id (None when there are none)."""
+    if not path or not os.path.exists(path):
+        return None
+    details = read_stage(path, columns=["ilan_id"] + columns)
+    return details.drop_duplicates("ilan_id").set_index("ilan_id")
+
+
+def init_worker(model_prefix, details_path, nthread):
+    global _model, _details
+    from model_artifact import CompactModel
+
+    _model = CompactModel(model_prefix, nthread=nthread)
+    _details = load_details(details_path, _model.columns)
+
+
+def listing_features(chunk):
+    """Model inputs available on the list page, encoded as merge-extras-with-previous.py does."""
+    from feature_rules import encode_kat
+
+    features = pd.DataFrame(index=chunk.index)
+    for col in _model.columns:
+        features[col] = chunk[col] if col in chunk.columns else np.nan
+    if "bina_yasi" in chunk.columns:
+        features["bina_yasi"] = chunk["bina_yasi"].astype(str).str.extract(r"(\d+)", expand=False).astype(float)
+    if "kat" in chunk.columns and "kat_sayisi_encoded" in features.columns:
+        # Without kat_sayisi, "ara kat" / "en üst" stay missing; numbered and ground floors are known
+        features["kat_sayisi_encoded"] = encode_kat(chunk["kat"], pd.Series(np.nan, index=chunk.index))
+    return features
+
+
+def score_chunk(chunk):
+    """Predictions and residuals for one chunk of listings."""
+    chunk = chunk.reset_index(drop=True)
+    features = listing_features(chunk)
+    enriched = np.zeros(len(chunk), dtype=bool)
+    if _details is not None and "ilan_id" in chunk.columns:
+        # Enriched listings take every model input from their cleaned detail row
+        joined = _details.reindex(chunk["ilan_id"].astype(str)).reset_index(drop=True)
+        enriched = joined.notna().all(axis=1).to_numpy()
+        for col in _details.columns:
+            features[col] = features[col].astype(object).where(~enriched, joined[col].astype(object))
+    for col in _model.numeric_features:
+        features[col] = pd.to_numeric(features[col], errors="coerce")
+    features[_model.categorical_features] = features[_model.categorical_features].astype(object)
+
+    predicted = _model.predict(features).astype(float)
+    if "fiyat_per_m2" in chunk.columns:
+        actual = pd.to_numeric(chunk["fiyat_per_m2"], errors="coerce").to_numpy(dtype=float)
+    else:
+        actual = np.full(len(chunk), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_residual = np.log(actual / predicted)
+    out = pd.DataFrame(index=chunk.index)
+    for col in TEXT_COLUMNS:
+        out[col] = chunk[col].astype(str).where(chunk[col].notna()) if col in chunk.columns else None
+    out["enriched"] = enriched
+    out["fiyat_per_m2"] = actual
+    out["predicted_fiyat_per_m2"] = predicted
+    out["predicted_fiyat"] = predicted * pd.to_numeric(features["metrekare"], errors="coerce").to_numpy()
+    out["residual"] = actual - predicted
+    out["log_residual"] = np.where(np.isfinite(log_residual), log_residual, np.nan)
+    return out
+
+
+def group_moments(scored):
+    """(n, mean, M2) of log_residual per group."""
+    grouped = scored.dropna(subset=["log_residual"]).groupby(GROUP)["log_residual"]
+    moments = grouped.agg(["count", "mean"]).rename(columns={"count": "n"})
+    moments["m2"] = grouped.var(ddof=0) * moments["n"]
+    return moments
+
+
+def merge_moments(a, b):
+    """Chan et al. merge of two group_moments() tables."""
+    if a is None:
+        return b
+    index = a.index.union(b.index)
+    a, b = a.reindex(index, fill_value=0), b.reindex(index, fill_value=0)
+    n = a["n"] + b["n"]
+    delta = b["mean"] - a["mean"]
+    return pd.DataFrame({"n": n, "mean": a["mean"] + delta * b["n"] / n,
+                         "m2": a["m2"] + b["m2"] + delta ** 2 * a["n"] * b["n"] / n}, index=index)
+
+
+def add_z(scored, moments, threshold):
+    stats = moments.assign(std=np.sqrt(moments["m2"] / (moments["n"] - 1)).where(moments["n"] > 1))
+    keys = pd.MultiIndex.from_frame(scored[GROUP])
+    mean = stats["mean"].reindex(keys).to_numpy()
+    std = stats["std"].reindex(keys).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (scored["log_residual"].to_numpy() - mean) / std
+    scored["z"] = np.where(np.isfinite(z), z, np.nan)
+    scored["flag"] = np.select([z <= -threshold, z >= threshold], ["below", "above"], "")
+    return scored
+
+
+def scored_chunks(args):
+    """Score the input chunk by chunk on the pool, yielding results in input order."""
+    workers = args.workers or os.cpu_count() or 1
+    chunks = iter_stage(args.input, chunk_rows=args.chunk_rows)
+    if workers == 1:
+        init_worker(args.model, args.details, None)
+        yield from map(score_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(args.model, args.details, args.threads)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    from instrumentation import start_run
+
+    parser = argparse.ArgumentParser(description="Score all listings and flag prices far from the model estimate.")
+    parser.add_argument("input", nargs="?", default=SOURCE, help="listings, CSV or Parquet (default: %(default)s)")
+    parser.add_argument("--out", default=OUT, help="Parquet output (default: %(default)s)")
+    parser.add_argument("--model", default="trained_model", help="model artifact path without extension")
+    parser.add_argument("--details", default=DETAILS,
+                        help="enriched listings whose detail features are joined by ilan_id ('' for none)")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--threads", type=int, default=1, help="XGBoost threads per worker")
+    parser.add_argument("--z-threshold", type=float, default=3.0)
+    args = parser.parse_args()
+    if not os.path.exists(f"{args.model}.json"):
+        parser.error(f"{args.model}.json not found; run src/final_model.py, or "
+                     f"src/model_artifact.py --export for a model trained before the export")
+
+    run = start_run("batch_score")
+    start = time.perf_counter()
+    tmp = args.out + ".predictions.tmp"
+    moments, rows, writer = None, 0, None
+    try:
+        with run.step("score") as step:
+            for scored in scored_chunks(args):
+                moments = merge_moments(moments, group_moments(scored))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, SCORED_SCHEMA, compression="zstd")
+                writer.write_table(pa.Table.from_pandas(scored, schema=SCORED_SCHEMA, preserve_index=False))
+                rows += len(scored)
+            step.rows_out = rows
+        if writer is None:
+            raise SystemExit(f"{args.input}: no listings to score")
+        writer.close()
+        score_s = time.perf_counter() - start
+
+        # Second pass: z-scores against the merged group statistics
+        with run.step("z-scores", rows_in=rows) as step:
+            flagged, final = 0, None
+            for batch in pq.ParquetFile(tmp).iter_batches(batch_size=args.chunk_rows):
+                scored = add_z(batch.to_pandas(), moments, args.z_threshold)
+                flagged += int((scored["flag"] != "").sum())
+                if final is None:
+                    final = pq.ParquetWriter(args.out + ".tmp", OUT_SCHEMA, compression="zstd")
+                final.write_table(pa.Table.from_pandas(scored, schema=OUT_SCHEMA, preserve_index=False))
+            final.close()
+            os.replace(args.out + ".tmp", args.out)
+            step.rows_out = rows
+            step.extra["flagged"] = flagged
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    total_s = time.perf_counter() - start
+    print(f"Scored {rows} listings in {total_s:.1f}s ({rows / score_s:,.0f} rows/s scoring, "
+          f"{rows / total_s:,.0f} rows/s overall); {flagged} flagged at |z| >= {args.z_threshold:g} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
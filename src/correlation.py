@@ -0,0 +1,274 @@
+# correlation.py
+# Pearson, Spearman and Kendall correlation matrices, with p-values, for wide
+# numeric feature sets (the enriched detailed-listings features, the EDA
+# columns).
+#
+# Each column is ranked once (RankCache): dense integer ranks and tie counts
+# for Kendall, average ranks for Spearman. Pearson and Spearman are then the
+# same product Z'Z of standardized columns (values or ranks), taken over row
+# blocks in float32 and accumulated in float64. Kendall's tau-b follows
+# Knight's O(n log n) method: sort the rows by (x, y) and count the
+# inversions left in y, here with one vectorized O(n) pass per bit of the
+# ranks instead of a merge sort. Pairs of low-cardinality columns (flags,
+# one-hot indicators, room counts) are counted from their contingency table
+# instead. Column pairs are spread over a process pool.
+# p-values are two-sided: t with n - 2 degrees of freedom for Pearson and
+# Spearman (as scipy), the tie-corrected normal approximation for Kendall.
+#
+# Rows with a missing value in any selected column are dropped first, so all
+# matrices share one n (pandas uses pairwise-complete rows instead).
+#
+#   python src/correlation.py                     # detailed-listings features, all methods
+#   python src/correlation.py --source analysis_ready_data.csv --methods pearson,spearman
+#   python src/correlation.py --check             # compare with pandas/scipy and time both
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+METHODS = ("pearson", "spearman", "kendall")
+SOURCE = "detailed-listings-cleaned.csv"
+OUT_DIR = "eda_outputs/correlations"
+# float32 rows per block of Z'Z; a block of 30 features stays in L2
+BLOCK_ROWS = 16_384
+# Kendall pairs per pool task
+TASK_PAIRS = 8
+
+
+class RankCache:
+    """Per-column ranks of a complete (rows x columns) matrix, computed once and shared by the methods."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.n, k = values.shape
+        self.dense = np.empty((k, self.n), dtype=np.int64)   # 0-based dense ranks, one row per column
+        self.average = np.empty((self.n, k), dtype=np.float32)
+        self.levels = np.empty(k, dtype=np.int64)                # distinct values per column
+        self.bits = np.empty(k, dtype=np.int64)
+        self.ties = np.empty((k, 3), dtype=np.float64)        # scipy's (pairs tied, x0, x1) per column
+        for j in range(k):
+            _, dense = np.unique(values[:, j], return_inverse=True)
+            counts = np.bincount(dense)
+            self.dense[j] = dense
+            self.average[:, j] = (np.cumsum(counts) - (counts - 1) / 2)[dense]
+            self.levels[j] = len(counts)
+            self.bits[j] = max(1, int(len(counts) - 1).bit_length())
+            tied = counts[counts > 1].astype(np.float64)
+            self.ties[j] = ((tied * (tied - 1) / 2).sum(), (tied * (tied - 1) * (tied - 2)).sum(),
+                            (tied * (tied - 1) * (2 * tied + 5)).sum())
+
+
+def gram_corr(values, block_rows=BLOCK_ROWS):
+    """Pearson correlation of the columns of `values` from float32 row blocks; NaN for constant columns."""
+    n = len(values)
+    mean = np.zeros(values.shape[1])
+    for start in range(0, n, block_rows):
+        mean += values[start:start + block_rows].sum(axis=0, dtype=np.float64)
+    mean /= n
+    ss = np.zeros_like(mean)
+    for start in range(0, n, block_rows):
+        ss += ((values[start:start + block_rows] - mean) ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(ss > 0, 1 / np.sqrt(ss), np.nan)
+
+    acc = np.zeros((len(mean), len(mean)))
+    for start in range(0, n, block_rows):
+        z = ((values[start:start + block_rows] - mean) * scale).astype(np.float32)
+        acc += z.T @ z
+    np.fill_diagonal(acc, np.where(np.isnan(scale), np.nan, 1.0))
+    return np.clip(acc, -1, 1)
+
+
+def t_pvalues(r, n):
+    """Two-sided p-values of correlations r on n rows (t with n - 2 degrees of freedom)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt((n - 2) / ((1 - r) * (1 + r)))
+    return np.where(np.isnan(r), np.nan, 2 * stats.t.sf(np.abs(t), n - 2))
+
+
+def count_inversions(values, bits):
+    """Pairs i < j with values[i] > values[j], for integers in [0, 2**bits): one O(n) pass per bit."""
+    v = np.asarray(values, dtype=np.int64)
+    positions = np.arange(len(v))
+    total = 0
+    for b in range(bits - 1, -1, -1):
+        # v is ordered stably by its bits above b; each group of equal higher
+        # bits contributes its (1 before 0) pairs at bit b, then is split so
+        # its zeros come first
+        bit = (v >> b) & 1
+        prefix = v >> (b + 1)
+        start = np.r_[True, prefix[1:] != prefix[:-1]]
+        first = np.maximum.accumulate(np.where(start, positions, 0))
+        ones = np.cumsum(bit)
+        ones_before = ones - bit - (ones[first] - bit[first])
+        zero = bit == 0
+        total += int(ones_before[zero].sum())
+        group_zeros = np.add.reduceat(zero.astype(np.int64), np.flatnonzero(start))[np.cumsum(start) - 1]
+        offset = np.where(zero, positions - first - ones_before, group_zeros + ones_before)
+        out = np.empty_like(v)
+        out[first + offset] = v
+        v = out
+    return total
+
+
+def discordant_pairs(dx, dy, x_levels, y_levels, y_bits):
+    """Discordant pairs and pairs tied in both columns, from dense ranks."""
+    if x_levels * y_levels <= len(dx):
+        # Few distinct values: from the (x, y) contingency table in O(n + cells)
+        table = np.bincount(dx * y_levels + dy, minlength=x_levels * y_levels).reshape(x_levels, y_levels)
+        # above_left[a, b]: rows with x > a and y < b
+        above = np.cumsum(table[::-1], axis=0)[::-1]
+        above = np.vstack([above[1:], np.zeros((1, y_levels), dtype=table.dtype)])
+        above_left = np.hstack([np.zeros((x_levels, 1), dtype=table.dtype), np.cumsum(above, axis=1)[:, :-1]])
+        return int((table * above_left).sum()), int((table * (table - 1) // 2).sum())
+    keys = np.sort((dx << y_bits) | dy)
+    joint = np.diff(np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True]))
+    return count_inversions(keys & ((1 << y_bits) - 1), y_bits), int((joint * (joint - 1) // 2).sum())
+
+
+def kendall_pair(ranks, i, j):
+    """tau-b of columns i and j and its asymptotic two-sided p-value."""
+    n = ranks.n
+    dis, joint_ties = discordant_pairs(ranks.dense[i], ranks.dense[j], ranks.levels[i], ranks.levels[j],
+                                       ranks.bits[j])
+    total = n * (n - 1) / 2
+    (xtie, x0, x1), (ytie, y0, y1) = ranks.ties[i], ranks.ties[j]
+    if xtie == total or ytie == total:
+        return np.nan, np.nan
+    con_minus_dis = total - xtie - ytie + joint_ties - 2 * dis
+    tau = min(1.0, max(-1.0, con_minus_dis / np.sqrt(total - xtie) / np.sqrt(total - ytie)))
+    m = n * (n - 1.0)
+    var = (m * (2 * n + 5) - x1 - y1) / 18 + 2 * xtie * ytie / m + x0 * y0 / (9 * m * (n - 2))
+    return tau, 2 * stats.norm.sf(abs(con_minus_dis) / np.sqrt(var))
+
+
+_worker_ranks = None
+
+
+def _init_worker(ranks):
+    global _worker_ranks
+    _worker_ranks = ranks
+
+
+def kendall_task(pairs):
+    r = _worker_ranks
+    # tau is symmetric; inversions are counted in the column with fewer distinct values
+    return [kendall_pair(r, *((j, i) if r.levels[i] < r.levels[j] else (i, j))) for i, j in pairs]
+
+
+def kendall_matrix(ranks, workers=None):
+    k = len(ranks.bits)
+    pairs = list(combinations(range(k), 2))
+    tasks = [pairs[i:i + TASK_PAIRS] for i in range(0, len(pairs), TASK_PAIRS)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ranks,)) as pool:
+            results = [res for chunk in pool.map(kendall_task, tasks) for res in chunk]
+    else:
+        _init_worker(ranks)
+        results = [res for chunk in map(kendall_task, tasks) for res in chunk]
+
+    tau, p = np.eye(k), np.zeros((k, k))
+    for (i, j), (t, pv) in zip(pairs, results):
+        tau[i, j] = tau[j, i] = t
+        p[i, j] = p[j, i] = pv
+    np.fill_diagonal(tau, np.where(ranks.ties[:, 0] == ranks.n * (ranks.n - 1) / 2, np.nan, 1.0))
+    return tau, p
+
+
+def correlation_matrices(df, columns=None, methods=METHODS, workers=None, block_rows=BLOCK_ROWS):
+    """(n, {method: (correlations, p-values)}) over the rows of df complete in `columns`."""
+    columns = list(columns if columns is not None else df.select_dtypes(include=[np.number]).columns)
+    values = df[columns].to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values).any(axis=1)]
+    n = len(values)
+    ranks = RankCache(values) if {"spearman", "kendall"} & set(methods) else None
+
+    results = {}
+    for method in methods:
+        if method == "pearson":
+            r = gram_corr(values.astype(np.float32), block_rows)
+            p = t_pvalues(r, n)
+        elif method == "spearman":
+            r = gram_corr(ranks.average, block_rows)
+            p = t_pvalues(r, n)
+        elif method == "kendall":
+            r, p = kendall_matrix(ranks, workers)
+        else:
+            raise ValueError(f"unknown method {method!r}; expected one of {', '.join(METHODS)}")
+        np.fill_diagonal(p, np.where(np.isnan(np.diag(r)), np.nan, 0.0))
+        results[method] = (pd.DataFrame(r, index=columns, columns=columns),
+                           pd.DataFrame(p, index=columns, columns=columns))
+    return n, results
+
+
+def load_features(source, onehot):
+    """Numeric columns of `source` plus 0/1 indicators of the `onehot` categorical columns."""
+    from stage_cache import read_stage
+
+    df = read_stage(source, narrow_floats=True)
+    numeric = df.select_dtypes(include=[np.number])
+    dummies = [pd.get_dummies(df[c].astype(str), prefix=c, dtype=np.float32) for c in onehot if c in df.columns]
+    return pd.concat([numeric] + dummies, axis=1)
+
+
+def check(df, methods, workers):
+    """Largest differences from pandas (coefficients) and scipy (p-values), and the time each takes."""
+    start = time.perf_counter()
+    n, results = correlation_matrices(df, methods=methods, workers=workers)
+    engine_s = time.perf_counter() - start
+    complete = df.dropna()
+    scipy_tests = {"pearson": stats.pearsonr, "spearman": stats.spearmanr, "kendall": stats.kendalltau}
+    print(f"{n} rows, {df.shape[1]} columns; engine {engine_s:.2f}s for {', '.join(methods)}")
+    for method in methods:
+        start = time.perf_counter()
+        want = complete.corr(method=method)
+        pandas_s = time.perf_counter() - start
+        r, p = results[method]
+        r_err = np.nanmax(np.abs(r.to_numpy() - want.to_numpy()))
+        p_err = 0.0
+        for a, b in list(combinations(df.columns, 2))[:50]:
+            x, y = complete[a].to_numpy(np.float64), complete[b].to_numpy(np.float64)
+            if np.ptp(x) and np.ptp(y):
+                p_err = max(p_err, abs(p.at[a, b] - scipy_tests[method](x, y).pvalue))
+        print(f"  {method:<8}  pandas {pandas_s:7.2f}s  max |r - pandas| {r_err:.1e}  "
+              f"max |p - scipy| {p_err:.1e} (first 50 pairs)")
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run
+
+    parser = argparse.ArgumentParser(description="Correlation matrices and p-values of the listing features.")
+    parser.add_argument("--source", default=SOURCE, help="listing stage to read (default: %(default)s)")
+    parser.add_argument("--methods", default=",".join(METHODS), help="comma-separated subset of %(default)s")
+    parser.add_argument("--onehot", default="isinma_tipi",
+                        help="comma-separated categorical columns to add as 0/1 indicators")
+    parser.add_argument("--workers", type=int, default=None, help="processes for Kendall (default: one per CPU)")
+    parser.add_argument("--check", action="store_true", help="compare with pandas/scipy instead of writing")
+    args = parser.parse_args()
+    methods = [m for m in args.methods.split(",") if m]
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        parser.error(f"unknown method(s): {', '.join(sorted(unknown))}")
+
+    run = start_run("correlation")
+    with run.step("load") as step:
+        features = load_features(args.source, [c for c in args.onehot.split(",") if c])
+        step.rows_out = len(features)
+        step.extra["columns"] = features.shape[1]
+    if args.check:
+        check(features, methods, args.workers)
+    else:
+        with run.step("correlations", rows_in=len(features)) as step:
+            n, results = correlation_matrices(features, methods=methods, workers=args.workers)
+            step.rows_out = n
+        os.makedirs(OUT_DIR, exist_ok=True)
+        for method, (r, p) in results.items():
+            r.to_csv(os.path.join(OUT_DIR, f"{method}.csv"), float_format="%.6f")
+            p.to_csv(os.path.join(OUT_DIR, f"{method}_p.csv"), float_format="%.6g")
+        print(f"{n} complete rows, {features.shape[1]} columns; wrote {', '.join(results)} to {OUT_DIR}/")
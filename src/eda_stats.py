@@ -0,0 +1,107 @@
+# eda_stats.py
+# Batched statistics for EDA-Calculator.py.
+#
+# The 1% tail bounds for all columns come from one quantile call and are
+# applied as a single combined mask. Each column's missing values are dropped
+# once, and the sorted copy feeds the KS-Lilliefors and Anderson-Darling tests
+# (the public statsmodels / scipy functions, whose own sort is then cheap)
+# and the Q-Q R^2.
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from statsmodels.stats.diagnostic import lilliefors
+
+AD_LEVEL_5PCT = 2
+
+
+def format_k(x):
+    # Summary table cells: 1.2M, 3.4K, 5.67
+    if pd.isna(x): return ""
+    elif abs(x) >= 1_000_000:
+        return f"{x/1_000_000:.1f}M"
+    elif abs(x) >= 1_000:
+        return f"{x/1_000:.1f}K"
+    else:
+        return f"{x:.2f}"
+
+
+def tail_bounds(df, columns, lower=0.01, upper=0.99):
+    """(lower, upper) quantiles of every column, indexed by quantile."""
+    return df[list(columns)].quantile([lower, upper])
+
+
+def filter_tails(df, columns, lower=0.01, upper=0.99, sequential=False, bounds=None):
+    """Keep rows strictly inside the (lower, upper) quantiles of every column.
+
+    sequential=True reproduces the original behaviour, where each column's
+    quantiles are computed on the frame already filtered by earlier columns.
+    Precomputed tail_bounds() can be passed in as bounds.
+    """
+    columns = list(columns)
+    if sequential:
+        for col in columns:
+            q_low = df[col].quantile(lower)
+            q_high = df[col].quantile(upper)
+            df = df[(df[col] > q_low) & (df[col] < q_high)]
+        return df
+
+    if bounds is None:
+        bounds = tail_bounds(df, columns, lower, upper)
+    values = df[columns]
+    mask = ((values > bounds.loc[lower]) & (values < bounds.loc[upper])).all(axis=1)
+    return df[mask]
+
+
+def anderson_normal(xs):
+    """A^2 statistic and the 5% critical value of scipy.stats.anderson."""
+    with warnings.catch_warnings():
+        # scipy >= 1.17 asks for method=, which replaces the critical values
+        # with a p-value; the summary reports "< critical value" as before
+        warnings.filterwarnings("ignore", message="As of SciPy 1.17", category=FutureWarning)
+        result = stats.anderson(xs, dist="norm")
+    return result.statistic, result.critical_values[AD_LEVEL_5PCT]
+
+
+def qq_r2_sorted(xs):
+    # Same theoretical quantiles as sm.ProbPlot(x).theoretical_quantiles
+    n = len(xs)
+    osm = stats.norm.ppf(np.arange(1.0, n + 1) / (n + 1))
+    return np.corrcoef(osm, xs)[0, 1] ** 2
+
+
+def normality_results(df, columns):
+    """Return (normality test table, [(column, Q-Q R^2)]) for the given columns."""
+    records = []
+    qq_r2_scores = []
+    for column in columns:
+        xs = np.sort(df[column].dropna().to_numpy(dtype=float))
+
+        try:
+            stat_lillie, p_lillie = lilliefors(xs, dist="norm", pvalmethod="table")
+            result = "Fail to reject H0 (normal)" if p_lillie > 0.05 else "Reject H0 (not normal)"
+            records.append({
+                "Variable": column, "Test": "KS-Lilliefors", "Statistic": round(stat_lillie, 3),
+                "p-value": f"{p_lillie:.3e}", "Result": result
+            })
+        except (ValueError, ArithmeticError):
+            pass
+
+        try:
+            ad_stat, crit_val = anderson_normal(xs)
+            result = "Fail to reject H0 (normal)" if ad_stat < crit_val else "Reject H0 (not normal)"
+            records.append({
+                "Variable": column, "Test": "Anderson-Darling", "Statistic": round(ad_stat, 3),
+                "p-value": f"< {crit_val:.3f}", "Result": result
+            })
+        except (ValueError, ArithmeticError):
+            pass
+
+        try:
+            qq_r2_scores.append((column, qq_r2_sorted(xs)))
+        except Exception:
+            pass
+
+    table = pd.DataFrame.from_records(records, columns=["Variable", "Test", "Statistic", "p-value", "Result"])
+    return table, qq_r2_scores
@@ -0,0 +1,149 @@
+# feature_rules.py
+# Declarative encoding rules for the detail-page features (kat, oda_sayisi, cephe).
+#
+# Each rule table is compiled to vectorized string ops that run once per
+# distinct raw value, plus one np.select over the rows, instead of a
+# row-wise df.apply. tests/test_feature_rules.py checks parity with the
+# original row-wise functions; run this file directly for a timing comparison.
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+# Floor rules, checked in order against the lowercased 'kat' text.
+# A value is either a constant or a function of kat_sayisi (total floors).
+KAT_RULES = [
+    (("bahçe", "zemin", "giriş"), 0),
+    (("kot", "yüksek"), -1),
+    (("ara",), lambda ks: np.round(ks / 2)),
+    (("en üst",), lambda ks: ks),
+]
+# Fallback for "N. kat" style values
+KAT_NUMBER = r"^(\d+)\.*\s*kat"
+
+# "oda + salon" room counts, e.g. "3 + 1"
+ODA_PATTERN = r"^\s*(-?\d+)\s*\+\s*(-?\d+)\s*$"
+
+# Facade flag columns and the direction each one looks for
+CEPHE_RULES = {
+    "cephe_kuzey": "kuzey",
+    "cephe_guney": "güney",
+    "cephe_dogu": "doğu",
+    "cephe_bati": "batı",
+}
+
+
+def per_unique(series, func):
+    # Apply a vectorized string transform to the distinct values only
+    codes, uniques = pd.factorize(series.astype(str))
+    result = func(pd.Series(uniques, dtype=object))
+    return codes, result
+
+
+def encode_kat(kat, kat_sayisi):
+    codes, uniques = per_unique(kat, lambda u: u.str.strip().str.lower())
+    ks = pd.to_numeric(kat_sayisi, errors="coerce").to_numpy(dtype=float)
+
+    conditions, choices = [], []
+    for keywords, value in KAT_RULES:
+        hit = np.zeros(len(uniques), dtype=bool)
+        for kw in keywords:
+            hit |= uniques.str.contains(kw, regex=False).to_numpy(dtype=bool)
+        conditions.append(hit[codes])
+        choices.append(value(ks) if callable(value) else np.full(len(ks), value, dtype=float))
+
+    number = uniques.str.extract(KAT_NUMBER, expand=False).astype(float).to_numpy()
+    # Floors are whole numbers; Int64 keeps them written as "4", not "4.0"
+    encoded = np.select(conditions, choices, default=number[codes])
+    return pd.Series(encoded, index=kat.index).astype("Int64")
+
+
+def parse_oda(oda):
+    codes, parts = per_unique(oda, lambda u: u.str.extract(ODA_PATTERN))
+    # astype(str) turned missing values into "nan", which the pattern rejects
+    oda_sayisi = pd.to_numeric(parts[0]).astype("Int64").to_numpy()[codes]
+    salon_sayisi = pd.to_numeric(parts[1]).astype("Int64").to_numpy()[codes]
+    return (pd.Series(oda_sayisi, index=oda.index, dtype="Int64"),
+            pd.Series(salon_sayisi, index=oda.index, dtype="Int64"))
+
+
+def encode_cephe(cephe):
+    codes, text = per_unique(cephe, lambda u: u.str.lower())
+    return pd.DataFrame(
+        {col: text.str.contains(direction).astype(int).to_numpy()[codes]
+         for col, direction in CEPHE_RULES.items()},
+        index=cephe.index,
+    )
+
+
+# --- Original row-wise implementations, kept for the parity test ---
+
+def legacy_parse_oda(x):
+    try:
+        o, s = x.split("+")
+        return int(o), int(s)
+    except:
+        return None, None
+
+
+def legacy_kat_enc(r):
+    k = str(r["kat"]).strip().lower()
+    ks = r["kat_sayisi"]
+    if pd.isna(k): return None
+    if any(x in k for x in ["bahçe", "zemin", "giriş"]): return 0
+    if any(x in k for x in ["kot", "yüksek"]): return -1
+    if "ara" in k: return int(round(ks / 2)) if not pd.isna(ks) else None
+    if "en üst" in k: return int(ks) if not pd.isna(ks) else None
+
+    m = re.match(r"(\d+)\.*\s*kat", k)
+    if m: return int(m.group(1))
+
+    return None
+
+
+def legacy_encode(df):
+    out = pd.DataFrame(index=df.index)
+    # object, as the original scripts read it; Series.apply on a categorical maps the categories
+    oda = df["oda_sayisi"].astype(object)
+    out["oda_sayisi_yeni"], out["salon_sayisi"] = zip(*oda.apply(legacy_parse_oda))
+    out["kat_sayisi_encoded"] = df.apply(legacy_kat_enc, axis=1)
+    cephe = df["cephe"].astype(str).str.lower()
+    for col, direction in CEPHE_RULES.items():
+        out[col] = cephe.str.contains(direction).astype(int)
+    return out
+
+
+def vectorized_encode(df):
+    out = pd.DataFrame(index=df.index)
+    out["oda_sayisi_yeni"], out["salon_sayisi"] = parse_oda(df["oda_sayisi"])
+    out["kat_sayisi_encoded"] = encode_kat(df["kat"], df["kat_sayisi"])
+    out = out.join(encode_cephe(df["cephe"]))
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Timing of the feature rules against the row-wise originals.")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows to time on (default: 200000)")
+    args = parser.parse_args()
+
+    listings = schema.read_csv("data/detailed-listings-cleaned.csv", usecols=["ilan_id", "kat"])
+    extra = schema.read_csv("data/extra-data.csv", usecols=["ilan_id", "oda_sayisi", "kat_sayisi", "cephe"])
+    sample = listings.merge(extra, on="ilan_id")
+    sample["kat_sayisi"] = sample["kat_sayisi"].astype(str).str.extract(r"(\d+)").astype(float)
+    sample = sample.sample(n=args.rows, replace=True, random_state=42).reset_index(drop=True)
+
+    start = time.perf_counter()
+    legacy_encode(sample)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized_encode(sample)
+    vectorized_time = time.perf_counter() - start
+
+    print(f"row-wise:   {legacy_time:.3f}s on {len(sample)} rows")
+    print(f"vectorized: {vectorized_time:.3f}s ({legacy_time / vectorized_time:.1f}x faster)")
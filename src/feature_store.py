@@ -0,0 +1,193 @@
+# feature_store.py
+# Encoded design matrix shared by final_model.py, tune_hyperopt.py and the scorers.
+#
+# The modeling feature lists, numeric coercion, dropna and the 80/20 split
+# live here, and are applied once per version of the input CSV (its SHA-256).
+# The result goes to feature_store/<version>/ as plain .npy files:
+#
+#   numeric.npy             float32 (rows x numeric features), unscaled
+#   codes.npy               int16 (rows x categorical features), vocabulary codes
+#   onehot_{data,indices,indptr}.npy   CSR one-hot of the categorical columns
+#   target.npy              float32 fiyat_per_m2
+#   train_idx.npy, test_idx.npy        train_test_split(test_size=0.2, random_state=42)
+#   meta.json               feature lists, frozen vocabulary, feature names
+#
+# load() memory-maps them, so opening the store copies nothing; only the rows
+# a caller selects are materialized.
+#
+#   python src/feature_store.py             # build (if needed) and describe the store
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from stage_cache import read_stage
+
+numeric_features = [
+    "metrekare", "bina_yasi", "kat_sayisi_encoded",
+    "oda_sayisi_yeni", "salon_sayisi", "banyo_sayisi", "kat_sayisi",
+    "cephe_kuzey", "cephe_guney", "cephe_dogu", "cephe_bati"
+]
+categorical_features = ["isinma_tipi", "kullanim_durumu", "kademe", "il"]
+target = "fiyat_per_m2"
+
+SOURCE = "detailed-listings-cleaned.csv"
+STORE_DIR = "feature_store"
+FORMAT_VERSION = 1
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_frame(source=SOURCE):
+    """Modeling columns of the source stage, coerced to numbers and without missing values."""
+    df = read_stage(source, columns=numeric_features + categorical_features + [target])
+    df[numeric_features + [target]] = df[numeric_features + [target]].apply(pd.to_numeric, errors="coerce")
+    return df.dropna(subset=numeric_features + categorical_features + [target])
+
+
+def build(source=SOURCE, store_dir=STORE_DIR, version=None):
+    """Encode `source` into store_dir/<version>/ and return that directory."""
+    from sklearn.model_selection import train_test_split
+
+    version = version or file_digest(source)[:16]
+    out_dir = os.path.join(store_dir, version)
+    df = load_frame(source)
+
+    vocabulary = [sorted(df[c].astype(str).unique()) for c in categorical_features]
+    codes = np.column_stack([
+        pd.Categorical(df[c].astype(str), categories=vocab).codes.astype(np.int16)
+        for c, vocab in zip(categorical_features, vocabulary)
+    ])
+    onehot = onehot_from_codes(codes, vocabulary)
+    train_idx, test_idx = train_test_split(np.arange(len(df), dtype=np.int32), test_size=0.2, random_state=42)
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{version}-", dir=store_dir)
+    arrays = {
+        "numeric": df[numeric_features].to_numpy(dtype=np.float32),
+        "codes": codes,
+        "onehot_data": onehot.data,
+        "onehot_indices": onehot.indices,
+        "onehot_indptr": onehot.indptr,
+        "target": df[target].to_numpy(dtype=np.float32),
+        "train_idx": train_idx,
+        "test_idx": test_idx,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "source": os.path.basename(source),
+        "rows": len(df),
+        "numeric_features": numeric_features,
+        "categorical_features": categorical_features,
+        "target": target,
+        "vocabulary": vocabulary,
+        "feature_names": numeric_features + [f"{c}_{v}" for c, vocab in zip(categorical_features, vocabulary)
+                                             for v in vocab],
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    # Publish atomically; a concurrent build of the same version may win
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir)
+    return out_dir
+
+
+def onehot_from_codes(codes, vocabulary):
+    n, k = codes.shape
+    offsets = np.cumsum([0] + [len(v) for v in vocabulary[:-1]]).astype(np.int32)
+    indices = (codes.astype(np.int32) + offsets).ravel()
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int32)
+    data = np.ones(n * k, dtype=np.float32)
+    return sp.csr_matrix((data, indices, indptr), shape=(n, int(sum(len(v) for v in vocabulary))))
+
+
+class FeatureSet:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported feature store format {self.meta['format_version']}")
+        self.path = path
+        self.version = self.meta["version"]
+        self.vocabulary = self.meta["vocabulary"]
+        self.feature_names = self.meta["feature_names"]
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.numeric = array("numeric")
+        self.codes = array("codes")
+        self.onehot = sp.csr_matrix(
+            (array("onehot_data"), array("onehot_indices"), array("onehot_indptr")),
+            shape=(self.meta["rows"], sum(len(v) for v in self.vocabulary)), copy=False)
+        self.y = array("target")
+        self.train_idx = array("train_idx")
+        self.test_idx = array("test_idx")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def frame(self, rows=None):
+        """Raw modeling columns as a DataFrame (numerics as float32, categoricals as Categorical)."""
+        rows = slice(None) if rows is None else rows
+        data = {c: self.numeric[rows, i] for i, c in enumerate(numeric_features)}
+        for i, (c, vocab) in enumerate(zip(categorical_features, self.vocabulary)):
+            data[c] = pd.Categorical.from_codes(self.codes[rows, i], categories=vocab)
+        return pd.DataFrame(data)
+
+    def design(self, rows=None, scaler=None):
+        """CSR float32 design matrix: numerics (standardized by a fitted `scaler`) then one-hot.
+
+        Matches what the ColumnTransformer of final_model.py produces, including
+        that zeros are not stored (XGBoost reads them as missing).
+        """
+        rows = slice(None) if rows is None else rows
+        numeric = np.asarray(self.numeric[rows], dtype=np.float64)
+        if scaler is not None:
+            numeric = (numeric - scaler.mean_) / scaler.scale_
+        X = sp.hstack([sp.csr_matrix(numeric), self.onehot[rows]], format="csr", dtype=np.float32)
+        X.eliminate_zeros()
+        return X
+
+
+def load(source=SOURCE, store_dir=STORE_DIR):
+    """FeatureSet for the current contents of `source`, building it on first use."""
+    version = file_digest(source)[:16]
+    path = os.path.join(store_dir, version)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        path = build(source, store_dir, version)
+    return FeatureSet(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and describe the encoded feature store.")
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild even if this version exists")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        shutil.rmtree(os.path.join(args.store_dir, file_digest(args.source)[:16]), ignore_errors=True)
+    fs = load(args.source, args.store_dir)
+    size = sum(os.path.getsize(os.path.join(fs.path, name)) for name in os.listdir(fs.path))
+    print(f"Feature store {fs.path}: {len(fs)} rows, {len(fs.feature_names)} features, "
+          f"{len(fs.train_idx)} train / {len(fs.test_idx)} test, {size / 2**20:.1f} MB on disk")
@@ -1,38 +1,30 @@
 
 
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_absolute_error, r2_score
 from xgboost import XGBRegressor
 import joblib
+import feature_store
+from feature_store import numeric_features, categorical_features
+from instrumentation import start_run
+from model_artifact import export_artifact
 import matplotlib.pyplot as plt
 
-df = pd.read_csv("detailed-listings-cleaned.csv")
+run = start_run("final_model")
 
-numeric_features = [
-    "metrekare", "bina_yasi", "kat_sayisi_encoded",
-    "oda_sayisi_yeni", "salon_sayisi",
-    "banyo_sayisi", "kat_sayisi",
-    "cephe_kuzey", "cephe_guney", "cephe_dogu", "cephe_bati"
-]
-categorical_features = ["isinma_tipi", "kullanim_durumu", "kademe", "il"]
-target = "fiyat_per_m2"
-
-df[numeric_features + [target]] = df[numeric_features + [target]].apply(pd.to_numeric, errors="coerce")
-df = df.dropna(subset=numeric_features + categorical_features + [target])
-
-X = df[numeric_features + categorical_features]
-y = df[target]
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+# Encoded features, target and train/test split come from the feature store
+with run.step("load") as step:
+    fs = feature_store.load()
+    step.rows_out = len(fs)
 
+# The one-hot vocabulary is frozen in the store, so fitting the preprocessor
+# only learns the scaler's means and scales
 preprocessor = ColumnTransformer(transformers=[
     ("num", StandardScaler(), numeric_features),
-    ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_features)
+    ("cat", OneHotEncoder(categories=fs.vocabulary, handle_unknown="ignore"), categorical_features)
 ])
 
 best_model = XGBRegressor(
@@ -50,13 +42,21 @@ best_model = XGBRegressor(
     subsample=0.8187,
 )
 
+with run.step("fit", rows_in=len(fs.train_idx)) as step:
+    preprocessor.fit(fs.frame(fs.train_idx))
+    scaler = preprocessor.named_transformers_["num"]
+    best_model.fit(fs.design(fs.train_idx, scaler), fs.y[fs.train_idx])
+
+# Saved as a regular pipeline, so scoring raw listings applies the same encoding
 pipeline = Pipeline([
     ("preprocessor", preprocessor),
     ("model", best_model)
 ])
 
-pipeline.fit(X_train, y_train)
-y_pred = pipeline.predict(X_test)
+with run.step("predict", rows_in=len(fs.test_idx)) as step:
+    y_test = fs.y[fs.test_idx]
+    y_pred = best_model.predict(fs.design(fs.test_idx, scaler))
+    step.rows_out = len(y_pred)
 
 mae = mean_absolute_error(y_test, y_pred)
 r2 = r2_score(y_test, y_pred)
@@ -64,7 +64,10 @@ r2 = r2_score(y_test, y_pred)
 print(f"MAE: {mae:,.0f} TL/m²")
 print(f"R² Score: {r2:.3f}")
 
-joblib.dump(pipeline, "trained_model.pkl")
+with run.step("save"):
+    joblib.dump(pipeline, "trained_model.pkl")
+    # Booster (UBJSON) + preprocessing JSON for fast-loading scorers
+    export_artifact(pipeline, "trained_model")
 
 model = pipeline.named_steps["model"]
 feature_names = (
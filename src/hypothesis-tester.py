@@ -1,35 +1,95 @@
+import argparse
 import pandas as pd
 import scipy.stats as stats
+from stage_cache import read_stage
+from spearman_inference import open_pool, spearman_inference, stratified_inference
 
-# Load the dataset
-df = pd.read_csv("analysis_ready_data.csv")
 
-# Check if necessary columns exist
-if "skor" in df.columns and "fiyat_per_m2" in df.columns:
-    subset = df[["skor", "fiyat_per_m2"]].dropna()
+def write_ci_results(subset, args):
+    # Bootstrap CI and permutation p-value, optionally per il / kademe
+    pool = open_pool(args.workers)
+    try:
+        overall = spearman_inference(subset["skor"], subset["fiyat_per_m2"], resamples=args.resamples,
+                                     confidence=args.confidence, seed=args.seed, pool=pool)
+        strata = {}
+        if args.strata:
+            for by in ["il", "kademe"]:
+                if by in subset.columns:
+                    strata[by] = stratified_inference(subset.dropna(subset=[by]), by, "skor", "fiyat_per_m2",
+                                                      resamples=args.resamples, confidence=args.confidence,
+                                                      seed=args.seed, pool=pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
-    # Perform the Spearman correlation test
-    correlation, p_value = stats.spearmanr(subset["skor"], subset["fiyat_per_m2"])
+    level = int(round(args.confidence * 100))
+    result_text = "--- Spearman Inference ---\n"
+    result_text += f"Observations: {overall['n']}\n"
+    result_text += f"Spearman Correlation Coefficient: {overall['rho']:.4f}\n"
+    result_text += f"{level}% Bootstrap CI: [{overall['ci_low']:.4f}, {overall['ci_high']:.4f}] ({args.resamples} resamples)\n"
+    result_text += f"Permutation p-value: {overall['p_perm']:.4e} ({args.resamples} permutations)\n"
 
-    # Interpretation
-    alpha = 0.05
-    result_text = ""
+    for by, table in strata.items():
+        table.to_csv(f"hypothesis_outputs/hypothesis_test_by_{by}.csv", index=False)
+        significant = int((table["p_fdr"] < 0.05).sum())
+        result_text += f"\nBy {by}: {len(table)} groups tested, {significant} significant after FDR (BH, q < 0.05)\n"
+        result_text += f"Details: hypothesis_outputs/hypothesis_test_by_{by}.csv\n"
 
-    result_text += "--- Hypothesis Testing ---\n"
-    result_text += f"Spearman Correlation Coefficient: {correlation:.4f}\n"
-    result_text += f"p-value: {p_value:.4e}\n\n"
+    with open("hypothesis_outputs/hypothesis_test_ci.txt", "w", encoding="utf-8") as f:
+        f.write(result_text)
+
+    print(result_text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spearman test of SEGE score vs price per m².")
+    parser.add_argument("--ci", action="store_true",
+                        help="also compute a bootstrap CI and permutation p-value")
+    parser.add_argument("--strata", action="store_true",
+                        help="with --ci, repeat per il and per kademe with FDR correction")
+    parser.add_argument("--resamples", type=int, default=10_000, help="bootstrap resamples and permutations")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the CI")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    # Load the dataset (only the columns the test needs)
+    columns = ["skor", "fiyat_per_m2"] + (["il", "kademe"] if args.ci and args.strata else [])
+    df = read_stage("analysis_ready_data.csv", columns=columns, narrow_floats=True)
+
+    # Check if necessary columns exist
+    if "skor" in df.columns and "fiyat_per_m2" in df.columns:
+        subset = df.dropna(subset=["skor", "fiyat_per_m2"])
+
+        # Perform the Spearman correlation test
+        correlation, p_value = stats.spearmanr(subset["skor"], subset["fiyat_per_m2"])
 
-    if p_value < alpha:
-        result_text += "Conclusion: We reject the null hypothesis.\n"
-        result_text += "There is a statistically significant relationship between SEGE score and real estate prices.\n"
+        # Interpretation
+        alpha = 0.05
+        result_text = ""
+
+        result_text += "--- Hypothesis Testing ---\n"
+        result_text += f"Spearman Correlation Coefficient: {correlation:.4f}\n"
+        result_text += f"p-value: {p_value:.4e}\n\n"
+
+        if p_value < alpha:
+            result_text += "Conclusion: We reject the null hypothesis.\n"
+            result_text += "There is a statistically significant relationship between SEGE score and real estate prices.\n"
+        else:
+            result_text += "Conclusion: We fail to reject the null hypothesis.\n"
+            result_text += "There is no statistically significant relationship between SEGE score and real estate prices.\n"
+
+        # Save result to a text file
+        with open("hypothesis_outputs/hypothesis_test_result.txt", "w", encoding="utf-8") as f:
+            f.write(result_text)
+
+        print(result_text)
+
+        if args.ci:
+            write_ci_results(subset, args)
     else:
-        result_text += "Conclusion: We fail to reject the null hypothesis.\n"
-        result_text += "There is no statistically significant relationship between SEGE score and real estate prices.\n"
+        print("The required columns 'skor' and 'fiyat_per_m2' are missing from the dataset.")
 
-    # Save result to a text file
-    with open("hypothesis_outputs/hypothesis_test_result.txt", "w", encoding="utf-8") as f:
-        f.write(result_text)
 
-    print(result_text)
-else:
-    print("The required columns 'skor' and 'fiyat_per_m2' are missing from the dataset.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# instrumentation.py
+# Per-step timing, memory and row-count metrics for the pipeline scripts.
+#
+#   run = start_run("processBeforeEDA")
+#   with run.step("currency filter", rows_in=len(df)) as step:
+#       df = df[df['para_birimi'] == "TL"]
+#       step.rows_out = len(df)
+#
+# Each run appends one JSON line per step to metrics/<stage>-<timestamp>.jsonl
+# and prints a short summary at exit. Set PIPELINE_PROFILE=cprofile (or
+# pyinstrument, if installed) to also dump a whole-run profile next to it.
+# PIPELINE_METRICS_DIR overrides the output directory.
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DIR = os.environ.get("PIPELINE_METRICS_DIR", os.path.join(ROOT, "metrics"))
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory in MB, rounded (None if unknown)."""
+    peak = _peak_rss_mb()
+    return round(peak, 1) if peak is not None else None
+
+
+def _peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes elsewhere
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    except ImportError:
+        return None
+
+
+class Step:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.extra = {}
+
+
+class Run:
+    def __init__(self, stage):
+        self.stage = stage
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.started = time.perf_counter()
+        self.records = []
+        self.profiler = None
+        self.profile_mode = os.environ.get("PIPELINE_PROFILE", "").lower()
+        self.finished = False
+
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self.path = os.path.join(METRICS_DIR, f"{stage}-{self.run_id}.jsonl")
+        self.start_profiler()
+        atexit.register(self.finish)
+
+    def start_profiler(self):
+        if self.profile_mode == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile_mode == "pyinstrument":
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+
+    def write(self, record):
+        self.records.append(record)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @contextmanager
+    def step(self, name, rows_in=None):
+        step = Step(name, rows_in)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield step
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            record = {
+                "run_id": self.run_id,
+                "stage": self.stage,
+                "step": name,
+                "status": status,
+                "seconds": round(time.perf_counter() - start, 4),
+                "rows_in": step.rows_in,
+                "rows_out": step.rows_out,
+                "rows_dropped": (step.rows_in - step.rows_out
+                                 if step.rows_in is not None and step.rows_out is not None else None),
+                "peak_rss_mb": peak_rss_mb(),
+                **step.extra,
+            }
+            self.write(record)
+
+    def timed(self, name=None):
+        """Decorator form of step() for functions."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.step(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+
+        if self.profiler is not None:
+            if self.profile_mode == "cprofile":
+                self.profiler.disable()
+                self.profiler.dump_stats(os.path.join(METRICS_DIR, f"{self.stage}-{self.run_id}.prof"))
+            else:
+                self.profiler.stop()
+                with open(os.path.join(METRICS_DIR, f"{self.stage}-{self.run_id}.html"), "w", encoding="utf-8") as f:
+                    f.write(self.profiler.output_html())
+            self.profiler = None
+
+        total = time.perf_counter() - self.started
+        status = "error" if any(r["status"] == "error" for r in self.records) else "ok"
+        self.write({
+            "run_id": self.run_id, "stage": self.stage, "step": "total", "status": status,
+            "seconds": round(total, 4), "peak_rss_mb": peak_rss_mb(),
+        })
+
+        print(f"[metrics] {self.stage}: {total:.2f}s total, written to {self.path}")
+        for r in self.records[:-1]:
+            rows = ""
+            if r["rows_in"] is not None and r["rows_out"] is not None:
+                rows = f", rows {r['rows_in']} -> {r['rows_out']} (-{r['rows_dropped']})"
+            elif r["rows_out"] is not None:
+                rows = f", rows {r['rows_out']}"
+            print(f"[metrics]   {r['step']}: {r['seconds']:.2f}s{rows}")
+
+
+def start_run(stage):
+    return Run(stage)
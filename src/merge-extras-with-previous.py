@@ -1,53 +1,46 @@
+import pandas as pd
+import schema
+from feature_rules import encode_cephe, encode_kat, parse_oda
+from instrumentation import start_run
+from stage_cache import read_stage, write_stage
 
-import pandas as pd, re
+run = start_run("merge-extras")
 
-df_main = pd.read_csv("analysis_ready_data.csv")
-df_extra = pd.read_csv("extra-data.csv")
-df = pd.merge(df_main, df_extra, on="ilan_id", how="inner")
+with run.step("load") as step:
+    # float32 as stored, so skor is written back as "-0.36", not its float64 expansion
+    df_main = read_stage("analysis_ready_data.csv", narrow_floats=True)
+    df_extra = schema.read_csv("data/extra-data.csv")
+    step.rows_out = len(df_main)
+    step.extra["rows_extra"] = len(df_extra)
+    step.extra["frame_mb"] = round(schema.frame_mb(df_main) + schema.frame_mb(df_extra), 1)
 
+with run.step("merge", rows_in=len(df_main)) as step:
+    df = pd.merge(df_main, df_extra, on="ilan_id", how="inner")
+    step.rows_out = len(df)
 
-df["bina_yasi"] = df["bina_yasi"].astype(str).str.extract(r"(\d+)").astype(float)
 
-def parse_oda(x):
-    try:
-        o, s = x.split("+")
-        return int(o), int(s)
-    except:
-        return None, None
+with run.step("encode", rows_in=len(df)) as step:
+    df["bina_yasi"] = df["bina_yasi"].astype(str).str.extract(r"(\d+)").astype(float)
 
-df["oda_sayisi_yeni"], df["salon_sayisi"] = zip(*df["oda_sayisi"].apply(parse_oda))
-df.drop(columns=["oda_sayisi"], inplace=True)
+    df["oda_sayisi_yeni"], df["salon_sayisi"] = parse_oda(df["oda_sayisi"])
+    df.drop(columns=["oda_sayisi"], inplace=True)
 
-df["kat_sayisi"] = df["kat_sayisi"].astype(str).str.extract(r"(\d+)").astype(float)
+    df["kat_sayisi"] = df["kat_sayisi"].astype(str).str.extract(r"(\d+)").astype(float)
 
-def kat_enc(r):
-    k = str(r["kat"]).strip().lower()
-    ks = r["kat_sayisi"]
-    if pd.isna(k): return None
-    if any(x in k for x in ["bahçe", "zemin", "giriş"]): return 0
-    if any(x in k for x in ["kot", "yüksek"]): return -1
-    if "ara" in k: return int(round(ks / 2)) if not pd.isna(ks) else None
-    if "en üst" in k: return int(ks) if not pd.isna(ks) else None
+    # Floor, room and facade rules live in feature_rules.py
+    df["kat_sayisi_encoded"] = encode_kat(df["kat"], df["kat_sayisi"])
+    df = df.join(encode_cephe(df["cephe"]))
 
+    df = df[~df["kat_sayisi_encoded"].isna()]
+    step.rows_out = len(df)
 
-    m = re.match(r"(\d+)\.*\s*kat", k)
-    if m: return int(m.group(1))
 
-    return None
+with run.step("dropna", rows_in=len(df)) as step:
+    df.replace("", pd.NA, inplace=True)
+    df.dropna(inplace=True)
+    step.rows_out = len(df)
 
-df["kat_sayisi_encoded"] = df.apply(kat_enc, axis=1)
-
-cephe = df["cephe"].astype(str).str.lower()
-df["cephe_kuzey"] = cephe.str.contains("kuzey").astype(int)
-df["cephe_guney"] = cephe.str.contains("güney").astype(int)
-df["cephe_dogu"] = cephe.str.contains("doğu").astype(int)
-df["cephe_bati"] = cephe.str.contains("batı").astype(int)
-
-df = df[~df["kat_sayisi_encoded"].isna()]
-
-
-df.replace("", pd.NA, inplace=True)
-df.dropna(inplace=True)
-
-df.to_csv("detailed-listings-cleaned.csv", index=False, encoding="utf-8-sig")
+with run.step("save", rows_in=len(df)) as step:
+    write_stage(df, "detailed-listings-cleaned.csv", index=False, encoding="utf-8-sig")
+    step.rows_out = len(df)
 print("merged: detailed-listings-cleaned.csv")
@@ -0,0 +1,166 @@
+# model_artifact.py
+# Compact, fast-loading export of the trained price-per-m² pipeline.
+#
+# trained_model.ubj   the XGBoost booster in its native UBJSON format
+# trained_model.json  scaler means/scales, one-hot vocabularies, feature order
+#
+# CompactModel rebuilds the ColumnTransformer output with NumPy and calls the
+# booster directly, so scoring needs neither the sklearn pipeline nor the
+# pickle (xgboost itself still imports sklearn when it is installed). The
+# pipeline hands XGBoost a sparse matrix, where zeros are missing values, not
+# zeros; the scorer does the same so predictions match the pickle.
+#
+#   python src/model_artifact.py --check    # startup time and parity vs trained_model.pkl
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+FORMAT_VERSION = 1
+
+
+def export_artifact(pipeline, prefix="trained_model"):
+    """Write <prefix>.ubj and <prefix>.json from a fitted preprocessor + XGBRegressor pipeline."""
+    preprocessor = pipeline.named_steps["preprocessor"]
+    scaler = preprocessor.named_transformers_["num"]
+    encoder = preprocessor.named_transformers_["cat"]
+    numeric_features = list(preprocessor.transformers_[0][2])
+    categorical_features = list(preprocessor.transformers_[1][2])
+
+    booster = pipeline.named_steps["model"].get_booster()
+    booster.save_model(f"{prefix}.ubj")
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "xgboost_version": xgb.__version__,
+        "target": "fiyat_per_m2",
+        "numeric": {
+            "features": numeric_features,
+            "mean": scaler.mean_.tolist(),
+            "scale": scaler.scale_.tolist(),
+        },
+        "categorical": {
+            "features": categorical_features,
+            "vocabulary": [[str(v) for v in cats] for cats in encoder.categories_],
+        },
+        "feature_order": list(preprocessor.get_feature_names_out()),
+        "zero_is_missing": bool(preprocessor.sparse_output_),
+    }
+    with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    return meta
+
+
+class CompactModel:
+    def __init__(self, prefix="trained_model", nthread=None):
+        with open(f"{prefix}.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"unsupported artifact format {self.meta['format_version']}")
+        self.booster = xgb.Booster(model_file=f"{prefix}.ubj")
+        self.booster.set_param({"device": "cpu", **({"nthread": nthread} if nthread else {})})
+
+        numeric = self.meta["numeric"]
+        self.numeric_features = numeric["features"]
+        self.mean = np.asarray(numeric["mean"])
+        self.scale = np.asarray(numeric["scale"])
+        categorical = self.meta["categorical"]
+        self.categorical_features = categorical["features"]
+        self.lookups = [{v: i for i, v in enumerate(vocab)} for vocab in categorical["vocabulary"]]
+        self.offsets = np.cumsum([len(self.numeric_features)] + [len(v) for v in categorical["vocabulary"]])
+        self.n_features = int(self.offsets[-1])
+        self.columns = self.numeric_features + self.categorical_features
+
+    def transform(self, data):
+        """Design matrix for a DataFrame, a dict of columns or a list of listing dicts."""
+        if isinstance(data, list):
+            data = {c: [r[c] for r in data] for c in self.columns}
+        numeric = np.column_stack([np.asarray(data[c], dtype=float) for c in self.numeric_features])
+        n = len(numeric)
+        X = np.zeros((n, self.n_features))
+        X[:, :len(self.numeric_features)] = (numeric - self.mean) / self.scale
+        rows = np.arange(n)
+        for col, lookup, offset in zip(self.categorical_features, self.lookups, self.offsets[:-1]):
+            codes = np.fromiter((lookup.get(str(v), -1) for v in data[col]), dtype=np.int64, count=n)
+            known = codes >= 0  # unknown categories encode as all zeros (handle_unknown="ignore")
+            X[rows[known], offset + codes[known]] = 1.0
+        if self.meta["zero_is_missing"]:
+            X[X == 0] = np.nan
+        return X
+
+    def predict(self, data):
+        """Predicted TL/m² per listing."""
+        return self.booster.inplace_predict(self.transform(data))
+
+
+# --- Startup time and parity check against the pickled pipeline ---
+
+LOAD_PICKLE = "import joblib; joblib.load({path!r})"
+LOAD_COMPACT = "import sys; sys.path.insert(0, {src!r}); from model_artifact import CompactModel; CompactModel({path!r})"
+
+
+def cold_start(code, repeats):
+    # Fresh interpreters, so imports are part of the measured time
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def check(args):
+    import joblib
+    from stage_cache import read_stage
+
+    src = os.path.dirname(os.path.abspath(__file__))
+    pickle_s = cold_start(LOAD_PICKLE.format(path=args.pickle), args.repeats)
+    compact_s = cold_start(LOAD_COMPACT.format(src=src, path=args.prefix), args.repeats)
+    baseline_s = cold_start("pass", args.repeats)
+    print(f"Cold start (best of {args.repeats}, interpreter {baseline_s:.2f}s included): "
+          f"pickle {pickle_s:.2f}s, compact {compact_s:.2f}s")
+
+    pipeline = joblib.load(args.pickle)
+    pipeline.named_steps["model"].set_params(device="cpu")
+    model = CompactModel(args.prefix)
+    df = read_stage(args.data, columns=model.columns).dropna()
+    df = df.sample(n=min(args.rows, len(df)), random_state=42)
+
+    start = time.perf_counter()
+    expected = pipeline.predict(df)
+    pipeline_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = model.predict(df)
+    compact_s = time.perf_counter() - start
+
+    diff = np.abs(expected - got)
+    print(f"Scoring {len(df)} rows: pipeline {pipeline_s * 1000:.1f} ms, compact {compact_s * 1000:.1f} ms")
+    print(f"Max abs difference: {diff.max():.6f} TL/m² (max relative {np.max(diff / np.abs(expected)):.2e})")
+    if not np.allclose(expected, got, rtol=1e-5, atol=1e-2):
+        sys.exit("Parity check failed")
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact model artifact: startup-time and parity check.")
+    parser.add_argument("--check", action="store_true", help="compare against the pickled pipeline")
+    parser.add_argument("--pickle", default="trained_model.pkl")
+    parser.add_argument("--prefix", default="trained_model", help="artifact path without extension")
+    parser.add_argument("--data", default="detailed-listings-cleaned.csv")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--export", action="store_true",
+                        help="write the artifact from the pickle first (for models trained before the export)")
+    args = parser.parse_args()
+
+    if args.export:
+        import joblib
+        export_artifact(joblib.load(args.pickle), args.prefix)
+        print(f"Wrote {args.prefix}.ubj and {args.prefix}.json")
+    if args.check:
+        check(args)
@@ -0,0 +1,295 @@
+# online_stats.py
+# Mergeable EDA statistics, so a new scrape batch updates the summary table
+# and correlation matrix without recomputing them over all past listings.
+#
+# The state (eda_outputs/stats_state.json) holds, for the rows that pass the
+# EDA tail filter and for the log_/boxcox_ transforms of them:
+#   per column   count, Welford mean and M2, min, max and a quantile sketch
+#   all columns  mean vector and co-moment matrix (Pearson correlations)
+# plus, for the raw columns before filtering, sketches that track where the
+# 1%/99% bounds would be now, and a 64-bit hash of every ilan_id merged so
+# far. `update` skips listings that are already in the state, so re-sending a
+# batch does not count it twice; the sketches cannot retract a value, so a
+# re-sent listing with a changed price only reaches the stats on a full run.
+#
+# EDA-Calculator.py writes the state on every full run; the tail bounds and
+# Box-Cox lambdas of that run are frozen in it and applied to later batches.
+# Merging a batch costs O(batch), and the outputs are computed from the state
+# alone. Against a full EDA run on the same rows:
+#   count, mean, std, min, max, correlations   exact (up to float rounding)
+#   25% / 50% / 75%                             within 1% of the value at that rank
+#                                               (sketches.ALPHA; describe() interpolates)
+# A full run also refits the bounds and lambdas; `drift` reports how far the
+# bounds implied by all data seen so far have moved from the frozen ones.
+#
+#   python src/online_stats.py update new-listings.csv    # merge a batch, rewrite summary + heatmap
+#   python src/online_stats.py summary                    # outputs from the state only
+#   python src/online_stats.py check analysis_ready_data.csv   # state vs exact stats on a file
+import argparse
+import base64
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.special import boxcox
+
+from eda_stats import format_k
+from sketches import Sketch
+from stage_cache import read_stage
+
+STATE_PATH = "eda_outputs/stats_state.json"
+QUANTILES = (0.25, 0.5, 0.75)
+FORMAT_VERSION = 2
+
+
+class ColumnStats:
+    """count, mean, M2 (Welford/Chan), min, max and a quantile sketch of one column."""
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, lo=np.inf, hi=-np.inf, sketch=None):
+        self.n, self.mean, self.m2, self.lo, self.hi = n, mean, m2, lo, hi
+        self.sketch = sketch or Sketch()
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge_moments(len(values), mean, ((values - mean) ** 2).sum())
+            self.lo, self.hi = min(self.lo, values.min()), max(self.hi, values.max())
+            self.sketch.add(values)
+        return self
+
+    def merge_moments(self, n, mean, m2):
+        # Chan et al.: combine (n, mean, M2) of two disjoint sets
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def merge(self, other):
+        if other.n:
+            self.merge_moments(other.n, other.mean, other.m2)
+            self.lo, self.hi = min(self.lo, other.lo), max(self.hi, other.hi)
+            self.sketch = self.sketch.merge(other.sketch)
+        return self
+
+    def describe(self):
+        """The fields of DataFrame.describe(), quantiles from the sketch."""
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+        p25, p50, p75 = self.sketch.quantiles(QUANTILES)
+        return {"count": self.n, "mean": self.mean if self.n else np.nan, "std": std,
+                "min": self.lo if self.n else np.nan, "25%": p25, "50%": p50, "75%": p75,
+                "max": self.hi if self.n else np.nan}
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "min": self.lo, "max": self.hi,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["n"], d["mean"], d["m2"], d["min"], d["max"], Sketch.from_dict(d["sketch"]))
+
+
+class CoMoments:
+    """Mean vector and co-moment matrix of rows complete in every column."""
+
+    def __init__(self, k, n=0, mean=None, c=None):
+        self.n = n
+        self.mean = np.zeros(k) if mean is None else np.asarray(mean, dtype=float)
+        self.c = np.zeros((k, k)) if c is None else np.asarray(c, dtype=float)
+
+    def add(self, matrix):
+        matrix = np.asarray(matrix, dtype=float)
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+        if len(matrix):
+            mean = matrix.mean(axis=0)
+            centered = matrix - mean
+            self.merge(CoMoments(len(mean), len(matrix), mean, centered.T @ centered))
+        return self
+
+    def merge(self, other):
+        if other.n:
+            total = self.n + other.n
+            delta = other.mean - self.mean
+            self.c = self.c + other.c + np.outer(delta, delta) * self.n * other.n / total
+            self.mean = self.mean + delta * other.n / total
+            self.n = total
+        return self
+
+    def corr(self):
+        d = np.sqrt(np.diag(self.c))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.c / np.outer(d, d)
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean.tolist(), "c": self.c.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(len(d["mean"]), d["n"], d["mean"], d["c"])
+
+
+def hash_ids(ids):
+    """uint64 hashes of ilan_id values, the form the state keeps them in."""
+    return pd.util.hash_array(ids.astype(str).to_numpy(dtype=object))
+
+
+class EdaState:
+    """Frozen tail bounds and Box-Cox lambdas, and the mergeable stats under them."""
+
+    def __init__(self, bounds, lambdas, raw=None, stats=None, comoments=None, batches=0, ids=None):
+        self.bounds = bounds        # raw column -> (lower, upper); rows must be strictly inside all
+        self.lambdas = lambdas      # raw column -> Box-Cox lambda (the columns that get log_/boxcox_)
+        self.raw_columns = list(bounds)
+        self.columns = (self.raw_columns + [f"log_{c}" for c in lambdas] + [f"boxcox_{c}" for c in lambdas])
+        self.raw = raw or {c: ColumnStats() for c in self.raw_columns}
+        self.stats = stats or {c: ColumnStats() for c in self.columns}
+        self.comoments = comoments or CoMoments(len(self.columns))
+        self.batches = batches
+        self.ids = np.empty(0, dtype=np.uint64) if ids is None else ids  # sorted ilan_id hashes
+
+    def transform(self, df):
+        """Rows inside the frozen bounds, with the log_/boxcox_ columns, as EDA-Calculator computes them."""
+        raw = df[self.raw_columns].astype(float)
+        mask = np.ones(len(raw), dtype=bool)
+        for col, (lower, upper) in self.bounds.items():
+            mask &= ((raw[col] > lower) & (raw[col] < upper)).to_numpy()
+        out = raw[mask].copy()
+        for col, lmbda in self.lambdas.items():
+            out[f"log_{col}"] = np.log1p(out[col])
+            out[f"boxcox_{col}"] = boxcox(out[col], lmbda)
+        return out[self.columns]
+
+    def known(self, df):
+        """Mask of the rows whose ilan_id is already merged into the state."""
+        return np.isin(hash_ids(df["ilan_id"]), self.ids)
+
+    def add(self, df):
+        """Merge the rows of one analysis_ready batch that are not in the state yet.
+
+        Returns the number of them that passed the filter.
+        """
+        df = df[~self.known(df)]
+        self.ids = np.union1d(self.ids, hash_ids(df["ilan_id"]))
+        for col in self.raw_columns:
+            self.raw[col].add(df[col])
+        kept = self.transform(df)
+        for col in self.columns:
+            self.stats[col].add(kept[col])
+        self.comoments.add(kept.to_numpy())
+        self.batches += 1
+        return len(kept)
+
+    def summary(self, decimals=2):
+        """describe().T layout, rounded like EDA-Calculator's summary table (same row order)."""
+        order = self.raw_columns + [f"{t}_{c}" for c in self.lambdas for t in ("log", "boxcox")]
+        table = pd.DataFrame({col: self.stats[col].describe() for col in order}).T
+        return table if decimals is None else table.round(decimals)
+
+    def correlation(self):
+        return pd.DataFrame(self.comoments.corr(), index=self.columns, columns=self.columns)
+
+    def drift(self, lower=0.01, upper=0.99):
+        """Frozen vs current 1%/99% bounds per raw column (current ones from the sketches)."""
+        rows = []
+        for col, (frozen_lo, frozen_hi) in self.bounds.items():
+            now_lo, now_hi = self.raw[col].sketch.quantiles((lower, upper))
+            rows.append({"column": col, "frozen_lower": frozen_lo, "lower_now": now_lo,
+                         "frozen_upper": frozen_hi, "upper_now": now_hi,
+                         "max_shift": max(abs(now_lo - frozen_lo) / max(abs(frozen_lo), 1e-12),
+                                          abs(now_hi - frozen_hi) / max(abs(frozen_hi), 1e-12))})
+        return pd.DataFrame(rows)
+
+    def save(self, path=STATE_PATH):
+        state = {
+            "format": FORMAT_VERSION, "batches": self.batches,
+            "bounds": {c: list(b) for c, b in self.bounds.items()}, "lambdas": self.lambdas,
+            "raw": {c: s.to_dict() for c, s in self.raw.items()},
+            "stats": {c: s.to_dict() for c, s in self.stats.items()},
+            "comoments": self.comoments.to_dict(),
+            "ids": base64.b64encode(self.ids.astype("<u8").tobytes()).decode("ascii"),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path}: state format {state.get('format')}, expected {FORMAT_VERSION}; "
+                             f"rerun EDA-Calculator.py")
+        return cls({c: tuple(b) for c, b in state["bounds"].items()}, state["lambdas"],
+                   {c: ColumnStats.from_dict(d) for c, d in state["raw"].items()},
+                   {c: ColumnStats.from_dict(d) for c, d in state["stats"].items()},
+                   CoMoments.from_dict(state["comoments"]), state["batches"],
+                   np.frombuffer(base64.b64decode(state["ids"]), dtype="<u8").astype(np.uint64))
+
+
+def write_outputs(state, out_dir="eda_outputs"):
+    """summary.csv and the correlation heatmap, from the state alone."""
+    from plot_farm import job, run_jobs
+
+    state.summary().map(format_k).to_csv(os.path.join(out_dir, "summary.csv"))
+    corr = state.correlation()
+    corr.to_csv(os.path.join(out_dir, "correlation.csv"))
+    run_jobs([job("corr", "correlation_matrix.png", (list(corr.columns), corr.to_numpy()))])
+
+
+def check(state, path):
+    """Largest relative error of the state's summary and correlations vs exact stats on `path`."""
+    exact = state.transform(read_stage(path, columns=state.raw_columns, narrow_floats=True))
+    got = state.summary(decimals=None)
+    want = exact.describe().T
+    # The sketch reports the value of rank floor(q * (n - 1)); describe() interpolates between ranks
+    want[["25%", "50%", "75%"]] = exact.quantile(list(QUANTILES), interpolation="lower").T.to_numpy()
+    want = want.loc[got.index]
+    err = ((got - want).abs() / want.abs().where(want.abs() > 0, 1)).max()
+    print("max relative error per statistic:")
+    print(err.map(lambda e: f"{e:.3%}").to_string())
+    corr_err = np.nanmax(np.abs(state.correlation().to_numpy() - exact.corr().to_numpy()))
+    print(f"max absolute correlation difference: {corr_err:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental EDA summary and correlation statistics.")
+    parser.add_argument("command", choices=["update", "summary", "drift", "check"])
+    parser.add_argument("path", nargs="?", help="update: new listings (analysis_ready layout); check: file to compare")
+    parser.add_argument("--state", default=STATE_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.state):
+        parser.error(f"{args.state} not found; run src/EDA-Calculator.py once to create it")
+    start = time.perf_counter()
+    state = EdaState.load(args.state)
+    if args.command in ("update", "check") and not args.path:
+        parser.error(f"{args.command} needs a path")
+
+    if args.command == "update":
+        batch = read_stage(args.path, columns=["ilan_id"] + state.raw_columns, narrow_floats=True)
+        known = int(state.known(batch).sum())
+        if known == len(batch):
+            raise SystemExit(f"{args.path}: all {known} listings are already in the state; nothing merged")
+        if known:
+            print(f"Skipping {known} listings already in the state")
+        kept = state.add(batch)
+        state.save(args.state)
+        write_outputs(state)
+        print(f"Merged {len(batch) - known} rows ({kept} inside the tail bounds) "
+              f"in {time.perf_counter() - start:.2f}s; "
+              f"{state.stats[state.columns[0]].n} rows in the state after {state.batches} batches")
+        shift = state.drift()["max_shift"].max()
+        if shift > 0.05:
+            print(f"Tail bounds have moved by up to {shift:.1%}; a full EDA-Calculator.py run refits them")
+    elif args.command == "summary":
+        write_outputs(state)
+        print(state.summary().to_string())
+    elif args.command == "drift":
+        print(state.drift().to_string(index=False))
+    elif args.command == "check":
+        check(state, args.path)
@@ -0,0 +1,160 @@
+# plot_farm.py
+# Parallel, cache-aware rendering of the EDA plots.
+#
+# Every plot is an independent job (kind, output file, data, style). Jobs are
+# keyed by a hash of their data, styling and this module's source. Keys of
+# rendered plots are kept in a manifest, so unchanged plots are skipped on
+# reruns and the rest render on a process pool with the headless Agg backend.
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+PLOT_DIR = "eda_outputs/plots"
+MANIFEST = "eda_outputs/plot_cache.json"
+
+# Columns larger than this get a binned KDE instead of an exact one
+KDE_MAX_POINTS = 100_000
+KDE_BINS = 2048
+KDE_GRID = 200
+
+with open(__file__, "rb") as _f:
+    RENDERER_HASH = hashlib.sha256(_f.read()).hexdigest()
+
+
+def job(kind, filename, data, **style):
+    return {"kind": kind, "file": filename, "data": data, "style": style}
+
+
+def job_key(j):
+    payload = pickle.dumps((j["kind"], j["data"], sorted(j["style"].items())), protocol=4)
+    return hashlib.sha256(RENDERER_HASH.encode() + payload).hexdigest()
+
+
+def binned_kde(values, bin_edges):
+    # Gaussian KDE (Scott's rule, as seaborn uses) evaluated from a fine
+    # histogram, scaled to histogram counts like histplot(kde=True)
+    n = len(values)
+    lo, hi = values.min(), values.max()
+    counts, edges = np.histogram(values, bins=KDE_BINS, range=(lo, hi))
+    centers = (edges[:-1] + edges[1:]) / 2
+    bw = values.std(ddof=1) * n ** (-1 / 5)
+    grid = np.linspace(lo, hi, KDE_GRID)
+    density = np.exp(-0.5 * ((grid[:, None] - centers[None, :]) / bw) ** 2) @ counts
+    density /= n * bw * np.sqrt(2 * np.pi)
+    return grid, density * n * np.diff(bin_edges).mean()
+
+
+def render_hist(data, style):
+    import seaborn as sns
+    column, values = data
+    series = pd.Series(values, name=column)
+    bins = np.histogram_bin_edges(values, bins="sturges")
+    kde_max_points = style.get("kde_max_points", KDE_MAX_POINTS)
+    if kde_max_points and len(values) > kde_max_points:
+        ax = sns.histplot(series, kde=False, bins=bins)
+        grid, curve = binned_kde(values, bins)
+        ax.plot(grid, curve, color=ax.patches[0].get_facecolor()[:3] if ax.patches else None)
+    else:
+        sns.histplot(series, kde=True, bins=bins)
+    plt.title(f"Histogram of {column}")
+
+
+def render_box(data, style):
+    import seaborn as sns
+    column, values = data
+    sns.boxplot(x=pd.Series(values, name=column))
+    plt.title(f"Boxplot of {column}")
+
+
+def render_qq(data, style):
+    import statsmodels.api as sm
+    column, values = data
+    sm.qqplot(values, line='s')
+    plt.title(f"Q-Q Plot of {column}\nR^2 = {style['r2']:.4f}")
+
+
+def render_bar(data, style):
+    column, labels, counts = data
+    plt.figure(figsize=(10, 4))
+    pd.Series(counts, index=labels).plot(kind="bar")
+    plt.title(f"Histogram of {column}")
+    plt.xticks(rotation=30, ha='right', fontsize=8)
+    plt.tight_layout()
+
+
+def render_corr(data, style):
+    import seaborn as sns
+    labels, matrix = data
+    corr = pd.DataFrame(matrix, index=labels, columns=labels)
+    mask = np.triu(np.ones_like(corr, dtype=bool))
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(corr, mask=mask, annot=True, fmt=".2f", cmap="coolwarm")
+    plt.title("Correlation Matrix")
+    plt.tight_layout()
+
+
+RENDERERS = {
+    "hist": render_hist,
+    "box": render_box,
+    "qq": render_qq,
+    "bar": render_bar,
+    "corr": render_corr,
+}
+
+
+def render(j):
+    path = os.path.join(PLOT_DIR, j["file"])
+    try:
+        RENDERERS[j["kind"]](j["data"], j["style"])
+        plt.savefig(path)
+        return j["file"], None
+    except Exception as err:
+        return j["file"], f"{type(err).__name__}: {err}"
+    finally:
+        plt.close("all")
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def run_jobs(jobs, workers=None):
+    """Render the jobs whose plot is missing or stale; return (rendered, skipped, failed)."""
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    manifest = load_manifest()
+    keys = {j["file"]: job_key(j) for j in jobs}
+
+    todo = [j for j in jobs
+            if manifest.get(j["file"]) != keys[j["file"]]
+            or not os.path.exists(os.path.join(PLOT_DIR, j["file"]))]
+
+    failed = []
+    if todo:
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        if workers == 1:
+            results = [render(j) for j in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(render, todo))
+        for filename, error in results:
+            if error is None:
+                manifest[filename] = keys[filename]
+            else:
+                manifest.pop(filename, None)
+                failed.append((filename, error))
+
+    with open(MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return len(todo) - len(failed), len(jobs) - len(todo), failed
@@ -0,0 +1,283 @@
+# predict_server.py
+# Long-lived price-per-m² prediction service for trained_model.pkl.
+#
+#   python src/predict_server.py serve --port 8000
+#   curl -X POST localhost:8000/predict -d '{"metrekare": 120, "il": "İstanbul", ...}'
+#   python src/predict_server.py bench --requests 2000 --clients 8 --batch 32
+#
+# The model is loaded once. Requests (a listing object or a list of them)
+# are queued and a single batcher thread merges whatever arrives within
+# --max-wait-ms (up to --max-batch listings) into one pipeline.predict call,
+# so concurrent clients share the per-call overhead of the ColumnTransformer
+# and XGBoost. Each listing gets fiyat_per_m2 and, from metrekare, fiyat.
+#
+# From Python:
+#   predictor = Predictor("trained_model.pkl")
+#   predictor.predict([{...}, {...}])          # direct, one predict call
+#   predictor.submit([{...}]).result()         # micro-batched with other callers
+import argparse
+import http.client
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+class Predictor:
+    def __init__(self, model_path="trained_model.pkl", max_batch=512, max_wait_ms=2.0):
+        self.pipeline = joblib.load(model_path)
+        # Trained with device="cuda"; serving inputs are host arrays
+        self.pipeline.named_steps["model"].set_params(device="cpu")
+        transformers = self.pipeline.named_steps["preprocessor"].transformers_
+        self.numeric_features = list(transformers[0][2])
+        self.categorical_features = list(transformers[1][2])
+        self.columns = self.numeric_features + self.categorical_features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.batcher = None
+        self.lock = threading.Lock()
+        self.predict_calls = 0
+        self.batched_rows = 0
+
+    def frame(self, records):
+        """Validate listing dicts and build the model's input frame."""
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError("expected a listing object or a list of listing objects")
+        missing = sorted({c for r in records for c in self.columns if r.get(c) is None})
+        if missing:
+            raise ValueError(f"missing fields: {', '.join(missing)}")
+        df = pd.DataFrame.from_records(records, columns=self.columns)
+        # float64, as in training; a float32 scaler output flips tree splits
+        numeric = df[self.numeric_features].apply(pd.to_numeric, errors="coerce")
+        df[self.numeric_features] = numeric.astype(np.float64)
+        bad = [c for c in self.numeric_features if df[c].isna().any()]
+        if bad:
+            raise ValueError(f"non-numeric values in: {', '.join(bad)}")
+        return df
+
+    def results(self, df, per_m2):
+        per_m2 = np.asarray(per_m2, dtype=float)
+        total = per_m2 * df["metrekare"].to_numpy(dtype=float)
+        return [{"fiyat_per_m2": round(float(p), 2), "fiyat": round(float(t))} for p, t in zip(per_m2, total)]
+
+    def predict(self, records):
+        """Score listings in one predict call, without batching."""
+        df = self.frame(records)
+        return self.results(df, self.pipeline.predict(df))
+
+    def submit(self, records):
+        """Queue listings for the next micro-batch; returns a Future of the results."""
+        future = Future()
+        try:
+            df = self.frame(records)
+        except ValueError as e:
+            future.set_exception(e)
+            return future
+        with self.lock:
+            if self.batcher is None:
+                self.batcher = threading.Thread(target=self.run_batches, daemon=True)
+                self.batcher.start()
+        self.queue.put((df, future))
+        return future
+
+    def run_batches(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch, rows = [item], len(item[0])
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+            while rows < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self.score_batch(batch)
+            if stop:
+                return
+
+    def score_batch(self, batch):
+        frames = [df for df, _ in batch]
+        try:
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            results = self.results(df, self.pipeline.predict(df))
+            self.predict_calls += 1
+            self.batched_rows += len(df)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for frame, future in batch:
+            future.set_result(results[start:start + len(frame)])
+            start += len(frame)
+
+    def close(self):
+        if self.batcher is not None:
+            self.queue.put(None)
+            self.batcher.join()
+            self.batcher = None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive
+    # clients wait out a delayed ACK (~40 ms) on every response.
+    disable_nagle_algorithm = True
+    predictor = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "features": self.predictor.columns})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            records = json.loads(self.rfile.read(length) or b"null")
+            results = self.predictor.submit(records).result()
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, results[0] if isinstance(records, dict) else results)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(predictor, host="127.0.0.1", port=8000):
+    handler = type("BoundHandler", (Handler,), {"predictor": predictor})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# --- Load generator ---
+
+def sample_records(path, n, columns):
+    from stage_cache import read_stage
+    df = read_stage(path, columns=columns).dropna()
+    return df.sample(n=min(n, len(df)), random_state=42).to_dict("records")
+
+
+def client_loop(port, payloads, latencies):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for body in payloads:
+        start = time.perf_counter()
+        conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def load_test(port, records, requests, clients, batch):
+    payloads = []
+    for i in range(requests):
+        chunk = [records[(i * batch + j) % len(records)] for j in range(batch)]
+        payloads.append(json.dumps(chunk[0] if batch == 1 else chunk, default=str))
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client_loop, [port] * clients, [payloads[c::clients] for c in range(clients)],
+                      [latencies] * clients))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "batch": batch, "clients": clients, "requests": requests,
+        "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+        "rps": requests / elapsed, "listings_per_s": requests * batch / elapsed,
+    }
+
+
+def bench(args):
+    predictor = Predictor(args.model, args.max_batch, args.max_wait_ms)
+    server = make_server(predictor, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+    try:
+        records = sample_records(args.data, 5000, predictor.columns)
+        load_test(port, records, 50, 1, 1)  # warm-up
+        print(f"{'batch':>5} {'clients':>7} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'listings/s':>11} "
+              f"{'per predict':>11}")
+        for batch in sorted({1, args.batch}):
+            for clients in sorted({1, args.clients}):
+                predictor.predict_calls = predictor.batched_rows = 0
+                r = load_test(port, records, args.requests, clients, batch)
+                per_call = predictor.batched_rows / max(predictor.predict_calls, 1)
+                print(f"{r['batch']:>5} {r['clients']:>7} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                      f"{r['rps']:>8.0f} {r['listings_per_s']:>11.0f} {per_call:>11.1f}")
+    finally:
+        server.shutdown()
+        predictor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve or benchmark price-per-m² predictions.")
+    parser.add_argument("command", nargs="?", choices=["serve", "bench"], default="serve")
+    parser.add_argument("--model", default="trained_model.pkl")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=512, help="listings merged into one predict call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="how long the batcher waits for more requests")
+    parser.add_argument("--data", default="detailed-listings-cleaned.csv", help="bench: listings to replay")
+    parser.add_argument("--requests", type=int, default=2000, help="bench: requests per scenario")
+    parser.add_argument("--clients", type=int, default=8, help="bench: concurrent client connections")
+    parser.add_argument("--batch", type=int, default=32, help="bench: listings per batched request")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args)
+        return
+
+    predictor = Predictor(args.model, args.max_batch, args.max_wait_ms)
+    server = make_server(predictor, args.host, args.port)
+    print(f"Serving {args.model} on http://{args.host}:{args.port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        predictor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+# price_cube.py
+# Materialized aggregate cube over the cleaned listings, for fast roll-ups.
+#
+# A cell is one (il, ilce, kademe, ilan_tipi, month of ilan_tarihi). It keeps
+# the listing count, the sums of fiyat, metrekare, fiyat_per_m2 and its square,
+# min/max fiyat_per_m2, the district's SEGE skor and a quantile sketch of
+# fiyat_per_m2 (sketches.py, 1% relative error). Apart from min/max these
+# are all sums, so any roll-up or drill-down is computed from the cells alone.
+#
+# The cube is a SQLite file (price_cube.sqlite):
+#   cells    one row per cell, indexed on every dimension, sketch as a blob
+#   members  ilan_id -> cell and values, so update() adds new listings and
+#            moves changed ones between cells without a rebuild
+#
+#   python src/price_cube.py build                     # from analysis_ready_data.csv
+#   python src/price_cube.py update new-listings.csv   # same columns as the source
+#   python src/price_cube.py query --by kademe
+#   python src/price_cube.py query --by ilce --where il=İstanbul --quantiles 0.1,0.5,0.9
+#   python src/price_cube.py bench                     # query latency and error vs pandas
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import sketches
+from stage_cache import read_stage
+
+DEFAULT_PATH = "price_cube.sqlite"
+SOURCE = "analysis_ready_data.csv"
+
+DIMS = ["il", "ilce", "kademe", "ilan_tipi", "month"]
+SOURCE_COLUMNS = ["ilan_id", "il", "ilce", "kademe", "ilan_tipi", "ilan_tarihi", "skor",
+                  "fiyat", "metrekare", "fiyat_per_m2"]
+SUMS = ["n", "sum_fiyat", "sum_m2", "sum_fpm2", "sumsq_fpm2"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    cell_id INTEGER PRIMARY KEY,
+    il TEXT,
+    ilce TEXT,
+    kademe TEXT,
+    ilan_tipi TEXT,
+    month TEXT,  -- YYYY-MM
+    skor REAL,
+    n INTEGER NOT NULL,
+    sum_fiyat INTEGER NOT NULL,
+    sum_m2 REAL NOT NULL,
+    sum_fpm2 REAL NOT NULL,
+    sumsq_fpm2 REAL NOT NULL,
+    min_fpm2 REAL,
+    max_fpm2 REAL,
+    sketch_lo INTEGER NOT NULL,
+    sketch BLOB NOT NULL  -- uint32 bucket counts from sketch_lo
+);
+CREATE INDEX IF NOT EXISTS cells_il_ilce ON cells (il, ilce);
+CREATE INDEX IF NOT EXISTS cells_kademe ON cells (kademe);
+CREATE INDEX IF NOT EXISTS cells_ilan_tipi ON cells (ilan_tipi);
+CREATE INDEX IF NOT EXISTS cells_month ON cells (month);
+CREATE TABLE IF NOT EXISTS members (
+    ilan_id TEXT PRIMARY KEY,
+    cell_id INTEGER NOT NULL,
+    fiyat INTEGER NOT NULL,
+    metrekare REAL NOT NULL,
+    fiyat_per_m2 REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS members_cell ON members (cell_id);
+"""
+
+
+def month_of(ilan_tarihi):
+    # DD-MM-YYYY -> YYYY-MM, once per distinct date
+    codes, dates = pd.factorize(ilan_tarihi)
+    months = np.array([f"{d[6:10]}-{d[3:5]}" if isinstance(d, str) and len(d) == 10 else None
+                       for d in dates] + [None], dtype=object)
+    return months[codes]
+
+
+def prepare(df):
+    """Source rows as the cube sees them: one row per ilan_id with its dimensions."""
+    df = df.dropna(subset=["ilan_id", "fiyat", "metrekare", "fiyat_per_m2"])
+    out = pd.DataFrame({"ilan_id": df["ilan_id"].astype(str).to_numpy()})
+    for dim in DIMS[:-1]:
+        out[dim] = df[dim].astype(object).where(df[dim].notna(), None).to_numpy()
+    out["month"] = month_of(df["ilan_tarihi"])
+    out["skor"] = pd.to_numeric(df["skor"], errors="coerce").astype(float).to_numpy()
+    out["fiyat"] = df["fiyat"].astype("int64").to_numpy()
+    out["metrekare"] = df["metrekare"].astype(float).to_numpy()
+    out["fiyat_per_m2"] = df["fiyat_per_m2"].astype(float).to_numpy()
+    # A later row for the same listing wins, as in an upsert
+    return out.drop_duplicates(subset="ilan_id", keep="last").reset_index(drop=True)
+
+
+def encode_sketch(counts):
+    return np.asarray(counts, dtype="<u4").tobytes()
+
+
+def decode_sketch(blob):
+    return np.frombuffer(blob, dtype="<u4").astype(np.int64)
+
+
+class PriceCube:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (ilan_id TEXT PRIMARY KEY)")
+        self.db.commit()
+        self._snapshot = None
+
+    def close(self):
+        self.db.close()
+
+    # --- Maintenance ---
+
+    def cell_ids(self, keys):
+        """cell_id per dimension tuple, creating empty cells for new ones."""
+        existing = {tuple(row[:-1]): row[-1]
+                    for row in self.db.execute(f"SELECT {', '.join(DIMS)}, cell_id FROM cells")}
+        missing = [k for k in keys if k not in existing]
+        for key in missing:
+            cursor = self.db.execute(
+                f"INSERT INTO cells ({', '.join(DIMS)}, n, sum_fiyat, sum_m2, sum_fpm2, sumsq_fpm2, sketch_lo, sketch) "
+                f"VALUES ({', '.join('?' for _ in DIMS)}, 0, 0, 0, 0, 0, 0, ?)", (*key, b""))
+            existing[key] = cursor.lastrowid
+        return np.array([existing[k] for k in keys], dtype=np.int64)
+
+    def update(self, df):
+        """Add new listings and move changed ones; returns (added, changed, unchanged) counts.
+
+        Only the cells the batch touches are rewritten. A listing already in
+        the cube with the same cell and values is left alone, so re-sending
+        an overlapping batch is harmless.
+        """
+        rows = prepare(df)
+        self._snapshot = None
+        with self.db:
+            self.db.execute("DELETE FROM incoming")
+            self.db.executemany("INSERT INTO incoming VALUES (?)", ((i,) for i in rows["ilan_id"]))
+            old = pd.read_sql_query(
+                # CROSS JOIN keeps incoming as the outer loop (probe members by key, not a scan)
+                "SELECT m.ilan_id, m.cell_id, m.fiyat, m.metrekare, m.fiyat_per_m2 "
+                "FROM incoming CROSS JOIN members m USING (ilan_id)", self.db)
+
+            key_codes, unique_keys = pd.MultiIndex.from_frame(rows[DIMS]).factorize()
+            rows["cell_id"] = self.cell_ids([tuple(None if pd.isna(v) else v for v in k)
+                                             for k in unique_keys])[key_codes]
+
+            # Unchanged listings drop out; changed ones are retracted from their old cell
+            if len(old):
+                joined = rows.merge(old, on="ilan_id", how="left", suffixes=("", "_old"))
+                same = ((joined["cell_id"] == joined["cell_id_old"])
+                        & (joined["fiyat"] == joined["fiyat_old"])
+                        & (joined["metrekare"] == joined["metrekare_old"])
+                        & (joined["fiyat_per_m2"] == joined["fiyat_per_m2_old"]))
+                unchanged = int(same.sum())
+                rows = rows[~same.to_numpy()].reset_index(drop=True)
+                retract = old[old["ilan_id"].isin(rows["ilan_id"])]
+            else:
+                unchanged = 0
+                retract = old
+            added = len(rows) - len(retract)
+
+            self.apply(rows, retract)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?, ?)",
+                zip(rows["ilan_id"], rows["cell_id"].tolist(), rows["fiyat"].tolist(),
+                    rows["metrekare"].tolist(), rows["fiyat_per_m2"].tolist()))
+            if len(retract):
+                self.refresh_extremes(retract["cell_id"].unique())
+            self.db.execute("DELETE FROM cells WHERE n = 0")
+        return added, len(retract), unchanged
+
+    def apply(self, adds, retracts):
+        """Add the batch deltas (adds minus retracts) to the cells they touch."""
+        parts = [frame[["cell_id", "fiyat", "metrekare", "fiyat_per_m2"]].assign(sign=sign)
+                 for frame, sign in ((adds, 1), (retracts, -1)) if len(frame)]
+        if not parts:
+            return
+        delta = pd.concat(parts, ignore_index=True)
+        fpm2 = delta["fiyat_per_m2"].to_numpy()
+        sign = delta["sign"].to_numpy()
+        delta = delta.assign(n=sign, sum_fiyat=sign * delta["fiyat"], sum_m2=sign * delta["metrekare"],
+                             sum_fpm2=sign * fpm2, sumsq_fpm2=sign * fpm2 * fpm2,
+                             bucket=sketches.bucket_index(fpm2))
+        sums = delta.groupby("cell_id")[SUMS].sum()
+        extremes = delta[delta["sign"] > 0].groupby("cell_id")["fiyat_per_m2"].agg(["min", "max"])
+        extremes = dict(zip(extremes.index, zip(extremes["min"], extremes["max"])))
+        skor = adds.groupby("cell_id")["skor"].first().to_dict()
+        # Signed bucket counts per cell, sorted by (cell, bucket)
+        buckets = delta.groupby(["cell_id", "bucket"])["sign"].sum()
+        bucket_cell = buckets.index.get_level_values(0).to_numpy()
+        bucket_idx = buckets.index.get_level_values(1).to_numpy()
+        bucket_count = buckets.to_numpy()
+        bounds = np.flatnonzero(np.diff(bucket_cell)) + 1
+        starts, ends = np.r_[0, bounds], np.r_[bounds, len(bucket_cell)]
+
+        current = {row[0]: row[1:] for row in self.db.execute(
+            f"SELECT cell_id, {', '.join(SUMS)}, min_fpm2, max_fpm2, sketch_lo, sketch FROM cells "
+            f"WHERE cell_id IN (SELECT value FROM json_each(?))", (sums.index.to_series().to_json(orient="values"),))}
+
+        updates = []
+        for (cell_id, *d), start, end in zip(sums.itertuples(), starts, ends):
+            n, sum_fiyat, sum_m2, sum_fpm2, sumsq_fpm2, lo_fpm2, hi_fpm2, sketch_lo, blob = current[cell_id]
+            idx = bucket_idx[start:end]
+            batch = np.zeros(int(idx[-1] - idx[0]) + 1, dtype=np.int64)
+            batch[idx - idx[0]] = bucket_count[start:end]
+            lo, counts = sketches.merge((sketch_lo, decode_sketch(blob)), (int(idx[0]), batch))
+            if cell_id in extremes:
+                e_min, e_max = extremes[cell_id]
+                lo_fpm2 = e_min if lo_fpm2 is None else min(lo_fpm2, e_min)
+                hi_fpm2 = e_max if hi_fpm2 is None else max(hi_fpm2, e_max)
+            updates.append((int(n + d[0]), int(round(sum_fiyat + d[1])), sum_m2 + d[2], sum_fpm2 + d[3],
+                            sumsq_fpm2 + d[4], lo_fpm2, hi_fpm2, lo, encode_sketch(counts),
+                            skor.get(cell_id), int(cell_id)))
+        self.db.executemany(
+            f"UPDATE cells SET {', '.join(f'{c} = ?' for c in SUMS)}, min_fpm2 = ?, max_fpm2 = ?, "
+            f"sketch_lo = ?, sketch = ?, skor = COALESCE(?, skor) WHERE cell_id = ?", updates)
+
+    def refresh_extremes(self, cell_ids):
+        # min/max cannot be un-merged; recompute them for cells that lost listings
+        self.db.executemany(
+            "UPDATE cells SET min_fpm2 = (SELECT MIN(fiyat_per_m2) FROM members WHERE cell_id = cells.cell_id), "
+            "max_fpm2 = (SELECT MAX(fiyat_per_m2) FROM members WHERE cell_id = cells.cell_id) WHERE cell_id = ?",
+            ((int(c),) for c in cell_ids))
+
+    def clear(self):
+        self._snapshot = None
+        with self.db:
+            self.db.execute("DELETE FROM cells")
+            self.db.execute("DELETE FROM members")
+
+    # --- Queries ---
+
+    def cells(self, where=None):
+        """Raw cells matching where ({dim: value or list of values}), straight from the indexed table."""
+        clauses, params = [], []
+        for dim, value in (where or {}).items():
+            if dim not in DIMS:
+                raise ValueError(f"unknown dimension {dim!r}; expected one of {DIMS}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{dim} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        sql = "SELECT * FROM cells" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    def snapshot(self):
+        """All cells in memory (sketches as one flat count array), reloaded after an update."""
+        if self._snapshot is None:
+            cells = pd.read_sql_query("SELECT * FROM cells ORDER BY cell_id", self.db)
+            lengths = cells["sketch"].str.len().to_numpy() // 4
+            counts = np.frombuffer(b"".join(cells["sketch"]), dtype="<u4")
+            self._snapshot = (cells.drop(columns="sketch"), counts, np.cumsum(lengths) - lengths, lengths)
+        return self._snapshot
+
+    def query(self, by=(), where=None, quantiles=(0.25, 0.5, 0.75)):
+        """Roll up the matching cells to the `by` dimensions.
+
+        Returns one row per group with the listing count, mean fiyat,
+        metrekare and fiyat_per_m2, fiyat_per_m2 std/min/max and quantiles
+        (p50 etc., within the sketch's 1% relative error) and the
+        count-weighted SEGE skor. The first query loads the cells into
+        memory; later ones only touch NumPy arrays.
+        """
+        by = list(by)
+        cells, flat_counts, offsets, lengths = self.snapshot()
+        mask = np.ones(len(cells), dtype=bool)
+        for dim, value in (where or {}).items():
+            if dim not in DIMS:
+                raise ValueError(f"unknown dimension {dim!r}; expected one of {DIMS}")
+            mask &= cells[dim].isin(value if isinstance(value, (list, tuple, set)) else [value]).to_numpy()
+        selected = np.flatnonzero(mask)
+        cells, offsets, lengths = cells.iloc[selected], offsets[selected], lengths[selected]
+        if cells.empty:
+            return pd.DataFrame(columns=by + ["n"])
+        if by:
+            group, keys = pd.MultiIndex.from_frame(cells[by].fillna("")).factorize()
+            out = pd.DataFrame(list(keys), columns=by)
+        else:
+            group, out = np.zeros(len(cells), dtype=np.int64), pd.DataFrame(index=[0])
+        groups = len(out)
+
+        def total(col):
+            return np.bincount(group, weights=cells[col].to_numpy(dtype=float), minlength=groups)
+
+        n = total("n")
+        out["n"] = n.astype(np.int64)
+        out["mean_fiyat"] = total("sum_fiyat") / n
+        out["mean_metrekare"] = total("sum_m2") / n
+        mean = total("sum_fpm2") / n
+        out["mean_fpm2"] = mean
+        var = np.maximum(total("sumsq_fpm2") / n - mean ** 2, 0) * n / np.maximum(n - 1, 1)
+        out["std_fpm2"] = np.sqrt(var)
+        out["min_fpm2"] = cells.groupby(group)["min_fpm2"].min().to_numpy()
+        out["max_fpm2"] = cells.groupby(group)["max_fpm2"].max().to_numpy()
+
+        # Merge the sketches of each group: one bincount over (group, bucket)
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        counts = flat_counts[np.repeat(offsets, lengths) + within]
+        bucket = np.repeat(cells["sketch_lo"].to_numpy(), lengths) + within
+        lo, width = int(bucket.min()), int(bucket.max() - bucket.min()) + 1
+        dense = np.bincount(np.repeat(group, lengths) * width + (bucket - lo), weights=counts,
+                            minlength=groups * width).reshape(groups, width)
+        for q, values in zip(quantiles, sketches.quantiles(dense, lo, quantiles).T):
+            out[f"p{q * 100:g}"] = values
+
+        skor = cells["skor"].to_numpy(dtype=float)
+        has_skor = ~np.isnan(skor)
+        weights = np.bincount(group[has_skor], weights=cells["n"].to_numpy()[has_skor], minlength=groups)
+        with np.errstate(invalid="ignore"):
+            out["skor"] = np.bincount(group[has_skor], weights=(skor * cells["n"])[has_skor],
+                                      minlength=groups) / weights
+        return out.sort_values(by).reset_index(drop=True) if by else out
+
+    def stats(self):
+        q = self.db.execute
+        return {"cells": q("SELECT COUNT(*) FROM cells").fetchone()[0],
+                "listings": q("SELECT COUNT(*) FROM members").fetchone()[0],
+                "file_mb": round(os.path.getsize(self.path) / 2**20, 1)}
+
+
+def build(source=SOURCE, path=DEFAULT_PATH):
+    cube = PriceCube(path)
+    cube.clear()
+    cube.update(read_stage(source, columns=SOURCE_COLUMNS))
+    cube.db.execute("VACUUM")
+    return cube
+
+
+def parse_where(items):
+    where = {}
+    for item in items or []:
+        dim, _, value = item.partition("=")
+        where[dim] = value.split(",") if "," in value else value
+    return where
+
+
+def bench(cube, source, repeats=20):
+    """Representative questions: cube latency vs pandas on the stage file, and the p50 error."""
+    t = time.perf_counter()
+    df = prepare(read_stage(source, columns=SOURCE_COLUMNS))
+    load_s = time.perf_counter() - t
+    top = df.groupby(["il", "ilce"]).size().idxmax()
+    questions = [
+        (f"median TL/m² in {top[1]} ({top[0]})", [], {"il": top[0], "ilce": top[1]}),
+        ("spread per kademe", ["kademe"], {}),
+        ("listings per il by ilan_tipi", ["il", "ilan_tipi"], {}),
+        ("per district per month", ["il", "ilce", "month"], {}),
+    ]
+    print(f"pandas: loading {len(df)} rows from {source} takes {load_s * 1000:.0f} ms before any question")
+    print(f"{'question':<40} {'groups':>7} {'cube ms':>8} {'pandas ms':>10} {'max p50 err':>12}")
+    for name, by, where in questions:
+        times = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            result = cube.query(by, where, quantiles=(0.5,))
+            times.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        sub = df
+        for dim, value in where.items():
+            sub = sub[sub[dim] == value]
+        exact = (sub.groupby(by)["fiyat_per_m2"] if by else sub["fiyat_per_m2"]).quantile(0.5, interpolation="lower")
+        pandas_s = time.perf_counter() - t
+
+        if by:
+            merged = result.merge(exact.rename("exact").reset_index(), on=by)
+            err = (merged["p50"] / merged["exact"] - 1).abs().max()
+        else:
+            err = abs(result["p50"].iloc[0] / exact - 1)
+        print(f"{name:<40} {len(result):>7} {np.median(times) * 1000:>8.1f} {pandas_s * 1000:>10.1f} {err:>12.3%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="District/level aggregate cube over the cleaned listings.")
+    parser.add_argument("command", choices=["build", "update", "query", "bench", "stats"])
+    parser.add_argument("path", nargs="?", help="update: CSV or Parquet of new/changed listings")
+    parser.add_argument("--cube", default=DEFAULT_PATH)
+    parser.add_argument("--source", default=SOURCE, help="stage file to build from (or detailed-listings-cleaned.csv)")
+    parser.add_argument("--by", default="", help=f"comma-separated dimensions: {', '.join(DIMS)}")
+    parser.add_argument("--where", action="append", help="dim=value or dim=v1,v2 (repeatable)")
+    parser.add_argument("--quantiles", default="0.25,0.5,0.75")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "build":
+        cube = build(args.source, args.cube)
+        print(f"Built {args.cube} in {time.perf_counter() - start:.1f}s")
+    else:
+        cube = PriceCube(args.cube)
+    try:
+        if args.command == "update":
+            if not args.path:
+                parser.error("update needs a CSV or Parquet path")
+            new = pd.read_parquet(args.path) if args.path.endswith(".parquet") else pd.read_csv(args.path)
+            added, changed, unchanged = cube.update(new)
+            print(f"{added} added, {changed} changed, {unchanged} unchanged in {time.perf_counter() - start:.2f}s")
+        elif args.command == "query":
+            result = cube.query([d for d in args.by.split(",") if d], parse_where(args.where),
+                                [float(q) for q in args.quantiles.split(",")])
+            with pd.option_context("display.max_rows", 200, "display.width", 200):
+                print(result.round(3).to_string(index=False))
+            print(f"({len(result)} rows in {(time.perf_counter() - start) * 1000:.1f} ms)")
+        elif args.command == "bench":
+            bench(cube, args.source)
+        print(", ".join(f"{k}: {v}" for k, v in cube.stats().items()))
+    finally:
+        cube.close()
@@ -1,30 +1,111 @@
+import argparse
+import time
+
 import pandas as pd
+import schema
+from stage_cache import StageWriter, write_stage
+from instrumentation import start_run
+
+INPUT = "data/hepsiemlak_500k_with_sege.csv"
+OUTPUT = "analysis_ready_data.csv"
 
-# 1. Load the data
-df = pd.read_csv("data/hepsiemlak_500k_with_sege.csv")
 
 # 2–3. Filter for TL currency and exclude new buildings
-df = df[df['para_birimi'] == "TL"]
-df = df[df['bina_yasi'] != "Sıfır Bina"]
+def tl_only(df):
+    return df[df['para_birimi'] == "TL"]
+
+
+def drop_new_buildings(df):
+    return df[df['bina_yasi'] != "Sıfır Bina"]
+
 
 # 4. Clean the area column correctly
-df['metrekare'] = (
-    df['metrekare']
-      .str.replace(" m²", "", regex=False)
-      .str.replace(".",  "", regex=False)
-      .str.replace(",",  ".", regex=False)
-      .astype(float)
-)
+def clean_metrekare(df):
+    df['metrekare'] = (
+        df['metrekare']
+          .str.replace(" m²", "", regex=False)
+          .str.replace(".",  "", regex=False)
+          .str.replace(",",  ".", regex=False)
+          .astype(float)
+    )
+
+    # 5. Convert price to int64
+    df['fiyat'] = df['fiyat'].astype('int64')
+    return df
 
-# 5. Convert price to int64
-df['fiyat'] = df['fiyat'].astype('int64')
 
 # 6. Clean invalid data
-df = df[(df['fiyat'] > 0) & (df['metrekare'] > 0)]
+def drop_invalid(df):
+    return df[(df['fiyat'] > 0) & (df['metrekare'] > 0)]
+
 
 # 7. Calculate price per square meter and round to 2 decimal places
-df['fiyat_per_m2'] = (df['fiyat'] / df['metrekare']).round(2)
+def add_fiyat_per_m2(df):
+    df['fiyat_per_m2'] = (df['fiyat'] / df['metrekare']).round(2)
+    return df
+
+
+# Row filters come first, so rejected rows never reach the string cleaning
+STEPS = [
+    ("currency filter", tl_only),
+    ("Sıfır Bina filter", drop_new_buildings),
+    ("clean metrekare", clean_metrekare),
+    ("invalid filter", drop_invalid),
+    ("fiyat_per_m2", add_fiyat_per_m2),
+]
+
+
+def run_in_memory(run):
+    # 1. Load the data
+    with run.step("load") as step:
+        df = schema.read_csv(INPUT)
+        step.rows_out = len(df)
+        step.extra["frame_mb"] = schema.frame_mb(df)
+
+    for name, transform in STEPS:
+        with run.step(name, rows_in=len(df)) as step:
+            df = transform(df)
+            step.rows_out = len(df)
+
+    # 8. Save the cleaned data (CSV plus typed Parquet for downstream stages)
+    with run.step("save", rows_in=len(df)) as step:
+        write_stage(df, OUTPUT, index=False, encoding="utf-8")
+        step.rows_out = len(df)
+
+
+def run_chunked(run, chunk_rows):
+    """The same steps on one chunk at a time, streamed to the output.
+
+    Columns are read as text: the ones the steps do not touch are written back
+    exactly as they were read (which is what the in-memory round trip through
+    the parsed dtypes produces too), so the output does not depend on where
+    chunk boundaries fall. Memory is bounded by chunk_rows, not the file size.
+    """
+    rows_in = 0
+    start = time.perf_counter()
+    with run.step("load + clean + save (chunked)") as step, StageWriter(OUTPUT, index=False,
+                                                                         encoding="utf-8") as writer:
+        for chunk in pd.read_csv(INPUT, dtype=str, chunksize=chunk_rows):
+            rows_in += len(chunk)
+            for _, transform in STEPS:
+                chunk = transform(chunk)
+            writer.write(chunk)
+            step.extra["chunks"] = step.extra.get("chunks", 0) + 1
+        step.rows_in = rows_in
+        step.rows_out = writer.rows
+        step.extra["rows_per_s"] = round(rows_in / max(time.perf_counter() - start, 1e-9))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the merged listings into analysis_ready_data.csv.")
+    parser.add_argument("--chunked", action="store_true",
+                        help="stream the input in chunks with bounded memory (for files larger than RAM)")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    args = parser.parse_args()
 
-# 8. Save the cleaned data
-df.to_csv("analysis_ready_data.csv", index=False, encoding="utf-8")
-print("Cleaned dataset saved as: analysis_ready_data.csv")
\ No newline at end of file
+    run = start_run("processBeforeEDA")
+    if args.chunked:
+        run_chunked(run, args.chunk_rows)
+    else:
+        run_in_memory(run)
+    print("Cleaned dataset saved as: analysis_ready_data.csv")
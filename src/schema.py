@@ -0,0 +1,152 @@
+# schema.py
+# Compact column dtypes shared by every stage that loads listing data.
+#
+#   category   low-cardinality Turkish text (il, ilce, kademe, kat, ...)
+#   int8/uint8 0/1 flags and room counts
+#   float32    areas, ages, floor counts and the SEGE score
+#   int64 / float64 are kept for fiyat and fiyat_per_m2 (money; the target)
+#
+# The same column is raw text in early stages ("110 m²", "515.000") and a
+# number later, so numeric dtypes only apply to columns that already parsed
+# as numbers; raw text columns that will become numbers are still stored as
+# category. Integer dtypes fall back to float32 when a column was parsed as
+# float (missing or non-integral values, or "1.0" in the file), so stage
+# outputs are written back exactly as before.
+#
+# PIPELINE_DROP_TEXT=1 drops ilan_linki and konum (long, unique-ish strings)
+# on load in stages that no longer need them; merger.py drops them right
+# after deriving il/ilce from konum.
+#
+# float32 is the storage dtype (Parquet, and the cleaning stages' frames).
+# stage_cache.read_stage() returns float64 unless the caller opts in with
+# narrow_floats=True, as the EDA stages do: the pickled model pipeline's
+# StandardScaler computes in the dtype it is given, and float32 inputs shift
+# the scaled features enough to flip XGBoost splits.
+#
+#   python src/schema.py                      # per-stage frame memory, plain read_csv vs schema
+#   python src/schema.py --root benchmarks/work/1m
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL = [
+    "ilan_tarihi", "ilan_tipi", "kat", "para_birimi", "il", "ilce", "kademe",
+    "isinma_tipi", "kullanim_durumu", "cephe", "oda_sayisi",
+]
+
+NUMERIC = {
+    "metrekare": "float32",
+    "bina_yasi": "float32",
+    "fiyat": "int64",
+    "skor": "float32",
+    "fiyat_per_m2": "float64",
+    "banyo_sayisi": "int8",
+    "kat_sayisi": "float32",
+    "oda_sayisi_yeni": "int8",
+    "salon_sayisi": "int8",
+    "kat_sayisi_encoded": "float32",
+    "cephe_kuzey": "uint8",
+    "cephe_guney": "uint8",
+    "cephe_dogu": "uint8",
+    "cephe_bati": "uint8",
+}
+
+TEXT = ["ilan_linki", "konum"]
+DROP_TEXT = os.environ.get("PIPELINE_DROP_TEXT", "") not in ("", "0")
+
+# Raw text columns with more distinct values than this share of rows stay object
+CATEGORY_MAX_RATIO = 0.5
+
+
+def downcast(series, dtype, narrow_floats=True):
+    """series as dtype if that loses nothing, else float32 (small integer dtypes) or unchanged.
+
+    With narrow_floats=False, float32 becomes float64 in both cases.
+    """
+    dtype = np.dtype(dtype)
+    small = dtype.itemsize < 8
+    float_dtype = np.float32 if narrow_floats else np.float64
+    if dtype.kind == "f":
+        return series.astype(dtype if dtype.itemsize == 8 else float_dtype)
+    if series.dtype.kind == "f" or series.isna().any():
+        # Float columns stay float even when integral, so they are written back as "1.0"
+        return series.astype(float_dtype) if small else series
+    info = np.iinfo(dtype)
+    if len(series) and (series.min() < info.min or series.max() > info.max):
+        return series
+    return series.astype(dtype)
+
+
+def compact(df, keep_text=False, narrow_floats=True):
+    """Apply the shared dtypes to a frame in place of its columns; returns the frame.
+
+    narrow_floats=False keeps float64 where the table says float32 (see downcast).
+    """
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORICAL and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = series.astype("category")
+        elif col in NUMERIC:
+            stored = series.dtype == NUMERIC[col] and (narrow_floats or series.dtype != np.float32)
+            if pd.api.types.is_numeric_dtype(series) and not stored:
+                df[col] = downcast(series, NUMERIC[col], narrow_floats)
+            elif series.dtype == object and series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+                # Raw text of a numeric column ("10 Yaşında", "3 Katlı")
+                df[col] = series.astype("category")
+    if DROP_TEXT and not keep_text:
+        df = drop_text(df)
+    return df
+
+
+def drop_text(df):
+    """Without ilan_linki/konum when PIPELINE_DROP_TEXT is set."""
+    if not DROP_TEXT:
+        return df
+    return df.drop(columns=[c for c in TEXT if c in df.columns])
+
+
+def read_csv(path, keep_text=False, **kwargs):
+    """pd.read_csv with the shared dtypes; keep_text=True keeps ilan_linki/konum regardless of DROP_TEXT."""
+    if "chunksize" in kwargs or "iterator" in kwargs:
+        # Categories would differ per chunk; callers compact each chunk themselves
+        return pd.read_csv(path, **kwargs)
+    return compact(pd.read_csv(path, **kwargs), keep_text)
+
+
+def frame_mb(df):
+    return round(df.memory_usage(index=True, deep=True).sum() / 2**20, 1)
+
+
+# --- Before/after report ---
+
+# Stage -> the listing files it loads (relative to the project root)
+STAGE_INPUTS = {
+    "datasorter": ["data/hepsiemlak_500k+.txt"],
+    "merger": ["data/hepsiemlak_500k_sorted.csv"],
+    "preprocess": ["data/hepsiemlak_500k_with_sege.csv"],
+    "eda / hypothesis": ["analysis_ready_data.csv"],
+    "merge_extras": ["analysis_ready_data.csv", "data/extra-data.csv"],
+    "feature store": ["detailed-listings-cleaned.csv"],
+}
+
+
+def report(root):
+    print(f"{'stage':<18} {'file':<36} {'rows':>9} {'before MB':>10} {'after MB':>9} {'saved':>6}")
+    for stage, paths in STAGE_INPUTS.items():
+        for path in paths:
+            full = os.path.join(root, path)
+            if not os.path.exists(full):
+                continue
+            before = pd.read_csv(full)
+            after = read_csv(full, keep_text=stage in ("datasorter", "merger"))
+            b, a = frame_mb(before), frame_mb(after)
+            print(f"{stage:<18} {path:<36} {len(before):>9} {b:>10.1f} {a:>9.1f} {1 - a / b:>6.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report DataFrame memory with and without the shared schema.")
+    parser.add_argument("--root", default=".", help="project root holding the stage files")
+    args = parser.parse_args()
+    report(args.root)
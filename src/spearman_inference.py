@@ -0,0 +1,149 @@
+# spearman_inference.py
+# Bootstrap confidence intervals and permutation p-values for Spearman's rho.
+#
+# Spearman is Pearson on ranks, so each column is sorted and ranked once:
+# - a permutation keeps the set of ranks, so its rho is a dot product of the
+#   standardized x ranks with shuffled y ranks;
+# - a bootstrap resample is a vector of multiplicities, and its (average)
+#   ranks follow from a cumulative sum of those counts in the presorted
+#   order, so resamples never need to be re-sorted. The mean rank of any
+#   resample is (n + 1) / 2, so no per-resample centering pass is needed.
+# Resamples are evaluated as (resamples x n) matrices in memory-bounded
+# sub-chunks, with fixed-size tasks spread over a process pool. Each task
+# has its own seed, so results do not depend on the worker count.
+# Per-il / per-kademe runs are corrected with Benjamini-Hochberg FDR.
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+from statsmodels.stats.multitest import multipletests
+
+TASK_RESAMPLES = 500
+
+
+def sub_chunk_rows(n, chunk_mb):
+    # About eight (rows x n) 8-byte temporaries are alive at once
+    return max(1, int(chunk_mb * 2**20 // (n * 8 * 8)))
+
+
+def bootstrap_task(x, y, size, seed, chunk_mb):
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    mid = (n + 1) / 2  # mean rank of any resample of size n
+
+    # Work in y-sorted order: y ranks of a resample are a cumulative sum of
+    # its counts. x enters through its tie groups (few for district scores).
+    order = np.argsort(y, kind="stable")
+    ys = y[order]
+    y_new = np.r_[True, ys[1:] != ys[:-1]]
+    positions = np.arange(n)
+    y_first = np.maximum.accumulate(np.where(y_new, positions, 0))
+    y_last = (n - 1 - np.maximum.accumulate(np.where(np.r_[y_new[1:], True][::-1], positions, 0)))[::-1]
+    y_ties = not y_new.all()
+    _, gx = np.unique(x[order], return_inverse=True)
+    groups = gx.max() + 1
+
+    out = []
+    step = sub_chunk_rows(n, chunk_mb)
+    for done in range(0, size, step):
+        rows = min(step, size - done)
+        idx = rng.integers(0, n, size=(rows, n)) + np.arange(rows)[:, None] * n
+        counts = np.bincount(idx.ravel(), minlength=rows * n).reshape(rows, n)
+        cum = np.cumsum(counts, axis=1)
+        if y_ties:
+            before = cum - counts
+            ry = (cum[:, y_last] + before[:, y_first] + 1) / 2 - mid
+        else:
+            ry = cum - (counts - 1) / 2 - mid
+        cy = counts * ry
+
+        gidx = (gx + np.arange(rows)[:, None] * groups).ravel()
+        tot = np.bincount(gidx, weights=counts.ravel(), minlength=rows * groups).reshape(rows, groups)
+        sy = np.bincount(gidx, weights=cy.ravel(), minlength=rows * groups).reshape(rows, groups)
+        rx = np.cumsum(tot, axis=1) - (tot - 1) / 2 - mid
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out.append((rx * sy).sum(axis=1) / np.sqrt((tot * rx * rx).sum(axis=1) * (cy * ry).sum(axis=1)))
+    return np.concatenate(out)
+
+
+def permutation_task(x, y, size, seed, chunk_mb):
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    rx, ry = rankdata(x), rankdata(y)
+    zx = (rx - rx.mean()) / np.sqrt(((rx - rx.mean()) ** 2).sum())
+    zy = (ry - ry.mean()) / np.sqrt(((ry - ry.mean()) ** 2).sum())
+    out = []
+    step = sub_chunk_rows(n, chunk_mb)
+    for done in range(0, size, step):
+        rows = min(step, size - done)
+        shuffled = np.tile(zy, (rows, 1))
+        rng.permuted(shuffled, axis=1, out=shuffled)
+        out.append(shuffled @ zx)
+    return np.concatenate(out)
+
+
+def run_tasks(task, x, y, resamples, seed, chunk_mb, pool=None):
+    sizes = [min(TASK_RESAMPLES, resamples - i) for i in range(0, resamples, TASK_RESAMPLES)]
+    seeds = seed.spawn(len(sizes))
+    args = [(x, y, size, s, chunk_mb) for size, s in zip(sizes, seeds)]
+    if pool is None or len(args) == 1:
+        return np.concatenate([task(*a) for a in args])
+    return np.concatenate(list(pool.map(task, *zip(*args))))
+
+
+def open_pool(workers):
+    workers = workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+
+def spearman_inference(x, y, resamples=10_000, confidence=0.95, seed=42, chunk_mb=256, pool=None, workers=None):
+    """Spearman rho with a percentile bootstrap CI and a two-sided permutation p-value.
+
+    Pass an open executor as `pool` to share it across calls; otherwise one
+    is created with `workers` processes (default: one per CPU).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rho = np.corrcoef(rankdata(x), rankdata(y))[0, 1]
+
+    own_pool = open_pool(workers) if pool is None else None
+    try:
+        boot_seed, perm_seed = np.random.SeedSequence(seed).spawn(2)
+        boot = run_tasks(bootstrap_task, x, y, resamples, boot_seed, chunk_mb, pool or own_pool)
+        perm = run_tasks(permutation_task, x, y, resamples, perm_seed, chunk_mb, pool or own_pool)
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+
+    alpha = 1 - confidence
+    ci_low, ci_high = np.nanpercentile(boot, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    p_perm = (1 + np.sum(np.abs(perm) >= abs(rho) - 1e-12)) / (resamples + 1)
+    return {
+        "n": len(x), "rho": rho, "ci_low": ci_low, "ci_high": ci_high,
+        "p_perm": p_perm, "resamples": resamples,
+    }
+
+
+def stratified_inference(df, by, x_col, y_col, min_n=30, seed=42, pool=None, **kwargs):
+    """Run spearman_inference per level of `by`, with Benjamini-Hochberg FDR over the levels.
+
+    Levels with fewer than `min_n` rows, or a constant column, are skipped.
+    """
+    rows = []
+    for level, group in df.groupby(by, sort=True, observed=True):
+        if len(group) < min_n or group[x_col].nunique() < 2 or group[y_col].nunique() < 2:
+            continue
+        level_seed = [seed, zlib.crc32(str(level).encode("utf-8"))]
+        result = spearman_inference(group[x_col], group[y_col], seed=level_seed, pool=pool, **kwargs)
+        rows.append({by: level, **result})
+
+    table = pd.DataFrame(rows, columns=[by, "n", "rho", "ci_low", "ci_high", "p_perm", "resamples"])
+    if len(table):
+        table["p_fdr"] = multipletests(table["p_perm"], method="fdr_bh")[1]
+    else:
+        table["p_fdr"] = []
+    return table
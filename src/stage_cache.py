@@ -0,0 +1,189 @@
+# stage_cache.py
+# Typed Parquet hand-offs between pipeline stages.
+#
+# Every stage still writes its CSV (other tools and older scripts read it),
+# but next to it we write "<name>.parquet" with a declared schema. Downstream
+# stages call read_stage(), which loads the Parquet file with column
+# projection and memory mapping instead of re-parsing and re-inferring the CSV.
+# Column types come from schema.py, and frames are returned with its compact
+# dtypes whichever file they were loaded from, except that float columns are
+# float64 unless the caller passes narrow_floats=True (model inputs must not
+# be float32). The EDA stages opt in to save memory, and so do stages that
+# write the frame back as CSV: a float32-stored value such as skor -0.36 would
+# otherwise be printed as its float64 expansion.
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import CATEGORICAL, NUMERIC, compact
+
+# Category columns are stored dictionary-encoded, so they load back as category
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+
+def arrow_type(col):
+    """Parquet type of a column, following the shared dtypes in schema.py."""
+    if col in CATEGORICAL:
+        return CATEGORY
+    if col in NUMERIC:
+        return pa.from_numpy_dtype(NUMERIC[col])
+    return pa.string()
+
+
+# Declared schemas per stage artifact (keyed by CSV file name)
+ANALYSIS_READY_COLUMNS = [
+    "ilan_id", "ilan_linki", "ilan_tarihi", "ilan_tipi", "metrekare", "kat", "konum",
+    "fiyat", "para_birimi", "il", "ilce", "skor", "kademe", "fiyat_per_m2",
+]
+ANALYSIS_READY_SCHEMA = {col: arrow_type(col) for col in ANALYSIS_READY_COLUMNS}
+
+DETAILED_LISTINGS_SCHEMA = {
+    **ANALYSIS_READY_SCHEMA,
+    **{col: arrow_type(col) for col in [
+        "bina_yasi", "banyo_sayisi", "kat_sayisi", "isinma_tipi", "cephe", "kullanim_durumu",
+        "oda_sayisi_yeni", "salon_sayisi", "kat_sayisi_encoded",
+        "cephe_kuzey", "cephe_guney", "cephe_dogu", "cephe_bati",
+    ]},
+}
+
+SCHEMAS = {
+    "analysis_ready_data.csv": ANALYSIS_READY_SCHEMA,
+    "detailed-listings-cleaned.csv": DETAILED_LISTINGS_SCHEMA,
+}
+
+
+def parquet_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def to_arrow(df, declared):
+    # Declared columns are cast to their declared type, anything else is inferred
+    arrays = []
+    for col in df.columns:
+        arr = pa.array(df[col], from_pandas=True)
+        if col in declared:
+            try:
+                arr = arr.cast(declared[col])
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # e.g. missing values in an integer column: keep the inferred type
+                pass
+        elif pa.types.is_null(arr.type):
+            # All missing: a string column, so chunks written later can match it
+            arr = arr.cast(pa.string())
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def write_stage(df, csv_path, **csv_kwargs):
+    """Write the stage output as CSV plus a typed Parquet artifact."""
+    df.to_csv(csv_path, **csv_kwargs)
+
+    declared = SCHEMAS.get(os.path.basename(csv_path), {})
+    pq.write_table(to_arrow(df, declared), parquet_path(csv_path), compression="zstd")
+
+
+class StageWriter:
+    """write_stage() for output that arrives in chunks.
+
+    Each chunk is appended to the CSV and written as a Parquet row group, so
+    the whole output never has to be in memory. The Parquet file goes to a
+    temporary name and is renamed on close, after the last CSV write, which
+    keeps it fresh for read_stage() only when the stage completed.
+    """
+
+    def __init__(self, csv_path, **csv_kwargs):
+        self.csv_path = csv_path
+        self.csv_kwargs = csv_kwargs
+        self.declared = SCHEMAS.get(os.path.basename(csv_path), {})
+        self.pq_tmp = parquet_path(csv_path) + ".tmp"
+        self.writer = None
+        self.empty = None
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(discard=exc_type is not None)
+
+    def write(self, df):
+        first = self.rows == 0 and self.empty is None
+        kwargs = dict(self.csv_kwargs)
+        if not first and kwargs.get("encoding") == "utf-8-sig":
+            kwargs["encoding"] = "utf-8"  # one BOM, at the start of the file
+        df.to_csv(self.csv_path, mode="w" if first else "a", header=first, **kwargs)
+
+        if len(df) == 0:
+            # Inferred types of an empty chunk say nothing; only used if nothing else arrives
+            self.empty = self.empty if self.empty is not None else df
+            return
+        table = to_arrow(df, self.declared)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.pq_tmp, table.schema, compression="zstd")
+        else:
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self, discard=False):
+        if self.writer is None and self.empty is not None and not discard:
+            pq.write_table(to_arrow(self.empty, self.declared), self.pq_tmp, compression="zstd")
+        elif self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.pq_tmp):
+            if discard:
+                os.remove(self.pq_tmp)
+            else:
+                os.replace(self.pq_tmp, parquet_path(self.csv_path))
+
+
+def fresh_parquet(path):
+    """The Parquet file to read for `path` (a stage CSV or a .parquet file), or None to read the CSV.
+
+    A stage's Parquet file is only used when it is at least as new as the CSV,
+    so a CSV produced by some other tool is never shadowed by a stale artifact.
+    """
+    if path.endswith(".parquet"):
+        return path
+    pq_path = parquet_path(path)
+    fresh = os.path.exists(pq_path) and (
+        not os.path.exists(path)
+        or os.path.getmtime(pq_path) >= os.path.getmtime(path)
+    )
+    return pq_path if fresh else None
+
+
+def read_stage(csv_path, columns=None, narrow_floats=False):
+    """Load a stage output, preferring the Parquet artifact when it is fresh."""
+    pq_path = fresh_parquet(csv_path)
+    if pq_path:
+        if columns is not None:
+            available = set(pq.read_schema(pq_path).names)
+            columns = [c for c in columns if c in available]
+        table = pq.read_table(pq_path, columns=columns, memory_map=True)
+        return compact(table.to_pandas(), narrow_floats=narrow_floats)
+
+    if columns is not None:
+        wanted = set(columns)
+        return compact(pd.read_csv(csv_path, usecols=lambda c: c in wanted), narrow_floats=narrow_floats)
+    return compact(pd.read_csv(csv_path), narrow_floats=narrow_floats)
+
+
+def iter_stage(path, columns=None, chunk_rows=100_000, narrow_floats=False):
+    """read_stage() in chunks of at most chunk_rows, for inputs too large to load at once.
+
+    Categories are per chunk; compare category columns by value, not by code.
+    """
+    pq_path = fresh_parquet(path)
+    if pq_path:
+        source = pq.ParquetFile(pq_path, memory_map=True)
+        if columns is not None:
+            columns = [c for c in columns if c in set(source.schema_arrow.names)]
+        for batch in source.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield compact(batch.to_pandas(), narrow_floats=narrow_floats)
+        return
+
+    usecols = None if columns is None else (lambda c, wanted=set(columns): c in wanted)
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        yield compact(chunk, narrow_floats=narrow_floats)
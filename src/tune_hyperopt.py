@@ -0,0 +1,178 @@
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+from hyperopt import JOB_STATE_DONE, Domain, hp, space_eval, tpe, trials_from_docs
+from hyperopt.pyll import stochastic
+
+import feature_store
+from instrumentation import start_run
+from tuning import TrialStore, evaluate, open_pool, prepare_folds, rung_budgets, run_asha, split_threads
+
+MAX_ROUNDS = 500
+
+space = {
+    'n_estimators': hp.quniform('n_estimators', 100, MAX_ROUNDS, 50),
+    'max_depth': hp.quniform('max_depth', 3, 10, 1),
+    'learning_rate': hp.loguniform('learning_rate', np.log(0.01), np.log(0.3)),
+    'subsample': hp.uniform('subsample', 0.6, 1.0),
+    'colsample_bytree': hp.uniform('colsample_bytree', 0.6, 1.0),
+    'gamma': hp.uniform('gamma', 0, 5),
+    'reg_alpha': hp.uniform('reg_alpha', 0, 5),
+    'reg_lambda': hp.uniform('reg_lambda', 0, 5),
+    'min_child_weight': hp.quniform('min_child_weight', 1, 10, 1)
+}
+
+
+def trial_params(doc):
+    return space_eval(space, {k: v[0] for k, v in doc["misc"]["vals"].items() if v})
+
+
+def suggest_batch(domain, trials, size, seed):
+    # TPE proposes one point per call; a batch is drawn with one seed per slot.
+    # Seeds depend only on how many trials are done, so a resumed search
+    # continues the same sequence.
+    docs = []
+    for tid in trials.new_trial_ids(size):
+        slot_seed = np.random.SeedSequence([seed, tid]).generate_state(1)[0] % (2**31 - 1)
+        docs.extend(tpe.suggest([tid], domain, trials, int(slot_seed)))
+    return docs
+
+
+def search(trials, store, pool, max_evals, batch_size, seed, nthread, device, early_stopping_rounds):
+    domain = Domain(lambda params: None, space)
+    while len(trials.trials) < max_evals:
+        trials.refresh()
+        docs = suggest_batch(domain, trials, min(batch_size, max_evals - len(trials.trials)), seed)
+        points = [trial_params(doc) for doc in docs]
+
+        if pool is None:
+            results = [evaluate(p, nthread, device, None, early_stopping_rounds) for p in points]
+        else:
+            n = len(points)
+            results = list(pool.map(evaluate, points, [nthread] * n, [device] * n, [None] * n,
+                                    [early_stopping_rounds] * n))
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for doc, result in zip(docs, results):
+            doc["state"] = JOB_STATE_DONE
+            doc["result"] = result
+            doc["book_time"] = doc["refresh_time"] = now
+        trials = trials_from_docs(trials.trials + docs)
+        store.save(docs, points)
+
+        best = min(trials.losses())
+        print(f"{len(trials.trials)}/{max_evals} trials, best MAE so far: {best:,.0f}")
+    return trials
+
+
+def search_tpe(pool, args, parallel_trials, nthread, n_folds, data_version):
+    store = TrialStore(args.store, args.study)
+    try:
+        if args.fresh:
+            store.clear()
+        try:
+            stored = store.load(data_version)
+        except ValueError as err:
+            raise SystemExit(f"{args.store}: {err}")
+        if stored:
+            print(f"Resuming study '{args.study}' with {len(stored)} finished trials from {args.store}")
+        trials = search(trials_from_docs(stored), store, pool, args.max_evals, parallel_trials, args.seed,
+                        nthread, args.device, args.early_stopping_rounds)
+    finally:
+        store.close()
+
+    result = trials.best_trial["result"]
+    best = trial_params(trials.best_trial)
+    if args.early_stopping_rounds:
+        best["n_estimators"] = int(np.mean(result["best_iteration"])) + 1
+    done = [t for t in trials.trials if t["result"].get("status") == "ok"]
+    spent = sum(t["result"].get("rounds", n_folds * int(trial_params(t)["n_estimators"])) for t in done)
+    exhaustive = n_folds * sum(int(trial_params(t)["n_estimators"]) for t in done)
+    return best, result, spent, exhaustive
+
+
+def search_asha(pool, args, parallel_trials, nthread, n_folds):
+    # Random candidates; n_estimators is not searched here, the rung budget
+    # and early stopping decide the number of rounds instead.
+    rng = np.random.default_rng(args.seed)
+    candidates = [stochastic.sample(space, rng=rng) for _ in range(args.candidates)]
+    budgets = rung_budgets(args.min_rounds, MAX_ROUNDS, args.eta)
+    print(f"ASHA over {len(candidates)} candidates, rungs of {budgets} rounds, eta={args.eta}")
+
+    spent = []
+
+    def on_result(cid, rung, result):
+        spent.append(result["rounds"])
+        print(f"candidate {cid:>3} rung {rung} ({budgets[rung]} rounds): MAE {result['loss']:,.0f}, "
+              f"best iteration {int(np.mean(result['best_iteration']))}")
+
+    asha = run_asha(candidates, budgets, args.eta, pool, parallel_trials, nthread, args.device,
+                    args.early_stopping_rounds or 20, on_result)
+    cid, rung, result = asha.best()
+
+    # What the exhaustive search would have trained for the same candidates
+    exhaustive = n_folds * sum(int(c["n_estimators"]) for c in candidates)
+    best = {k: v for k, v in candidates[cid].items() if k != "n_estimators"}
+    best["n_estimators"] = int(np.mean(result["best_iteration"])) + 1
+    return best, result, sum(spent), exhaustive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search XGBoost hyperparameters on 3-fold CV MAE.")
+    parser.add_argument("--max-evals", type=int, default=250)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="total thread budget (default: one per CPU)")
+    parser.add_argument("--parallel-trials", type=int, default=4,
+                        help="trials evaluated concurrently; each gets threads / parallel-trials XGBoost threads")
+    parser.add_argument("--device", default="cpu", help="XGBoost device, e.g. cpu or cuda (default: cpu)")
+    parser.add_argument("--store", default="hyperopt_trials.sqlite", help="SQLite file finished trials are kept in")
+    parser.add_argument("--study", default="default", help="name of the search inside the store")
+    parser.add_argument("--fresh", action="store_true", help="discard stored trials of this study first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=["tpe", "asha"], default="tpe",
+                        help="'tpe': every candidate trains its full n_estimators; "
+                             "'asha': successive halving on boosting rounds with early stopping")
+    parser.add_argument("--early-stopping-rounds", type=int, default=None,
+                        help="stop a fold once validation MAE has not improved for this many rounds "
+                             "(default: off for tpe, 20 for asha)")
+    parser.add_argument("--candidates", type=int, default=250, help="random candidates started by asha")
+    parser.add_argument("--min-rounds", type=int, default=25, help="boosting rounds of the first asha rung")
+    parser.add_argument("--eta", type=int, default=3, help="asha keeps the best 1/eta of each rung")
+    args = parser.parse_args()
+
+    run = start_run("hyperopt")
+
+    with run.step("load") as step:
+        fs = feature_store.load()
+        step.rows_out = len(fs)
+
+    # Encode the CV folds of the training split once; every trial reuses them
+    with run.step("prepare folds", rows_in=len(fs.train_idx)) as step:
+        folds = prepare_folds(fs, fs.train_idx, n_splits=3)
+        step.extra["features"] = folds[0][0].shape[1]
+
+    parallel_trials, nthread = split_threads(args.threads, args.parallel_trials)
+    print(f"{parallel_trials} concurrent trials x {nthread} XGBoost threads on {args.device}")
+
+    pool = open_pool(folds, parallel_trials, nthread)
+    try:
+        with run.step("search", rows_in=len(fs.train_idx)) as step:
+            if args.mode == "asha":
+                best, result, spent, exhaustive = search_asha(pool, args, parallel_trials, nthread, len(folds))
+            else:
+                best, result, spent, exhaustive = search_tpe(pool, args, parallel_trials, nthread, len(folds),
+                                                             fs.version)
+            step.extra.update(rounds=spent, exhaustive_rounds=exhaustive)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print("Best parameters found:", best)
+    print(f"Best CV MAE: {result['loss']:,.0f} TL/m²")
+    print(f"Boosting rounds: {spent:,} spent vs {exhaustive:,} for full n_estimators on every candidate "
+          f"({spent / max(exhaustive, 1):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# tuning.py
+# Building blocks for the XGBoost hyperparameter search in tune_hyperopt.py.
+#
+# The CV folds are split and encoded once, from the feature store's training
+# rows, and kept as float32 CSR. Every worker process turns those into a
+# QuantileDMatrix (training part) and a DMatrix (validation part) once, in
+# its initializer, so a trial only pays for boosting. Predicting from a
+# QuantileDMatrix is several times slower, which matters when early stopping
+# evaluates the validation part per round. Trials run concurrently on a
+# process pool, with the thread budget split between concurrent trials and
+# XGBoost's nthread. Finished trials are stored in SQLite so that an
+# interrupted search can be resumed.
+#
+# The budget-aware mode uses asynchronous successive halving (ASHA): random
+# candidates start on a small number of boosting rounds with early stopping,
+# and only the best 1/eta of each rung is promoted to eta times the rounds.
+import json
+import os
+import pickle
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import StandardScaler
+
+# Folds of the current process, as (dtrain, dvalid, y_valid)
+_FOLDS = None
+
+
+def prepare_folds(fs, rows, n_splits=3):
+    """Split feature-store `rows` like cross_val_score(cv=n_splits) and encode each fold once.
+
+    Each fold's numerics are standardized with its own training part, as the
+    ColumnTransformer inside cross_val_score did.
+    """
+    folds = []
+    for train_pos, valid_pos in KFold(n_splits=n_splits).split(rows):
+        train_rows, valid_rows = rows[train_pos], rows[valid_pos]
+        scaler = StandardScaler().fit(np.asarray(fs.numeric[train_rows], dtype=np.float64))
+        folds.append((fs.design(train_rows, scaler), fs.y[train_rows],
+                      fs.design(valid_rows, scaler), fs.y[valid_rows]))
+    return folds
+
+
+def init_worker(folds, nthread):
+    global _FOLDS
+    _FOLDS = []
+    for X_train, y_train, X_valid, y_valid in folds:
+        dtrain = xgb.QuantileDMatrix(X_train, y_train, nthread=nthread)
+        dvalid = xgb.DMatrix(X_valid, y_valid, nthread=nthread)
+        _FOLDS.append((dtrain, dvalid, y_valid))
+
+
+def booster_params(params, nthread, device="cpu", seed=42):
+    """Translate the search space's XGBRegressor names to xgb.train params."""
+    return {
+        "objective": "reg:squarederror",
+        "tree_method": "hist",
+        "device": device,
+        "seed": seed,
+        "nthread": nthread,
+        "verbosity": 0,
+        "max_depth": int(params["max_depth"]),
+        "eta": float(params["learning_rate"]),
+        "subsample": float(params["subsample"]),
+        "colsample_bytree": float(params["colsample_bytree"]),
+        "gamma": float(params["gamma"]),
+        "alpha": float(params["reg_alpha"]),
+        "lambda": float(params["reg_lambda"]),
+        "min_child_weight": int(params["min_child_weight"]),
+    }
+
+
+def evaluate(params, nthread, device="cpu", max_rounds=None, early_stopping_rounds=None):
+    """Mean validation MAE over the cached folds, as a hyperopt result dict.
+
+    Boosts `max_rounds` rounds (default: the candidate's n_estimators). With
+    `early_stopping_rounds`, each fold stops once its validation MAE has not
+    improved for that many rounds and is scored at its best iteration.
+    """
+    start = time.perf_counter()
+    num_rounds = int(max_rounds or params["n_estimators"])
+    fold_mae, best_iteration, rounds, stopped_early = [], [], 0, True
+    for dtrain, dvalid, y_valid in _FOLDS:
+        bparams = booster_params(params, nthread, device)
+        if early_stopping_rounds:
+            bparams["eval_metric"] = "mae"
+            booster = xgb.train(bparams, dtrain, num_boost_round=num_rounds, evals=[(dvalid, "valid")],
+                                early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+            pred = booster.predict(dvalid, iteration_range=(0, booster.best_iteration + 1))
+            best_iteration.append(booster.best_iteration)
+        else:
+            booster = xgb.train(bparams, dtrain, num_boost_round=num_rounds)
+            pred = booster.predict(dvalid)
+            best_iteration.append(num_rounds - 1)
+        rounds += booster.num_boosted_rounds()
+        stopped_early &= booster.num_boosted_rounds() < num_rounds
+        fold_mae.append(float(np.mean(np.abs(pred - y_valid))))
+    return {
+        "loss": float(np.mean(fold_mae)),
+        "status": "ok",
+        "fold_mae": fold_mae,
+        "best_iteration": best_iteration,
+        "rounds": rounds,
+        "stopped_early": stopped_early,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def split_threads(threads, parallel_trials):
+    """(concurrent trials, XGBoost threads per trial) within a total thread budget."""
+    threads = threads or os.cpu_count() or 1
+    parallel_trials = max(1, min(parallel_trials or 1, threads))
+    return parallel_trials, max(1, threads // parallel_trials)
+
+
+def open_pool(folds, parallel_trials, nthread):
+    """Process pool whose workers hold the fold matrices; None means run in-process."""
+    if parallel_trials > 1:
+        return ProcessPoolExecutor(max_workers=parallel_trials, initializer=init_worker,
+                                   initargs=(folds, nthread))
+    init_worker(folds, nthread)
+    return None
+
+
+def rung_budgets(min_rounds, max_rounds, eta):
+    """Boosting rounds per ASHA rung: min_rounds * eta**k, capped at max_rounds."""
+    budgets = [min(min_rounds, max_rounds)]
+    while budgets[-1] < max_rounds:
+        budgets.append(min(budgets[-1] * eta, max_rounds))
+    return budgets
+
+
+class Asha:
+    # Promotion bookkeeping for asynchronous successive halving. A candidate
+    # is promoted out of rung k as soon as it is in the top 1/eta of the
+    # results reported to that rung so far, so workers never wait for a rung
+    # to fill up.
+    def __init__(self, budgets, eta):
+        self.budgets = budgets
+        self.eta = eta
+        self.rungs = [{} for _ in budgets]
+        self.promoted = [set() for _ in budgets]
+
+    def report(self, cid, rung, result):
+        self.rungs[rung][cid] = result
+
+    def next_promotion(self):
+        for k in reversed(range(len(self.budgets) - 1)):
+            rung = self.rungs[k]
+            top = sorted(rung, key=lambda cid: rung[cid]["loss"])[:len(rung) // self.eta]
+            for cid in top:
+                if cid not in self.promoted[k]:
+                    self.promoted[k].add(cid)
+                    return cid, k + 1
+        return None
+
+    def best(self):
+        """(candidate, rung, result) of the lowest loss on the highest rung reached."""
+        for k in reversed(range(len(self.budgets))):
+            if self.rungs[k]:
+                cid = min(self.rungs[k], key=lambda c: self.rungs[k][c]["loss"])
+                return cid, k, self.rungs[k][cid]
+        return None
+
+
+def run_asha(candidates, budgets, eta, pool, parallel_trials, nthread, device, early_stopping_rounds,
+             on_result=None):
+    """Run ASHA over `candidates` (parameter dicts); returns the filled-in Asha."""
+    asha = Asha(budgets, eta)
+    executor = pool or ThreadPoolExecutor(max_workers=1)
+    pending = {}
+    next_new = 0
+    try:
+        while True:
+            while len(pending) < parallel_trials:
+                job = asha.next_promotion()
+                if job is None and next_new < len(candidates):
+                    job = (next_new, 0)
+                    next_new += 1
+                if job is None:
+                    break
+                cid, rung = job
+                if rung > 0 and asha.rungs[rung - 1][cid]["stopped_early"]:
+                    # More rounds would not change a run that already stopped early
+                    asha.report(cid, rung, asha.rungs[rung - 1][cid])
+                    continue
+                future = executor.submit(evaluate, candidates[cid], nthread, device,
+                                         budgets[rung], early_stopping_rounds)
+                pending[future] = job
+            if not pending:
+                return asha
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                cid, rung = pending.pop(future)
+                result = future.result()
+                asha.report(cid, rung, result)
+                if on_result is not None:
+                    on_result(cid, rung, result)
+    finally:
+        if pool is None:
+            executor.shutdown()
+
+
+class TrialStore:
+    # One row per finished trial. `doc` is the pickled hyperopt trial document,
+    # which is what a resumed search feeds back into its Trials object. Each
+    # study also records the feature store version its trials were scored on,
+    # so a resume never mixes losses from two datasets.
+    def __init__(self, path, study):
+        self.study = study
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS trials (
+                study TEXT NOT NULL,
+                tid INTEGER NOT NULL,
+                loss REAL,
+                params TEXT,
+                seconds REAL,
+                doc BLOB NOT NULL,
+                PRIMARY KEY (study, tid)
+            )""")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS studies (
+                study TEXT PRIMARY KEY,
+                data_version TEXT NOT NULL
+            )""")
+        self.db.commit()
+
+    def load(self, data_version):
+        """Stored trial documents of the study, which is bound to `data_version` from now on.
+
+        Raises ValueError if the trials were scored on another feature store version.
+        """
+        docs = [pickle.loads(doc) for (doc,) in self.db.execute(
+            "SELECT doc FROM trials WHERE study = ? ORDER BY tid", (self.study,))]
+        row = self.db.execute("SELECT data_version FROM studies WHERE study = ?", (self.study,)).fetchone()
+        if docs and (row is None or row[0] != data_version):
+            raise ValueError(f"study '{self.study}' has {len(docs)} trials scored on feature store "
+                             f"{row[0] if row else '(unknown version)'}, not {data_version}; "
+                             f"use --fresh or another --study")
+        self.db.execute("INSERT OR REPLACE INTO studies VALUES (?, ?)", (self.study, data_version))
+        self.db.commit()
+        return docs
+
+    def save(self, docs, params):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.study, doc["tid"], doc["result"].get("loss"), json.dumps(p, default=float),
+              doc["result"].get("seconds"), pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
+             for doc, p in zip(docs, params)])
+        self.db.commit()
+
+    def clear(self):
+        self.db.execute("DELETE FROM trials WHERE study = ?", (self.study,))
+        self.db.execute("DELETE FROM studies WHERE study = ?", (self.study,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,62 @@
+# Parity of the vectorized feature rules with the original row-wise functions.
+#   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+import schema
+from feature_rules import encode_kat, legacy_encode, vectorized_encode
+
+# Edge cases the scraped data may not contain
+EDGE = pd.DataFrame({
+    "ilan_id": "edge",
+    "kat": ["Kot 1", "Yüksek Giriş", "Villa Katı", "Ara Kat", "En Üst Kat", "12.Kat", None, " 3. KAT ",
+            "Bahçe Katı", "Ara Kat", "En Üst Kat", "Çatı Katı"],
+    "oda_sayisi": ["Stüdyo", "3 + 2 + 1", None, "1.5 + 1", "2+0", "-1 + 1", "+2 + 1", " 4 + 1 ",
+                   "3+1", "2 + 1", "5 + 2", ""],
+    "kat_sayisi": [3.0, 5.0, np.nan, 5.0, np.nan, 12.0, 2.0, 7.0, 4.0, 7.0, 9.0, 3.0],
+    "cephe": ["Kuzey, Güney", None, "GÜNEY", "Doğu, Batı", "", "batı", "Kuzey", "Güney, Doğu",
+              "Kuzey", None, "Batı", "Doğu"],
+})
+
+
+def scraped_sample():
+    listings_path = os.path.join(ROOT, "data", "detailed-listings-cleaned.csv")
+    extra_path = os.path.join(ROOT, "data", "extra-data.csv")
+    if not (os.path.exists(listings_path) and os.path.exists(extra_path)):
+        pytest.skip("scraped data not available")
+    listings = schema.read_csv(listings_path, usecols=["ilan_id", "kat"])
+    extra = schema.read_csv(extra_path, usecols=["ilan_id", "oda_sayisi", "kat_sayisi", "cephe"])
+    sample = listings.merge(extra, on="ilan_id")
+    sample["kat_sayisi"] = sample["kat_sayisi"].astype(str).str.extract(r"(\d+)").astype(float)
+    return sample
+
+
+def assert_parity(sample):
+    expected = legacy_encode(sample)
+    actual = vectorized_encode(sample)
+    assert list(actual.columns) == list(expected.columns)
+    for col in expected.columns:
+        exp = pd.to_numeric(expected[col], errors="coerce").astype("Int64")
+        pd.testing.assert_series_equal(actual[col].astype("Int64"), exp, check_names=False)
+
+
+def test_edge_cases_match_row_wise():
+    assert_parity(EDGE)
+
+
+def test_scraped_data_matches_row_wise():
+    assert_parity(scraped_sample())
+
+
+def test_encode_kat_is_integer():
+    # Written to detailed-listings-cleaned.csv as "4", like the row-wise version
+    encoded = encode_kat(EDGE["kat"], EDGE["kat_sayisi"])
+    assert encoded.dtype == "Int64"
+    assert encoded.tolist()[:6] == [-1, 0, pd.NA, 2, pd.NA, 12]
+    assert encoded.to_frame().to_csv(index=False).splitlines()[1:3] == ["-1", "0"]